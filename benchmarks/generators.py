@@ -0,0 +1,110 @@
+"""
+Synthetic inputs for the benchmarks: models, atomic sources, and CD++ output and log files.
+"""
+import os
+import random
+from typing import List
+
+from pringles.models import Coupled, Model, AtomicModelBuilder
+from pringles.utils import VirtualTime
+
+ATOMIC_METADATA_TEMPLATE = """/*
+@PringlesModelMetadata
+name: {name}
+input_ports: in, done
+output_ports: out
+*/
+class {name} : public Atomic {{}};
+"""
+
+
+def vtime_of_step(step: int) -> VirtualTime:
+    """Returns the VirtualTime of a step, steps being 10 milliseconds apart."""
+    milliseconds = step * 10
+    return VirtualTime(milliseconds // 3600000,
+                       milliseconds // 60000 % 60,
+                       milliseconds // 1000 % 60,
+                       milliseconds % 1000,
+                       0)
+
+
+def make_chain_model(atomics: int, name: str = "top") -> Model:
+    """Builds a coupled model with a chain of atomics, each one coupled to the next."""
+    BenchAtomic = AtomicModelBuilder().with_name("BenchAtomic")\
+        .with_input_port("in").with_output_port("out").build()
+    components = [BenchAtomic(f"atomic{i}", preparation="0:0:1:0") for i in range(atomics)]
+    top = Coupled(name, components).add_inport("in").add_outport("out")
+    top.add_coupling("in", components[0].get_port("in"))
+    for previous, following in zip(components, components[1:]):
+        top.add_coupling(previous.get_port("out"), following.get_port("in"))
+    top.add_coupling(components[-1].get_port("out"), "out")
+    return top
+
+
+def make_nested_model(depth: int, fan_out: int, name: str = "top") -> Model:
+    """Builds a tree of coupled models ``depth`` levels deep, with ``fan_out`` chained
+    subcomponents each, and atomic leaves."""
+    BenchAtomic = AtomicModelBuilder().with_name("BenchAtomic")\
+        .with_input_port("in").with_output_port("out").build()
+
+    def build(level: int, model_name: str) -> Model:
+        if level == depth:
+            return BenchAtomic(model_name, preparation="0:0:1:0")
+        components = [build(level + 1, f"{model_name}_{i}") for i in range(fan_out)]
+        coupled = Coupled(model_name, components).add_inport("in").add_outport("out")
+        coupled.add_coupling("in", components[0].get_port("in"))
+        for previous, following in zip(components, components[1:]):
+            coupled.add_coupling(previous.get_port("out"), following.get_port("in"))
+        coupled.add_coupling(components[-1].get_port("out"), "out")
+        return coupled
+
+    return build(0, name)
+
+
+def make_atomic_sources(directory: str, atomics: int) -> List[str]:
+    """Writes ``atomics`` C++ headers with pringles metadata, to be discovered by a registry."""
+    paths = []
+    for i in range(atomics):
+        path = os.path.join(directory, f"bench_atomic_{i}.h")
+        with open(path, "w") as source:
+            source.write(ATOMIC_METADATA_TEMPLATE.format(name=f"BenchDiscovered{i}"))
+        paths.append(path)
+    return paths
+
+
+def _format_value(width: int, rng: random.Random) -> str:
+    if width == 1:
+        return f"{rng.uniform(0, 100):.5f}"
+    return "[" + ", ".join(f"{rng.uniform(0, 100):.5f}" for _ in range(width)) + "]"
+
+
+def write_output_file(path: str, rows: int, ports: List[str], width: int = 1,
+                      seed: int = 0) -> str:
+    """Writes a CD++ output file with ``rows`` outputs spread among ``ports``."""
+    rng = random.Random(seed)
+    with open(path, "w") as output_file:
+        for step in range(rows):
+            output_file.write(f"{vtime_of_step(step)}:0 {ports[step % len(ports)]} "
+                              f"{_format_value(width, rng)}\n")
+    return path
+
+
+def write_log_files(directory: str, rows: int, ports: List[str], width: int = 1,
+                    seed: int = 0, main_log_name: str = "logs") -> str:
+    """Writes a CD++ main log file, plus a component log with ``rows`` X and Y messages for
+    the top model. Returns the main log file path."""
+    rng = random.Random(seed)
+    component_log_name = main_log_name + "01"
+    with open(os.path.join(directory, component_log_name), "w") as component_log:
+        for step in range(rows):
+            port = ports[step % len(ports)]
+            message_type, origin, dest = (("X", "top(01)", "atomic0(02)") if step % 2 == 0
+                                          else ("Y", "atomic0(02)", "top(01)"))
+            component_log.write(f"0 / L / {message_type} / {vtime_of_step(step)}:0 / "
+                                f"{origin} / {port:>14} / {_format_value(width, rng):>12} / "
+                                f"{dest}\n")
+    main_log_path = os.path.join(directory, main_log_name)
+    with open(main_log_path, "w") as main_log:
+        main_log.write("Log files:\n")
+        main_log.write(f"top : {component_log_name}\n")
+    return main_log_path
@@ -0,0 +1,336 @@
+"""
+Benchmark suite for the pringles pipeline stages.
+
+Run it from the repository root::
+
+    python benchmarks/run.py --output bench.json
+    python benchmarks/run.py --quick --filter serialize
+    python benchmarks/run.py --compare bench.json
+
+Results are written as JSON, with the timings of each benchmark and size, so runs of different
+versions can be compared with ``--compare``. Simulations are run with the CD++ stand-in in
+``benchmarks/fake_cdpp``, so the real binary isn't needed.
+"""
+import argparse
+import json
+import math
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from typing import Callable, List, Dict, Any, Optional, Sequence
+
+import numpy as np
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCHMARKS_DIR))
+
+import generators  # noqa: E402
+from pringles.models import (Coupled, GraphIndex, validate, structural_hash,  # noqa: E402
+                             replicate)
+from pringles.serializers import (MaSerializer, MaParser, JsonSerializer,  # noqa: E402
+                                  CompactJsonSerializer)
+from pringles.simulator import (Simulator, Simulation, SimulationResult,  # noqa: E402
+                                Event, EventTable)
+from pringles.simulator.registry import AtomicRegistry  # noqa: E402
+from pringles.utils import VirtualTime  # noqa: E402
+
+FAKE_CDPP_DIR = os.path.join(BENCHMARKS_DIR, "fake_cdpp")
+
+
+class Benchmark:
+    """A benchmark is a setup function, which receives a scratch directory and a size, and
+    returns the function that is timed."""
+
+    def __init__(self, name: str, setup: Callable[[str, int], Callable[[], Any]],
+                 sizes: Sequence[int], quick_sizes: Sequence[int]):
+        self.name = name
+        self.setup = setup
+        self.sizes = sizes
+        self.quick_sizes = quick_sizes
+
+
+BENCHMARKS: List[Benchmark] = []
+
+
+def benchmark(name: str, sizes: Sequence[int], quick_sizes: Sequence[int]):
+    def register(setup: Callable[[str, int], Callable[[], Any]]):
+        BENCHMARKS.append(Benchmark(name, setup, sizes, quick_sizes))
+        return setup
+    return register
+
+
+@benchmark("model.add_coupling", sizes=[1000, 10000], quick_sizes=[100])
+def bench_add_coupling(workdir: str, size: int):
+    return lambda: generators.make_chain_model(size)
+
+
+@benchmark("serialize.ma", sizes=[1000, 10000], quick_sizes=[100])
+def bench_ma_serializer(workdir: str, size: int):
+    model = generators.make_chain_model(size)
+    return lambda: MaSerializer.serialize(model)
+
+
+@benchmark("serialize.json", sizes=[1000, 10000], quick_sizes=[100])
+def bench_json_serializer(workdir: str, size: int):
+    model = generators.make_chain_model(size)
+    return lambda: JsonSerializer.serialize(model)
+
+
+@benchmark("serialize.json_compact", sizes=[1000, 10000], quick_sizes=[100])
+def bench_compact_json_serializer(workdir: str, size: int):
+    model = generators.make_chain_model(size)
+    return lambda: CompactJsonSerializer.serialize(model)
+
+
+@benchmark("graph.index", sizes=[1000, 10000], quick_sizes=[100])
+def bench_graph_index(workdir: str, size: int):
+    model = generators.make_chain_model(size)
+    return lambda: GraphIndex(model).flatten()
+
+
+@benchmark("model.validate", sizes=[1000, 10000], quick_sizes=[100])
+def bench_validate(workdir: str, size: int):
+    model = generators.make_chain_model(size)
+    return lambda: validate(model)
+
+
+@benchmark("model.structural_hash", sizes=[1000, 10000], quick_sizes=[100])
+def bench_structural_hash(workdir: str, size: int):
+    # A tree of ten components per coupled model, with size atomics
+    model = generators.make_nested_model(round(math.log10(size)), 10)
+    structural_hash(model)
+    changed = model
+    while isinstance(changed, Coupled):
+        changed = changed.subcomponents[0]
+    counter = iter(range(sys.maxsize))
+
+    def rehash_after_change():
+        changed.model_params['version'] = next(counter)
+        return structural_hash(model)
+    return rehash_after_change
+
+
+@benchmark("parse.ma", sizes=[10000, 100000], quick_sizes=[100])
+def bench_ma_parser(workdir: str, size: int):
+    ma = MaSerializer.serialize(generators.make_chain_model(size))
+    return lambda: MaParser().parse(ma)
+
+
+@benchmark("model.replicate", sizes=[1000, 10000], quick_sizes=[100])
+def bench_replicate(workdir: str, size: int):
+    # Copies of a ten atomics assembly, chained, serialized as a grid would be
+    template = generators.make_chain_model(10, name="assembly")
+
+    def replicate_and_serialize():
+        array = replicate(template, size).couple_instances("out", "in")
+        return MaSerializer.serialize(Coupled("top", [array]))
+    return replicate_and_serialize
+
+
+@benchmark("registry.discovery", sizes=[50, 200], quick_sizes=[10])
+def bench_registry_discovery(workdir: str, size: int):
+    sources_dir = tempfile.mkdtemp(dir=workdir)
+    generators.make_atomic_sources(sources_dir, size)
+    return lambda: AtomicRegistry(sources_dir)
+
+
+@benchmark("parse.output", sizes=[10000, 100000], quick_sizes=[1000])
+def bench_parse_output(workdir: str, size: int):
+    path = generators.write_output_file(os.path.join(workdir, f"output{size}"), size,
+                                        ["out", "done"])
+    return lambda: SimulationResult._parse_output_file(path)
+
+
+@benchmark("parse.logs", sizes=[10000, 100000], quick_sizes=[1000])
+def bench_parse_logs(workdir: str, size: int):
+    path = generators.write_log_files(workdir, size, ["out", "done"],
+                                      main_log_name=f"logs{size}")
+    return lambda: SimulationResult._parse_main_log_file(path)
+
+
+@benchmark("events.write_list", sizes=[100000, 1000000], quick_sizes=[1000])
+def bench_events_write_list(workdir: str, size: int):
+    port = generators.make_chain_model(1).get_port("in")
+    events = [Event(generators.vtime_of_step(step), port, float(step)) for step in range(size)]
+    return lambda: Simulator.dump_events_in_file(events, workdir)
+
+
+@benchmark("events.write_table", sizes=[100000, 1000000], quick_sizes=[1000])
+def bench_events_write_table(workdir: str, size: int):
+    steps = np.arange(size)
+    table = EventTable(steps * 10, np.full(size, "in"), steps.astype(float))
+    return lambda: Simulator.dump_events_in_file(table, workdir)
+
+
+@benchmark("vtime.parse", sizes=[100000], quick_sizes=[1000])
+def bench_vtime_parse(workdir: str, size: int):
+    timestrs = [f"{generators.vtime_of_step(step)}:0" for step in range(size)]
+    return lambda: [VirtualTime.parse(timestr) for timestr in timestrs]
+
+
+@benchmark("vtime.parse_many", sizes=[100000, 1000000], quick_sizes=[1000])
+def bench_vtime_parse_many(workdir: str, size: int):
+    # As in logs, where the messages of each step share its time
+    timestrs = [f"{generators.vtime_of_step(step // 8)}:0" for step in range(size)]
+    return lambda: VirtualTime.parse_many(timestrs)
+
+
+@benchmark("vtime.parse_numbers", sizes=[100000, 1000000], quick_sizes=[1000])
+def bench_vtime_parse_numbers(workdir: str, size: int):
+    timestrs = [f"{generators.vtime_of_step(step // 8)}:0" for step in range(size)]
+    return lambda: VirtualTime.parse_numbers(timestrs)
+
+
+@benchmark("vtime.compare", sizes=[100000], quick_sizes=[1000])
+def bench_vtime_compare(workdir: str, size: int):
+    times = [generators.vtime_of_step(step) for step in range(size, 0, -1)]
+    return lambda: sorted(times)
+
+
+@benchmark("plot.port", sizes=[100000, 1000000], quick_sizes=[1000])
+def bench_plot_port(workdir: str, size: int):
+    import matplotlib.pyplot as plt
+    path = generators.write_log_files(workdir, size, ["out"], main_log_name=f"plotlogs{size}")
+    time_numbers: Dict[str, np.ndarray] = {}
+    logs_dfs = SimulationResult._parse_main_log_file(path, time_numbers=time_numbers)
+
+    def plot():
+        result = SimulationResult(process_result=None)
+        result.logs_dfs = logs_dfs
+        result._time_numbers = dict(time_numbers)  # As if the result had parsed the logs
+        result.plot_port("top", "out")
+        plt.close("all")
+    return plot
+
+
+@benchmark("simulator.run_simulation", sizes=[10000, 100000], quick_sizes=[1000])
+def bench_run_simulation(workdir: str, size: int):
+    simulator = Simulator(FAKE_CDPP_DIR)
+    model = generators.make_chain_model(100)
+
+    def run():
+        os.environ["FAKE_CDPP_ROWS"] = str(size)
+        simulator.run_simulation(Simulation(model, working_dir=workdir))
+    return run
+
+
+@benchmark("display.first_render", sizes=[1000, 10000], quick_sizes=[100])
+def bench_display_first_render(workdir: str, size: int):
+    import re
+    from urllib.request import urlopen
+    from pringles.backends.web_display import DisplayServer
+    model = generators.make_chain_model(size)
+
+    def render():
+        # From a stopped server to the diagram payload fetched, as a first display does. Large
+        # models are fetched a level at a time, so only the top level is
+        server = DisplayServer().start()
+        try:
+            html = server.display_model(model).decode()
+            model_url = re.search(r"addCanvasFrom\w+\('([^']+)'", html).group(1)
+            with urlopen(model_url) as response:
+                response.read()
+        finally:
+            server.stop()
+    return render
+
+
+def time_benchmark(timed: Callable[[], Any], repeat: int) -> Dict[str, Any]:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        timed()
+        timings.append(time.perf_counter() - start)
+    return {
+        "repeat": repeat,
+        "min": min(timings),
+        "median": statistics.median(timings),
+        "mean": statistics.mean(timings),
+        "timings": timings,
+    }
+
+
+def _git_revision() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], cwd=BENCHMARKS_DIR,
+                              capture_output=True, check=True).stdout.decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_benchmarks(name_filter: Optional[str] = None, quick: bool = False,
+                   repeat: int = 5) -> Dict[str, Any]:
+    results = []
+    workdir = tempfile.mkdtemp(prefix="pringles-bench-")
+    for bench in BENCHMARKS:
+        if name_filter and name_filter not in bench.name:
+            continue
+        for size in (bench.quick_sizes if quick else bench.sizes):
+            timed = bench.setup(workdir, size)
+            timed()  # Warm up
+            timing = time_benchmark(timed, repeat)
+            results.append(dict(name=bench.name, size=size, **timing))
+            print(f"{bench.name:<28} size={size:<9} median={timing['median']:.6f}s",
+                  file=sys.stderr)
+    return {
+        "timestamp": datetime.now().isoformat(),
+        "git_revision": _git_revision(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "quick": quick,
+        "benchmarks": results,
+    }
+
+
+def compare(results: Dict[str, Any], baseline: Dict[str, Any], tolerance: float) -> bool:
+    """Prints the median time ratio of each benchmark against a baseline, and returns False
+    if any of them is slower than the tolerance allows."""
+    baseline_medians = {(bench["name"], bench["size"]): bench["median"]
+                        for bench in baseline["benchmarks"]}
+    within_tolerance = True
+    for bench in results["benchmarks"]:
+        baseline_median = baseline_medians.get((bench["name"], bench["size"]))
+        if baseline_median is None:
+            continue
+        ratio = bench["median"] / baseline_median
+        regressed = ratio > 1 + tolerance
+        within_tolerance = within_tolerance and not regressed
+        print(f"{bench['name']:<28} size={bench['size']:<9} {ratio:6.2f}x"
+              f"{'  REGRESSION' if regressed else ''}", file=sys.stderr)
+    return within_tolerance
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--output", help="JSON file to write the results to (default stdout)")
+    parser.add_argument("--filter", help="only run benchmarks whose name contains this text")
+    parser.add_argument("--quick", action="store_true", help="run with small sizes only")
+    parser.add_argument("--repeat", type=int, default=5, help="timed runs per benchmark")
+    parser.add_argument("--compare", help="JSON results of a previous run to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2,
+                        help="slowdown ratio over the baseline reported as a regression")
+    args = parser.parse_args(argv)
+    import matplotlib
+    matplotlib.use("Agg")  # Plots are timed, never shown
+
+    results = run_benchmarks(args.filter, args.quick, args.repeat)
+    if args.output:
+        with open(args.output, "w") as output_file:
+            json.dump(results, output_file, indent=2)
+    else:
+        json.dump(results, sys.stdout, indent=2)
+
+    if args.compare:
+        with open(args.compare) as baseline_file:
+            return 0 if compare(results, json.load(baseline_file), args.tolerance) else 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
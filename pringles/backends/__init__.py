@@ -1 +1,11 @@
-from .web_display import ipython_inline_display  # noqa: F401
+from .port_stream import PortStream  # noqa: F401
+
+# The web display pulls tornado, so it is only imported when first accessed
+__all__ = ['PortStream', 'ipython_inline_display']
+
+
+def __getattr__(name):
+    if name == 'ipython_inline_display':
+        from .web_display import ipython_inline_display
+        return ipython_inline_display
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,207 @@
+from __future__ import annotations
+
+import os
+import copy
+import time
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Tuple
+
+from pringles.utils import VirtualTime
+
+if TYPE_CHECKING:
+    import numpy as np
+    from pringles.simulator import Simulation
+
+# Name of the output file the simulator writes in the simulation output dir
+OUTPUT_FILE_NAME = 'output'
+
+
+class PortStream:
+    """The values of a port, cut into batches that each cover a time window and hold a few
+    points per pixel at most, so long simulations can be plotted while they run without
+    sending whole DataFrames around.
+
+    A simulation that has finished is streamed from its result. A running one is streamed
+    from the output file the simulator is writing, so only the top model output ports can be
+    followed live. Component logs are only read once the simulation finishes.
+
+    A stream ends with an ``error`` message instead when the run fails, when the port values
+    were not captured, or when a running simulation writes no output for ``timeout`` seconds.
+    """
+
+    def __init__(self, simulation: Simulation, portname: str, logname: Optional[str] = None,
+                 index: int = 0, window: VirtualTime = VirtualTime.of_seconds(10),
+                 resolution: int = 200, timeout: Optional[float] = None):
+        """
+        :param simulation: The simulation, running or finished
+        :type simulation: Simulation
+        :param portname: The name of the port
+        :type portname: str
+        :param logname: The component log of the port, defaults to None, meaning the top
+            model output
+        :type logname: Optional[str], optional
+        :param index: The element to stream when the port values are tuples, defaults to 0
+        :type index: int, optional
+        :param window: Virtual time covered by each batch, defaults to 10 seconds
+        :type window: VirtualTime, optional
+        :param resolution: Amount of intervals each batch is decimated to, usually the plot
+            width in pixels, defaults to 200
+        :type resolution: int, optional
+        :param timeout: Seconds a running simulation may go without writing output before the
+            stream gives up on it, as runs in other processes can't report their failures to
+            it, defaults to None, meaning no timeout
+        :type timeout: Optional[float], optional
+        """
+        self.simulation = simulation
+        self.portname = portname
+        self.logname = logname
+        self.index = index
+        self.window = float(window)
+        self.resolution = resolution
+        self.timeout = timeout
+        self._reset()
+
+    def _reset(self) -> None:
+        self.done = False
+        self._tailing: Optional[bool] = None
+        self._offset = 0  # Bytes of the output file already read
+        self._times: List[float] = []  # Values of windows not completed yet
+        self._values: List[float] = []
+        self._output_growth = time.monotonic()  # When new output was last read
+
+    def restarted(self) -> PortStream:
+        """Returns a stream of the same port from its beginning, as each client of the display
+        server consumes a stream of its own."""
+        stream = copy.copy(self)
+        stream._reset()
+        return stream
+
+    @property
+    def output_path(self) -> str:
+        return os.path.join(self.simulation.output_dir, OUTPUT_FILE_NAME)
+
+    def poll(self) -> List[Dict[str, Any]]:
+        """Reads the values produced since the last poll, and returns the batches of the windows
+        they completed. Once the simulation has finished, the remaining values are returned,
+        followed by a last message with ``done`` set, or with the ``error`` that ended the
+        stream.
+
+        :return: The batches, with the ``port``, its ``window`` bounds, and its ``times`` and
+            ``values``, times being numbers as in :meth:`SimulationResult.get_port_values`
+        :rtype: List[Dict[str, Any]]
+        """
+        if self.done:
+            return []
+        finished = self.simulation.result is not None
+        if self._tailing is None:
+            self._tailing = not finished
+            if self._tailing and self.logname is not None:
+                raise ValueError("Only the top model output ports can be streamed while the "
+                                 "simulation runs")
+        if self._tailing:
+            error = None if finished else self.simulation.error
+            self._read_output_tail(final=finished or error is not None)
+            if not finished and error is None:
+                error = self._timeout_error()
+        else:
+            error = self._read_result()
+
+        batches = self._completed_batches(flush=finished or error is not None)
+        if error is not None:
+            self.done = True
+            batches.append({'port': self.portname, 'error': error})
+        elif finished:
+            self.done = True
+            batches.append({'port': self.portname, 'done': True,
+                            'successful': bool(self.simulation.result.successful())})
+        return batches
+
+    def _timeout_error(self) -> Optional[str]:
+        if self.timeout is None or time.monotonic() - self._output_growth < self.timeout:
+            return None
+        return f"The simulation wrote no output for {self.timeout:g} seconds"
+
+    def _read_result(self) -> Optional[str]:
+        """Reads the port values from the finished simulation result, returning the error
+        ending the stream if they were not captured."""
+        if self.logname is None and getattr(self.simulation.result, 'output_df', None) is None:
+            return "The simulator outputs were not captured, see use_simulator_out"
+        times, values = self._result_values()
+        self._times.extend(times)
+        self._values.extend(values)
+        return None
+
+    def _result_values(self) -> Tuple[List[float], List[float]]:
+        from pringles.simulator import SimulationResult
+
+        result = self.simulation.result
+        if self.logname is None:
+            output_df = result.output_df
+            port_data = output_df[output_df[SimulationResult.PORT_COL] == self.portname]
+            port_values = (None if port_data.empty else
+                           SimulationResult._extract_port_values(port_data, self.index))
+        else:
+            port_values = result.get_port_values(self.logname, self.portname, self.index)
+        if port_values is None:
+            return [], []
+        return port_values[0].tolist(), port_values[1].tolist()
+
+    def _read_output_tail(self, final: bool) -> None:
+        """Parses the complete lines the simulator appended to the output file."""
+        from pringles.simulator import SimulationResult
+
+        if not os.path.isfile(self.output_path):
+            return
+        with open(self.output_path, 'rb') as output_file:
+            output_file.seek(self._offset)
+            appended = output_file.read()
+        # The last line may still be being written, unless the simulation finished
+        complete_length = len(appended) if final else appended.rfind(b'\n') + 1
+        self._offset += complete_length
+        if complete_length:
+            self._output_growth = time.monotonic()
+        for line in appended[:complete_length].decode().splitlines():
+            fields = line.split(maxsplit=2)
+            if len(fields) < 3 or fields[1] != self.portname:
+                continue
+            value = SimulationResult._parse_value(fields[2])
+            self._times.append(float(VirtualTime.parse(fields[0])))
+            self._values.append(float(value[self.index] if isinstance(value, tuple) else value))
+
+    def _completed_batches(self, flush: bool) -> List[Dict[str, Any]]:
+        import numpy as np
+
+        if not self._times:
+            return []
+        times = np.asarray(self._times)
+        values = np.asarray(self._values)
+        windows = np.floor_divide(times, self.window).astype(np.int64)
+        # Times don't decrease, so the window of the last value may still get more of them
+        completed = len(windows) if flush else int(np.searchsorted(windows, windows[-1]))
+        batches = [self._batch(int(window), times[start:end], values[start:end])
+                   for window, start, end in self._window_ranges(windows[:completed])]
+        self._times = self._times[completed:]
+        self._values = self._values[completed:]
+        return batches
+
+    @staticmethod
+    def _window_ranges(windows: np.ndarray) -> List[Tuple[int, int, int]]:
+        import numpy as np
+
+        starts = np.flatnonzero(np.diff(windows, prepend=windows[:1] - 1))
+        ends = np.append(starts[1:], len(windows))
+        return [(int(windows[start]), int(start), int(end)) for start, end in zip(starts, ends)]
+
+    def _batch(self, window: int, times: np.ndarray, values: np.ndarray) -> Dict[str, Any]:
+        from pringles.utils.decimation import decimate_minmax
+
+        times, values = decimate_minmax(times, values, self.resolution)
+        return {
+            'port': self.portname,
+            'window': [window * self.window, (window + 1) * self.window],
+            'times': times.tolist(),
+            'values': values.tolist()
+        }
+
+    def _repr_html_(self) -> str:
+        from pringles.backends.web_display import ipython_stream_display
+        return ipython_stream_display(self).decode("utf-8")
@@ -28,7 +28,8 @@
  */
 
 /*global console, createjs, $, Square, Port, Link, relaxed_khan, selected_models,
-         manifest, options, sort_ports, JSONModelGraphics, calculate_selected_color */
+         manifest, options, sort_ports, JSONModelGraphics, calculate_selected_color,
+         with_levels_url */
 /*exported Model */
 
 "use strict";
@@ -603,8 +604,38 @@ Model.prototype.change_links_visibility = function(visible) {
     this.canvas.stage.update();
 };
 
+/**
+ * Whether the model structure is only a summary of a coupled model, served a level at a time,
+ * whose submodels and couplings have to be fetched before it's expanded.
+ */
+Model.prototype.needs_level = function() {
+    return this.structure.levels_url !== undefined &&
+        this.structure.type === Model.type.coupled &&
+        !this.structure.loaded;
+};
+
+Model.prototype.load_level = function(callback) {
+    var levelUrl = this.structure.levels_url + this.structure.path;
+
+    $.getJSON(levelUrl)
+        .done(function (level) {
+            $.extend(this.structure, with_levels_url(level, this.structure.levels_url));
+            this.update_models();
+            this.update_links();
+            callback();
+        }.bind(this))
+        .fail(function (xhr, status, error) {
+            console.error("[Model] load_level: could not fetch " + levelUrl + ": " + error);
+        });
+};
+
 Model.prototype.toggle_models = function() {
 
+    if (!this.is_expanded && this.needs_level()) {
+        this.load_level(this.toggle_models.bind(this));
+        return;
+    }
+
     this.is_expanded = !this.is_expanded;
     this.showing_links = true;
     this.change_models_visibility(this.is_expanded);
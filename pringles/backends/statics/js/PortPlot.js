@@ -0,0 +1,93 @@
+/*global console, WebSocket, window */
+/*exported PortPlot */
+"use strict";
+
+/**
+ * @class PortPlot
+ *
+ * @description Plots the values of a port streamed by the python display server, redrawing
+ * the whole series as each batch of a time window arrives.
+ * @param {String} streamUrl - The WebSocket url of the stream.
+ * @param {String} plotId - Id of the element holding the plot canvas.
+ */
+function PortPlot(streamUrl, plotId) {
+    this.canvas = document.getElementById(plotId).getElementsByTagName("canvas")[0];
+    this.times = [];
+    this.values = [];
+    this.finished = false;
+    this.drawRequested = false;
+
+    this.socket = new WebSocket(streamUrl);
+    this.socket.onmessage = this.receive.bind(this);
+}
+
+PortPlot.prototype.receive = function(message) {
+    var batch = JSON.parse(message.data);
+
+    if (batch.error !== undefined) {
+        console.error("[PortPlot] " + batch.port + ": " + batch.error);
+        return;
+    }
+    if (batch.done) {
+        this.finished = true;
+    } else {
+        Array.prototype.push.apply(this.times, batch.times);
+        Array.prototype.push.apply(this.values, batch.values);
+    }
+    this.requestDraw();
+};
+
+/**
+ * Batches arriving together are drawn once, in the next animation frame.
+ */
+PortPlot.prototype.requestDraw = function() {
+    if (this.drawRequested) { return; }
+    this.drawRequested = true;
+    window.requestAnimationFrame(function () {
+        this.drawRequested = false;
+        this.draw();
+    }.bind(this));
+};
+
+PortPlot.prototype.bounds = function(series) {
+    var min, max, i;
+
+    min = series[0];
+    max = series[0];
+    for (i = 1; i < series.length; i++) {
+        if (series[i] < min) { min = series[i]; }
+        if (series[i] > max) { max = series[i]; }
+    }
+    return max > min ? {min: min, max: max} : {min: min - 1, max: max + 1};
+};
+
+PortPlot.prototype.draw = function() {
+    var context, margin, width, height, times, values, x, y, i;
+
+    context = this.canvas.getContext("2d");
+    context.clearRect(0, 0, this.canvas.width, this.canvas.height);
+    if (this.times.length === 0) { return; }
+
+    margin = 30;
+    width = this.canvas.width - 2 * margin;
+    height = this.canvas.height - 2 * margin;
+    times = this.bounds(this.times);
+    values = this.bounds(this.values);
+
+    context.strokeStyle = this.finished ? "#1f77b4" : "#ff7f0e";
+    context.beginPath();
+    for (i = 0; i < this.times.length; i++) {
+        x = margin + width * (this.times[i] - times.min) / (times.max - times.min);
+        y = margin + height * (1 - (this.values[i] - values.min) / (values.max - values.min));
+        if (i === 0) {
+            context.moveTo(x, y);
+        } else {
+            context.lineTo(x, y);
+        }
+    }
+    context.stroke();
+
+    context.fillStyle = "#000000";
+    context.fillText(values.max.toString(), 2, margin);
+    context.fillText(values.min.toString(), 2, margin + height);
+};
@@ -29,7 +29,8 @@
 
 /*global $, Canvas, console, JSONModelGraphics, manifest */
 /*exported main, new_input_model, update_options, update_color, menu_init, 
-    import_colors, export_colors */
+    import_colors, export_colors, with_levels_url, addCanvasFromJson, addCanvasFromUrl,
+    addCanvasFromLevels */
 "use strict";
 
 var canvases = [];
@@ -298,7 +299,118 @@ function export_colors() {
     downloadLink.click();
 }
 
-function addCanvasFromJson(modelAsJson, diagrammer_id) {
-    var structure = JSON.parse(modelAsJson);
+function compact_ports(strings, names, kind) {
+    var ports, i;
+
+    ports = [];
+    for (i = 0; i < names.length; i++) {
+        ports.push({ name: strings[names[i]], message_type: "Any", kind: kind });
+    }
+    return ports;
+}
+
+/**
+ * Rebuilds the nested structure of a model serialized by the python CompactJsonSerializer,
+ * where names are indices of the strings table, and models reference their parent index.
+ */
+function expand_compact_structure(compact) {
+    var strings, models, record, model, eic, ic, eoc, i, j;
+
+    strings = compact.strings;
+    models = [];
+    for (i = 0; i < compact.models.length; i++) {
+        record = compact.models[i];
+        model = {
+            id: strings[record[0]],
+            type: record.length > 4 ? "coupled" : "atomic",
+            ports: {
+                out: compact_ports(strings, record[2], "out"),
+                in: compact_ports(strings, record[3], "in")
+            }
+        };
+        if (record.length > 4) {
+            model.models = [];
+            model.eic = [];
+            model.ic = [];
+            model.eoc = [];
+        }
+        models.push(model);
+        if (record[1] >= 0) {
+            models[record[1]].models.push(model);
+        }
+    }
+
+    // Couplings go last, as they reference submodels listed after their coupled model
+    for (i = 0; i < compact.models.length; i++) {
+        record = compact.models[i];
+        if (record.length <= 4) {
+            continue;
+        }
+        model = models[i];
+        eic = record[4];
+        for (j = 0; j < eic.length; j += 3) {
+            model.eic.push({ to_port: strings[eic[j + 2]], to_model: models[eic[j]].id,
+                             from_port: strings[eic[j + 1]] });
+        }
+        ic = record[5];
+        for (j = 0; j < ic.length; j += 4) {
+            model.ic.push({ to_port: strings[ic[j + 3]], to_model: models[ic[j + 2]].id,
+                            from_port: strings[ic[j + 1]], from_model: models[ic[j]].id });
+        }
+        eoc = record[6];
+        for (j = 0; j < eoc.length; j += 3) {
+            model.eoc.push({ to_port: strings[eoc[j + 2]], from_port: strings[eoc[j + 1]],
+                             from_model: models[eoc[j]].id });
+        }
+    }
+    return models[0];
+}
+
+function addCanvasFromStructure(structure, diagrammer_id) {
+    if (structure.format === "pringles-compact/1") {
+        structure = expand_compact_structure(structure);
+    }
     canvases.push(new Canvas({ json_input: structure, diagrammer_id: diagrammer_id }));
+}
+
+function addCanvasFromJson(modelAsJson, diagrammer_id) {
+    addCanvasFromStructure(JSON.parse(modelAsJson), diagrammer_id);
+}
+
+/**
+ * Marks a level served by the python display server as loaded, and its submodels as to be
+ * fetched from the same levels url when expanded.
+ */
+function with_levels_url(level, levelsUrl) {
+    var i;
+
+    level.levels_url = levelsUrl;
+    level.loaded = true;
+    for (i = 0; i < level.models.length; i++) {
+        level.models[i].levels_url = levelsUrl;
+    }
+    return level;
+}
+
+function addCanvasFromLevels(levelsUrl, diagrammer_id) {
+    $.getJSON(levelsUrl)
+        .done(function (level) {
+            if (level.type === "coupled") {
+                level = with_levels_url(level, levelsUrl);
+            }
+            addCanvasFromStructure(level, diagrammer_id);
+        })
+        .fail(function (xhr, status, error) {
+            console.error("Could not fetch the model from " + levelsUrl + ": " + error);
+        });
+}
+
+function addCanvasFromUrl(modelUrl, diagrammer_id) {
+    $.getJSON(modelUrl)
+        .done(function (structure) {
+            addCanvasFromStructure(structure, diagrammer_id);
+        })
+        .fail(function (xhr, status, error) {
+            console.error("Could not fetch the model from " + modelUrl + ": " + error);
+        });
 }
\ No newline at end of file
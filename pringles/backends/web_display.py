@@ -1,88 +1,400 @@
 import tornado.web
 import tornado.ioloop
+import tornado.websocket
 import os
 from pathlib import Path
 import threading
 import asyncio
 import uuid
+import gzip
+import json
+import hashlib
+from collections import OrderedDict
+from typing import Optional, cast
 
-from pringles.models import Model
+from pringles.models import Model, Coupled, ModelArray
+from pringles.backends.port_stream import PortStream
 
+# Models with more submodels than this, at any depth, are displayed a level at a time
+LAZY_DISPLAY_MIN_MODELS = 1000
+# Serialized models up to this size are embedded in the displayed cell, so saved notebooks
+# still show them, and larger ones are fetched from the server
+INLINE_DISPLAY_MAX_BYTES = 256 * 1024
+# How often streamed ports are checked for new values
+STREAM_POLL_INTERVAL_MS = 250
 
-class ServerThread(threading.Thread):
 
-    _join_called = False
+class HostedModels:
+    """Serialized models served by the display server, under the hash of their content, so
+    displayed cells only reference them. Each one is gzipped once, when first hosted, and the
+    least recently displayed ones are dropped when there are more than ``max_models``."""
 
-    def run(self):
-        new_io_loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(new_io_loop)
-        WebApplication.initialize()
+    def __init__(self, max_models: int = 256):
+        self.max_models = max_models
+        self._payloads: OrderedDict = OrderedDict()
+        self._trees: OrderedDict = OrderedDict()
+        # Models are hosted from the notebook thread, and served from the server one
+        self._lock = threading.Lock()
 
-        ioloop = tornado.ioloop.IOLoop.current()
+    def host(self, payload: str) -> str:
+        """Hosts a serialized model.
 
-        def healthcheck():
-            if ServerThread._join_called:
-                ioloop.stop()
+        :param payload: The serialized model
+        :type payload: str
+        :return: The key it's served under
+        :rtype: str
+        """
+        encoded = payload.encode()
+        key = hashlib.sha256(encoded).hexdigest()
+        with self._lock:
+            if key in self._payloads:
+                self._payloads.move_to_end(key)
+                return key
+        compressed = gzip.compress(encoded, compresslevel=6)
+        with self._lock:
+            self._payloads[key] = compressed
+            while len(self._payloads) > self.max_models:
+                self._payloads.popitem(last=False)
+        return key
 
-        # Add a healthcheck every 1 second
-        tornado.ioloop.PeriodicCallback(healthcheck, 1000).start()
+    def get(self, key: str) -> Optional[bytes]:
+        """Returns the gzipped payload hosted under a key, or None if there's none."""
+        with self._lock:
+            return self._payloads.get(key)
 
-        ioloop.start()
-        ioloop.close()
+    def host_tree(self, model: Model) -> str:
+        """Hosts a model to be served a level at a time, under its structural hash, so a model
+        displayed again isn't hosted again. The model itself is kept, so its levels are
+        serialized when requested, as they are then.
 
-    # Overriding join method to mark the ioloop to be disposed
-    def join(self):
-        ServerThread._join_called = True
-        super().join()
+        :param model: The hosted model
+        :type model: Model
+        :return: The key it's served under
+        :rtype: str
+        """
+        from pringles.models import structural_hash
 
+        key = structural_hash(model)
+        with self._lock:
+            self._trees[key] = model
+            self._trees.move_to_end(key)
+            while len(self._trees) > self.max_models:
+                self._trees.popitem(last=False)
+        return key
 
-class WebApplication(tornado.web.Application):
+    def get_tree(self, key: str) -> Optional[Model]:
+        """Returns the model hosted under a key by :meth:`host_tree`, or None if there's none."""
+        with self._lock:
+            return self._trees.get(key)
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._payloads) + len(self._trees)
+
+
+class HostedStreams:
+    """Port streams served by the display server, dropping the least recently displayed ones
+    when there are more than ``max_streams``."""
+
+    def __init__(self, max_streams: int = 256):
+        self.max_streams = max_streams
+        self._streams: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
 
-    initialized = False
-    url_prefix = ''
-    target_url = ''
-    # Hacky way to force the ipython render method to wait for the tornado server to start
-    started_latch = threading.Semaphore(0)
+    def host(self, stream: PortStream) -> str:
+        key = uuid.uuid4().hex
+        with self._lock:
+            self._streams[key] = stream
+            while len(self._streams) > self.max_streams:
+                self._streams.popitem(last=False)
+        return key
+
+    def get(self, key: str) -> Optional[PortStream]:
+        with self._lock:
+            return self._streams.get(key)
+
+
+class WebApplication(tornado.web.Application):
+    """The display server routes, serving the models and streams hosted in it."""
 
     class HealthcheckHandler(tornado.web.RequestHandler):
         def get(self):
             written_response = "tutuc"
             self.write(written_response)
 
-    def __init__(self, url_prefix: str = ''):
+    class ModelHandler(tornado.web.RequestHandler):
+        """Serves a hosted model. Its key is the hash of its content, so it never changes, and
+        its ETag is the key itself."""
+
+        def initialize(self, hosted_models: HostedModels):
+            self.hosted_models = hosted_models
+
+        def set_default_headers(self):
+            # Diagrams are fetched from the notebook page, served from another origin
+            self.set_header('Access-Control-Allow-Origin', '*')
+
+        def compute_etag(self) -> Optional[str]:
+            return f'"{self.path_args[0]}"'
+
+        def get(self, key: str):
+            compressed = self.hosted_models.get(key)
+            if compressed is None:
+                raise tornado.web.HTTPError(404)
+            self.set_header('Content-Type', 'application/json')
+            self.set_header('Cache-Control', 'public, max-age=31536000, immutable')
+            self.set_header('Vary', 'Accept-Encoding')
+            if 'gzip' in self.request.headers.get('Accept-Encoding', ''):
+                self.set_header('Content-Encoding', 'gzip')
+                self.write(compressed)
+            else:
+                self.write(gzip.decompress(compressed))
+
+    class LevelHandler(tornado.web.RequestHandler):
+        """Serves a level of a hosted model, addressed by its path: the indices of the coupled
+        model and its ancestors among their parent submodels, joined by dots."""
+
+        def initialize(self, hosted_models: HostedModels):
+            self.hosted_models = hosted_models
+            self.level_json = ''
+
+        def set_default_headers(self):
+            self.set_header('Access-Control-Allow-Origin', '*')
+
+        def compute_etag(self) -> Optional[str]:
+            # Levels change with their model, so their ETag is the hash of their content
+            return f'"{hashlib.sha256(self.level_json.encode()).hexdigest()}"'
+
+        def get(self, key: str, path: str):
+            from pringles.serializers import JsonSerializer
+
+            model = self.hosted_models.get_tree(key)
+            if model is None:
+                raise tornado.web.HTTPError(404)
+            for index in path.split('.') if path else []:
+                component = (JsonSerializer.component_at(model, int(index))
+                             if isinstance(model, Coupled) else None)
+                if component is None:
+                    raise tornado.web.HTTPError(404)
+                model = component
+            self.set_header('Content-Type', 'application/json')
+            if isinstance(model, Coupled):
+                level = JsonSerializer.level_to_dict(model, path)
+            else:
+                level = JsonSerializer.model_summary_to_dict(model, path)
+            self.level_json = json.dumps(level)
+            self.write(self.level_json)
+
+    class PortStreamHandler(tornado.websocket.WebSocketHandler):
+        """Sends the batches of a hosted port stream as they are completed, one JSON message
+        each, and closes the connection after the last one. Streams are polled in the IOLoop
+        executor, as reading and parsing the output file blocks."""
+
+        def initialize(self, hosted_streams: HostedStreams):
+            self.hosted_streams = hosted_streams
+            self.poller: Optional[tornado.ioloop.PeriodicCallback] = None
+            self.polling = False
+
+        def check_origin(self, origin: str) -> bool:
+            # Plots connect from the notebook page, served from another origin
+            return True
+
+        def open(self, key):
+            stream = self.hosted_streams.get(key)
+            if stream is None:
+                self.close(4004, "Unknown stream")
+                return
+            self.stream = stream.restarted()
+            self.poller = tornado.ioloop.PeriodicCallback(self.send_batches,
+                                                          STREAM_POLL_INTERVAL_MS)
+            self.poller.start()
+            tornado.ioloop.IOLoop.current().add_callback(self.send_batches)
+
+        async def send_batches(self):
+            if self.polling:
+                return  # A stream is polled once at a time
+            self.polling = True
+            try:
+                batches = await tornado.ioloop.IOLoop.current().run_in_executor(
+                    None, self.stream.poll)
+            except (OSError, ValueError) as error:
+                batches = [{'port': self.stream.portname, 'error': str(error)}]
+                self.stream.done = True
+            finally:
+                self.polling = False
+            if self.ws_connection is None:
+                return  # Closed by the client while polling
+            for batch in batches:
+                self.write_message(json.dumps(batch))
+            if self.stream.done:
+                self.close()
+
+        def on_close(self):
+            if self.poller is not None:
+                self.poller.stop()
+
+    def __init__(self, hosted_models: HostedModels, hosted_streams: HostedStreams,
+                 url_prefix: str = ''):
         super().__init__([
             (url_prefix + r'/heartbeat', self.HealthcheckHandler),
+            (url_prefix + r'/models/([0-9a-f]{64})', self.ModelHandler,
+                {'hosted_models': hosted_models}),
+            (url_prefix + r'/trees/([0-9a-f]{64})/levels/((?:[0-9]+(?:\.[0-9]+)*)?)',
+                self.LevelHandler, {'hosted_models': hosted_models}),
+            (url_prefix + r'/streams/([0-9a-f]{32})', self.PortStreamHandler,
+                {'hosted_streams': hosted_streams}),
             (url_prefix + r'/_static/(.*)',
                 tornado.web.StaticFileHandler, {'path': _get_static_files_path()})
         ])
 
-    @classmethod
-    def initialize(cls, url_prefix: str = '', port: int = None, address: str = None):
-        if cls.initialized:
-            return
 
-        app = cls(url_prefix=url_prefix)
-        cls.url_prefix = url_prefix
+class DisplayServer:
+    """Serves the diagrams and plots displayed in a notebook, from an IOLoop running in a
+    thread of its own. Any amount of servers can run at once, each one on a port of its own,
+    and a stopped server can be started again.
+    """
 
-        try:
-            if port is None:
-                port = cls._get_random_free_port()
-            cls.target_url = 'http://localhost:' + str(port)
+    def __init__(self, address: str = 'localhost', port: int = 0, url_prefix: str = ''):
+        """
+        :param address: Address to listen on, defaults to localhost
+        :type address: str, optional
+        :param port: Port to listen on, defaults to 0, meaning any free one
+        :type port: int, optional
+        :param url_prefix: Prefix of every route, defaults to none
+        :type url_prefix: str, optional
+        """
+        self.address = address
+        self.requested_port = port
+        self.url_prefix = url_prefix
+        self.port: Optional[int] = None
+        self.hosted_models = HostedModels()
+        self.hosted_streams = HostedStreams()
+        self._ioloop: Optional[tornado.ioloop.IOLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._start_error: Optional[BaseException] = None
+        self._lock = threading.Lock()
+
+    @property
+    def is_running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
 
-            app.listen(port)
-            cls.initialized = True
+    @property
+    def target_url(self) -> str:
+        """The url the server is reached at, from the notebook page."""
+        return f'http://localhost:{self.port}{self.url_prefix}'
+
+    def start(self) -> 'DisplayServer':
+        """Starts serving, unless the server is already running. Returns once the server is
+        listening, so its :attr:`port` is known.
+
+        :raises OSError: The server couldn't listen on the address and port
+        :return: The server itself
+        :rtype: DisplayServer
+        """
+        with self._lock:
+            if self.is_running:
+                return self
+            listening = threading.Event()
+            self._start_error = None
+            self._thread = threading.Thread(target=self._serve, args=(listening,),
+                                            name='pringles-display-server', daemon=True)
+            self._thread.start()
+            listening.wait()
+            if self._start_error is not None:
+                self._thread.join()
+                raise self._start_error
+        return self
+
+    def _serve(self, listening: threading.Event) -> None:
+        import tornado.netutil
+        import tornado.httpserver
+
+        asyncio.set_event_loop(asyncio.new_event_loop())
+        ioloop = tornado.ioloop.IOLoop.current()
+        try:
+            # Binding to port 0 lets the OS pick a free port, read back from the socket
+            sockets = tornado.netutil.bind_sockets(self.requested_port, self.address)
+        except OSError as error:
+            self._start_error = error
+            listening.set()
+            ioloop.close()
+            return
+        self.port = sockets[0].getsockname()[1]
+        server = tornado.httpserver.HTTPServer(
+            WebApplication(self.hosted_models, self.hosted_streams, self.url_prefix))
+        server.add_sockets(sockets)
+        self._ioloop = ioloop
+        listening.set()
+        try:
+            ioloop.start()
         finally:
-            cls.started_latch.release()
+            server.stop()
+            ioloop.close(all_fds=True)
+
+    def stop(self) -> None:
+        """Stops serving, and waits for the server thread to finish. Models and streams stay
+        hosted, to be served again if the server is restarted."""
+        with self._lock:
+            if not self.is_running:
+                return
+            ioloop = cast(tornado.ioloop.IOLoop, self._ioloop)
+            thread = cast(threading.Thread, self._thread)
+            ioloop.add_callback(ioloop.stop)
+            thread.join()
+            self._ioloop = None
+            self._thread = None
+
+    def display_model(self, model: Model) -> bytes:
+        """Renders the HTML displaying a model diagram. Small models are embedded in it, and
+        the others are fetched from the server, the largest ones a level at a time.
+
+        :param model: The displayed model
+        :type model: Model
+        :rtype: bytes
+        """
+        import tornado.template
+        from pringles.serializers import CompactJsonSerializer
+
+        lazy = _has_more_models_than(model, LAZY_DISPLAY_MIN_MODELS)
+        model_source: Optional[str] = None
+        model_url: Optional[str] = None
+        if lazy:
+            model_url = f'{self.target_url}/trees/{self.hosted_models.host_tree(model)}/levels/'
+        else:
+            payload = CompactJsonSerializer.serialize(model)
+            if len(payload) <= INLINE_DISPLAY_MAX_BYTES:
+                # Names could close the script element the payload is embedded in
+                model_source = payload.replace('</', '<\\/')
+            else:
+                model_url = f'{self.target_url}/models/{self.hosted_models.host(payload)}'
+        single_model_template = Path(_get_static_files_path(), 'basic.html').read_bytes()
+        single_template = tornado.template.Template(single_model_template)
+        return single_template.generate(
+            model_name=model.name,
+            model_source=model_source,
+            model_url=model_url,
+            lazy=lazy,
+            url_prefix=self.target_url,
+            unique_diagrammer_id=str(uuid.uuid4().hex)
+        )
 
-    @staticmethod
-    def _get_random_free_port() -> int:
-        import socket
-        s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        s.bind(("", 0))
-        s.listen(1)
-        port = s.getsockname()[1]
-        s.close()
-        return port
+    def display_stream(self, stream: PortStream) -> bytes:
+        """Renders the HTML displaying a live plot of a port stream.
+
+        :param stream: The displayed stream
+        :type stream: PortStream
+        :rtype: bytes
+        """
+        import tornado.template
+
+        stream_key = self.hosted_streams.host(stream)
+        stream_url = self.target_url.replace('http://', 'ws://', 1)
+        stream_template = Path(_get_static_files_path(), 'port_stream.html').read_bytes()
+        return tornado.template.Template(stream_template).generate(
+            port_name=stream.portname,
+            stream_url=f'{stream_url}/streams/{stream_key}',
+            url_prefix=self.target_url,
+            unique_plot_id=str(uuid.uuid4().hex)
+        )
 
 
 def _get_static_files_path() -> str:
@@ -90,21 +402,31 @@ def _get_static_files_path() -> str:
         os.path.dirname(__file__), 'statics')
 
 
-web_model_display_thread = ServerThread()
+def _has_more_models_than(model: Model, limit: int) -> bool:
+    """Counts the submodels of a model at any depth, each copy of an array included, until
+    more than the limit are found."""
+    pending = [(model, 1)]
+    count = 0
+    while pending:
+        current, copies = pending.pop()
+        if isinstance(current, ModelArray):
+            count += copies * (current.size - 1)  # The array itself was counted once
+            pending.append((current.template, copies * current.size))
+        elif isinstance(current, Coupled):
+            count += copies * len(current.subcomponents)
+            pending.extend((submodel, copies) for submodel in current.subcomponents)
+        if count > limit:
+            return True
+    return False
+
+
+# The server of the notebook displays, started when something is first displayed
+display_server = DisplayServer()
 
 
 def ipython_inline_display(model: Model) -> bytes:
-    import tornado.template
-    from pringles.serializers import JsonSerializer
-
-    if not web_model_display_thread.is_alive():
-        web_model_display_thread.start()
-        WebApplication.started_latch.acquire()
-
-    single_model_template = Path(_get_static_files_path(), 'basic.html').read_bytes()
-    single_template = tornado.template.Template(single_model_template)
-    return single_template.generate(
-        model_source=JsonSerializer.serialize(model),
-        url_prefix=WebApplication.target_url,
-        unique_diagrammer_id=str(uuid.uuid4().hex)
-    )
+    return display_server.start().display_model(model)
+
+
+def ipython_stream_display(stream: PortStream) -> bytes:
+    return display_server.start().display_stream(stream)
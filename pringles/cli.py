@@ -0,0 +1,86 @@
+"""
+The ``pringles`` command line, to run batches of simulations without a notebook::
+
+    pringles run manifest.json --parallelism 8
+    pringles worker --cdpp-bin-path cdpp/src/bin --port 9000 --slots 4
+
+See :mod:`pringles.simulator.batch` for the manifest format, and
+:mod:`pringles.simulator.distributed` for the workers.
+"""
+import sys
+import argparse
+from typing import Optional, List
+
+from pringles.simulator.batch import Manifest, BatchRunner
+from pringles.simulator.errors import ManifestException
+from pringles.simulator.simulator import Simulator
+from pringles.simulator.distributed import SimulationWorker
+
+
+def run(args: argparse.Namespace) -> int:
+    try:
+        manifest = Manifest.load(args.manifest)
+    except (OSError, ManifestException) as error:
+        print(f"Invalid manifest: {error}", file=sys.stderr)
+        return 2
+    errors = BatchRunner(manifest, args.parallelism, resume=not args.no_resume,
+                         max_attempts=args.max_attempts).run()
+    failed = sum(error is not None for error in errors.values())
+    print(f"{len(errors) - failed} runs completed, {failed} failed", file=sys.stderr)
+    return 1 if failed else 0
+
+
+def worker(args: argparse.Namespace) -> int:
+    simulator = Simulator(args.cdpp_bin_path, args.user_models_dir)
+    simulation_worker = SimulationWorker(simulator, args.host, args.port, args.slots,
+                                         args.working_dir)
+    host, port = simulation_worker.address
+    print(f"Worker listening on {host}:{port}", file=sys.stderr, flush=True)
+    try:
+        simulation_worker.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog='pringles', description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    subparsers = parser.add_subparsers(dest='command')
+    subparsers.required = True
+
+    run_parser = subparsers.add_parser('run', help="run the simulations of a manifest")
+    run_parser.add_argument('manifest', help="JSON or YAML manifest file")
+    run_parser.add_argument('--parallelism', '-j', type=int,
+                            help="simulations run at once (default: the manifest one)")
+    run_parser.add_argument('--no-resume', action='store_true',
+                            help="run again the simulations already completed")
+    run_parser.add_argument('--max-attempts', type=int,
+                            help="attempts of a run failing transiently (default: the manifest "
+                                 "one, or 3)")
+    run_parser.set_defaults(handler=run)
+
+    worker_parser = subparsers.add_parser('worker',
+                                          help="run the simulations a coordinator sends")
+    worker_parser.add_argument('--cdpp-bin-path', required=True,
+                               help="directory of the CD++ executable")
+    worker_parser.add_argument('--user-models-dir', help="directory of the user atomics")
+    worker_parser.add_argument('--host', default='127.0.0.1',
+                               help="address to listen on (default: localhost)")
+    worker_parser.add_argument('--port', type=int, default=0,
+                               help="port to listen on (default: any free one)")
+    worker_parser.add_argument('--slots', type=int, default=1,
+                               help="simulations run at once (default: 1)")
+    worker_parser.add_argument('--working-dir',
+                               help="directory simulations are run in (default: a temporary one)")
+    worker_parser.set_defaults(handler=worker)
+    return parser
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = build_parser().parse_args(argv)
+    return args.handler(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
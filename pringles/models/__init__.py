@@ -1,2 +1,6 @@
 from .models import (Coupled, Atomic, AtomicModelBuilder,  # noqa: F401
                      Model, Port, InPort, OutPort, Link)
+from .graph import GraphIndex  # noqa: F401
+from .validation import validate, find_problems  # noqa: F401
+from .hashing import structural_hash, structural_diff, ModelChange  # noqa: F401
+from .replicated import ModelArray, Replica, replicate  # noqa: F401
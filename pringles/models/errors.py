@@ -6,3 +6,18 @@ class PortNotFoundException(Exception):
 class AtomicNameIsKeywordException(Exception):
     def __init__(self, atomic_name):
         super().__init__(f"The name of your atomic ({atomic_name}) is a keyword.")
+
+
+class ForeignPortException(ValueError):
+    def __init__(self, coupled, port):
+        super().__init__(f"A coupling of {coupled.name} references the port {port.name} of "
+                         f"{port.owner.name}, which is neither {coupled.name} nor one of its "
+                         f"components.")
+        self.coupled = coupled
+        self.port = port
+
+
+class InvalidModelException(ValueError):
+    def __init__(self, problems):
+        super().__init__(f"The model has {len(problems)} problems:\n" + "\n".join(problems))
+        self.problems = problems
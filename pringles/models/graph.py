@@ -0,0 +1,324 @@
+"""
+A graph index of a model hierarchy, to answer structural questions about it without
+recursive scans of its couplings.
+"""
+from __future__ import annotations
+import weakref
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from .models import Model, Atomic, Coupled, Port, InPort, OutPort
+from .replicated import ModelArray, Replica
+from .errors import ForeignPortException
+
+
+def _csr(nodes: int, sources: Sequence[int],
+         targets: Sequence[int]) -> Tuple[List[int], List[int]]:
+    """Builds the compressed sparse rows of the edges between numbered nodes, with a counting
+    sort: the targets of node ``n`` are ``targets[offsets[n]:offsets[n + 1]]``."""
+    offsets = [0] * (nodes + 1)
+    for source in sources:
+        offsets[source + 1] += 1
+    for node in range(nodes):
+        offsets[node + 1] += offsets[node]
+    sorted_targets = [0] * len(targets)
+    next_slot = offsets[:-1]
+    for source, target in zip(sources, targets):
+        sorted_targets[next_slot[source]] = target
+        next_slot[source] += 1
+    return offsets, sorted_targets
+
+
+def _strongly_connected_components(nodes: Sequence[int],
+                                   successors: Dict[int, List[int]]) -> List[List[int]]:
+    """Tarjan's strongly connected components algorithm, run without recursion so deep
+    hierarchies don't reach the interpreter recursion limit."""
+    order: Dict[int, int] = {}
+    lowlink: Dict[int, int] = {}
+    stack: List[int] = []
+    on_stack: Dict[int, None] = {}
+    components: List[List[int]] = []
+    for root in nodes:
+        if root in order:
+            continue
+        work: List[Tuple[int, int]] = [(root, 0)]
+        while work:
+            node, next_successor = work.pop()
+            if next_successor == 0:
+                order[node] = lowlink[node] = len(order)
+                stack.append(node)
+                on_stack[node] = None
+            if next_successor < len(successors[node]):
+                successor = successors[node][next_successor]
+                work.append((node, next_successor + 1))
+                if successor not in order:
+                    work.append((successor, 0))
+                elif successor in on_stack:
+                    lowlink[node] = min(lowlink[node], order[successor])
+                continue
+            if lowlink[node] == order[node]:
+                components.append(_pop_component(node, stack, on_stack))
+            if work:
+                lowlink[work[-1][0]] = min(lowlink[work[-1][0]], lowlink[node])
+    return components
+
+
+def _pop_component(root: int, stack: List[int], on_stack: Dict[int, None]) -> List[int]:
+    component: List[int] = []
+    while not component or component[-1] != root:
+        component.append(stack.pop())
+        del on_stack[component[-1]]
+    component.reverse()
+    return component
+
+
+class GraphIndex:
+    """The ports of a model hierarchy, numbered, and its couplings at every level, as the
+    edges between them, in compressed sparse rows. It's built in a single pass over the
+    hierarchy, and answers flattening, reachability, cycle and fan-in/out queries in time
+    linear in the ports and couplings involved.
+
+    A :class:`ModelArray` is indexed as a single model, like an atomic, whose ports are the
+    ones of its copies that couplings reference.
+
+    Use :meth:`of` to get the index of a model, which is cached until the structure of any
+    model changes through its ``add_*`` methods. Changes made by mutating the ``subcomponents``,
+    ports or couplings lists directly are not tracked.
+    """
+
+    _cache: 'weakref.WeakKeyDictionary[Model, GraphIndex]' = weakref.WeakKeyDictionary()
+
+    def __init__(self, model: Model):
+        """
+        :param model: The top model of the indexed hierarchy
+        :type model: Model
+        :raises ForeignPortException: A coupling references a port of a model out of the
+            coupled model it belongs to
+        """
+        self.model = model
+        self.version = Model._structure_version
+        self.models: List[Model] = []
+        self.model_ids: Dict[Model, int] = {}
+        self.parents: List[int] = []
+        self.ports: List[Port] = []
+        self.port_models: List[int] = []
+        self.port_ids: Dict[Port, int] = {}
+        self.links = 0
+
+        sources: List[int] = []
+        targets: List[int] = []
+        pending = [(model, -1)]
+        while pending:
+            current, parent = pending.pop()
+            model_id = len(self.models)
+            self.models.append(current)
+            self.model_ids[current] = model_id
+            self.parents.append(parent)
+            for port in current.inports + current.outports:
+                self.port_ids[port] = len(self.ports)
+                self.ports.append(port)
+                self.port_models.append(model_id)
+            if isinstance(current, Coupled):
+                pending.extend((submodel, model_id) for submodel in reversed(current.subcomponents))
+        model_ports = len(self.ports)
+        for model_id, current in enumerate(self.models):
+            if isinstance(current, Coupled):
+                for link in current.eic + current.ic + current.eoc:
+                    sources.append(self._port_id(current, model_id, link.from_port))
+                    targets.append(self._port_id(current, model_id, link.to_port))
+        self.links = len(sources)
+        # The ports of the copies of each array that couplings reference
+        self._array_ports: Dict[int, List[Port]] = {}
+        for port_id in range(model_ports, len(self.ports)):
+            self._array_ports.setdefault(self.port_models[port_id], []).append(self.ports[port_id])
+        self._offsets, self._targets = _csr(len(self.ports), sources, targets)
+        self._in_offsets, self._sources = _csr(len(self.ports), targets, sources)
+
+    def _port_id(self, coupled: Coupled, coupled_id: int, port: Port) -> int:
+        port_id = self.port_ids.get(port)
+        if port_id is None and isinstance(port.owner, Replica) and \
+           port.owner.array in self.model_ids:
+            port_id = self.port_ids[port] = len(self.ports)
+            self.ports.append(port)
+            self.port_models.append(self.model_ids[port.owner.array])
+        if port_id is None:
+            raise ForeignPortException(coupled, port)
+        owner_id = self.port_models[port_id]
+        if owner_id != coupled_id and self.parents[owner_id] != coupled_id:
+            raise ForeignPortException(coupled, port)
+        return port_id
+
+    @classmethod
+    def of(cls, model: Model) -> GraphIndex:
+        """Returns the index of a model, built again only if some model structure changed
+        since it was last built.
+
+        :param model: The top model of the indexed hierarchy
+        :type model: Model
+        :rtype: GraphIndex
+        """
+        index = cls._cache.get(model)
+        if index is None or index.stale:
+            index = cls(model)
+            cls._cache[model] = index
+        return index
+
+    @property
+    def stale(self) -> bool:
+        """Whether some model structure changed since the index was built."""
+        return self.version != Model._structure_version
+
+    def successors(self, port: Port) -> List[Port]:
+        """Returns the ports a port is coupled to."""
+        port_id = self.port_ids[port]
+        return [self.ports[target] for target in
+                self._targets[self._offsets[port_id]:self._offsets[port_id + 1]]]
+
+    def predecessors(self, port: Port) -> List[Port]:
+        """Returns the ports coupled to a port."""
+        port_id = self.port_ids[port]
+        return [self.ports[source] for source in
+                self._sources[self._in_offsets[port_id]:self._in_offsets[port_id + 1]]]
+
+    def fan_out(self, port: Port) -> int:
+        port_id = self.port_ids[port]
+        return self._offsets[port_id + 1] - self._offsets[port_id]
+
+    def fan_in(self, port: Port) -> int:
+        port_id = self.port_ids[port]
+        return self._in_offsets[port_id + 1] - self._in_offsets[port_id]
+
+    def fan_stats(self) -> Dict[str, float]:
+        """Summarizes how many couplings leave and reach the ports.
+
+        :return: The maximum and mean fan-out and fan-in, over the ports with any coupling
+        :rtype: Dict[str, float]
+        """
+        fan_outs = [self._offsets[port + 1] - self._offsets[port]
+                    for port in range(len(self.ports))]
+        fan_ins = [self._in_offsets[port + 1] - self._in_offsets[port]
+                   for port in range(len(self.ports))]
+        coupled_outs = [fan for fan in fan_outs if fan]
+        coupled_ins = [fan for fan in fan_ins if fan]
+        return {
+            'max_fan_out': max(fan_outs, default=0),
+            'mean_fan_out': sum(coupled_outs) / len(coupled_outs) if coupled_outs else 0.0,
+            'max_fan_in': max(fan_ins, default=0),
+            'mean_fan_in': sum(coupled_ins) / len(coupled_ins) if coupled_ins else 0.0,
+        }
+
+    def _is_terminal(self, port_id: int) -> bool:
+        """Atomic and array ports, and the top model ones, are where couplings end once
+        flattened."""
+        owner_id = self.port_models[port_id]
+        return owner_id == 0 or isinstance(self.models[owner_id], (Atomic, ModelArray))
+
+    def _terminals_from(self, port_id: int, memo: Dict[int, List[int]]) -> List[int]:
+        """Returns the terminal ports a port reaches through coupled model ports only. Those
+        paths have no cycles, as couplings go from an input port to inner ones, and from an
+        output port to outer ones or to siblings inputs."""
+        stack = [(port_id, False)]
+        while stack:
+            current, expanded = stack.pop()
+            if current in memo:
+                continue
+            successors = self._targets[self._offsets[current]:self._offsets[current + 1]]
+            if not expanded:
+                stack.append((current, True))
+                stack.extend((successor, False) for successor in successors
+                             if not self._is_terminal(successor) and successor not in memo)
+                continue
+            reached: Dict[int, None] = {}
+            for successor in successors:
+                if self._is_terminal(successor):
+                    reached[successor] = None
+                else:
+                    reached.update(dict.fromkeys(memo[successor]))
+            memo[current] = list(reached)
+        return memo[port_id]
+
+    def flatten(self) -> List[Tuple[Port, Port]]:
+        """Returns the couplings of the hierarchy as if it had a single level: between atomic
+        ports, and from and to the top model ports, following the coupled models ports in
+        between.
+
+        :return: The flattened couplings, as pairs of ports
+        :rtype: List[Tuple[Port, Port]]
+        """
+        memo: Dict[int, List[int]] = {}
+        flattened: List[Tuple[Port, Port]] = []
+        for port_id, port in enumerate(self.ports):
+            is_source = (isinstance(port, OutPort) if self.port_models[port_id] != 0
+                         else isinstance(port, InPort))
+            if self._is_terminal(port_id) and is_source:
+                flattened.extend((port, self.ports[target])
+                                 for target in self._terminals_from(port_id, memo))
+        return flattened
+
+    def _atomic_successors(self, model_id: int, memo: Dict[int, List[int]]) -> Iterable[int]:
+        """The models an atomic or array (or the top model inputs) feeds, assuming any input of
+        an atomic may produce any of its outputs."""
+        model = self.models[model_id]
+        if model_id == 0:
+            ports = model.inports
+        elif isinstance(model, ModelArray):
+            ports = [port for port in self._array_ports.get(model_id, [])
+                     if isinstance(port, OutPort)]
+        else:
+            ports = model.outports
+        for port in ports:
+            for target in self._terminals_from(self.port_ids[port], memo):
+                yield self.port_models[target]
+
+    def reachable_atomics(self, ports: Iterable[Port]) -> List[Atomic]:
+        """Returns the atomics that the messages sent to some ports can reach, directly or
+        through other atomics, assuming any input of an atomic may produce any of its outputs.
+
+        :param ports: The ports the messages are sent to, usually top model input ports
+        :type ports: Iterable[Port]
+        :return: The reachable atomics, and arrays of copies, in breadth first order
+        :rtype: List[Atomic]
+        """
+        memo: Dict[int, List[int]] = {}
+        reached: Dict[int, None] = {}
+        frontier: List[int] = []
+        for port in ports:
+            port_id = self.port_ids[port]
+            targets = ([port_id] if self._is_terminal(port_id) and self.port_models[port_id]
+                       else self._terminals_from(port_id, memo))
+            for target in targets:
+                owner_id = self.port_models[target]
+                if owner_id != 0 and owner_id not in reached:
+                    reached[owner_id] = None
+                    frontier.append(owner_id)
+        while frontier:
+            next_frontier = []
+            for model_id in frontier:
+                for successor in self._atomic_successors(model_id, memo):
+                    if successor != 0 and successor not in reached:
+                        reached[successor] = None
+                        next_frontier.append(successor)
+            frontier = next_frontier
+        return [self.models[model_id] for model_id in reached]  # type: ignore
+
+    def atomic_cycles(self) -> List[List[Atomic]]:
+        """Finds the groups of atomics that feed each other, directly or through others. An
+        array of copies is taken as a single atomic.
+
+        :return: Each group with more than one atomic, or with one coupled to itself
+        :rtype: List[List[Atomic]]
+        """
+        memo: Dict[int, List[int]] = {}
+        atomic_ids = [model_id for model_id, model in enumerate(self.models)
+                      if model_id != 0 and isinstance(model, (Atomic, ModelArray))]
+        successors = {model_id: [successor for successor in
+                                 dict.fromkeys(self._atomic_successors(model_id, memo))
+                                 if successor != 0]
+                      for model_id in atomic_ids}
+        return [[self.models[member] for member in component]  # type: ignore
+                for component in _strongly_connected_components(atomic_ids, successors)
+                if len(component) > 1 or component[0] in successors[component[0]]]
+
+    def model_of(self, port: Port) -> Optional[Model]:
+        """Returns the model owning a port, if it's in the hierarchy."""
+        port_id = self.port_ids.get(port)
+        return None if port_id is None else self.models[self.port_models[port_id]]
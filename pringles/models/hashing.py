@@ -0,0 +1,189 @@
+"""
+Fingerprints of model hierarchies, to tell whether a model changed, and where, without
+comparing it whole.
+"""
+from __future__ import annotations
+import json
+import hashlib
+import weakref
+from typing import Dict, List, Optional, Tuple, cast
+
+from .models import Model, Atomic, Coupled, Link
+from .replicated import ModelArray
+
+_CHILDREN_SEPARATOR = b'\0'
+
+
+class _HashEntry:
+    """The digests of a model, and what they were computed from."""
+
+    def __init__(self, model: Model, children: Tuple[bytes, ...], local_digest: bytes,
+                 digest: bytes):
+        self.local_version = model._local_version
+        self.name = model.name
+        self.params = dict(model.model_params) if isinstance(model, Atomic) else None
+        self.children = children
+        self.local_digest = local_digest
+        self.digest = digest
+
+    def matches(self, model: Model, children: Tuple[bytes, ...]) -> bool:
+        return (self.local_version == model._local_version and self.name == model.name and
+                self.children == children and
+                (self.params is None or self.params == cast(Atomic, model).model_params))
+
+
+_entries: 'weakref.WeakKeyDictionary[Model, _HashEntry]' = weakref.WeakKeyDictionary()
+
+
+class ModelChange:
+    """A difference between two model hierarchies, found by :func:`structural_diff`."""
+
+    ADDED = 'added'
+    REMOVED = 'removed'
+    CHANGED = 'changed'
+
+    def __init__(self, path: str, kind: str, old: Optional[Model], new: Optional[Model]):
+        """
+        :param path: Names of the models from the top one down to the changed one, dot separated
+        :type path: str
+        :param kind: Whether the model was added, removed, or changed itself, as its ports,
+            parameters or couplings, and not only within its components
+        :type kind: str
+        :param old: The model in the old hierarchy, None if it was added
+        :type old: Optional[Model]
+        :param new: The model in the new hierarchy, None if it was removed
+        :type new: Optional[Model]
+        """
+        self.path = path
+        self.kind = kind
+        self.old = old
+        self.new = new
+
+    def __repr__(self):
+        return f"ModelChange({self.path}: {self.kind})"
+
+
+def structural_hash(model: Model) -> str:
+    """Hashes a model hierarchy, from the names, types, parameters, ports and couplings of its
+    models, Merkle style: each coupled model hash covers the hashes of its components.
+
+    The hashes of each model are cached, and only computed again for the models changed since,
+    and the coupled models above them. Models changed through their ``add_*`` methods, renamed
+    or with different parameters are noticed, but not ports renamed or lists of ports and
+    couplings mutated directly. Noticing them takes a walk over the hierarchy, as models don't
+    know their parents, so each call is linear in the models, but only the changed ones are
+    hashed again.
+
+    :param model: The top model of the hierarchy
+    :type model: Model
+    :return: The SHA-256 hash, in hexadecimal
+    :rtype: str
+    """
+    return _entry_of(model).digest.hex()
+
+
+def structural_diff(old: Model, new: Model) -> List[ModelChange]:
+    """Finds the models that differ between two hierarchies, matching components by name.
+    Subtrees with the same :func:`structural_hash` are not looked into.
+
+    :param old: The top model of the old hierarchy
+    :type old: Model
+    :param new: The top model of the new hierarchy
+    :type new: Model
+    :return: The changes, parents before their components
+    :rtype: List[ModelChange]
+    """
+    # Each hierarchy is walked once, and its entries looked up as the diff goes down
+    old_entries, new_entries = _entries_of(old), _entries_of(new)
+    changes: List[ModelChange] = []
+    pending = [(old, new, new.name)]
+    while pending:
+        old_model, new_model, path = pending.pop()
+        old_entry, new_entry = old_entries[old_model], new_entries[new_model]
+        if old_entry.digest == new_entry.digest:
+            continue
+        if old_entry.local_digest != new_entry.local_digest:
+            changes.append(ModelChange(path, ModelChange.CHANGED, old_model, new_model))
+        if not (isinstance(old_model, Coupled) and isinstance(new_model, Coupled)):
+            continue
+        old_components = {component.name: component for component in old_model.subcomponents}
+        new_names = set()
+        for component in new_model.subcomponents:
+            new_names.add(component.name)
+            component_path = f"{path}.{component.name}"
+            if component.name in old_components:
+                pending.append((old_components[component.name], component, component_path))
+            else:
+                changes.append(ModelChange(component_path, ModelChange.ADDED, None, component))
+        changes.extend(ModelChange(f"{path}.{name}", ModelChange.REMOVED, component, None)
+                       for name, component in old_components.items() if name not in new_names)
+    return changes
+
+
+def _entry_of(model: Model) -> _HashEntry:
+    return _entries_of(model)[model]
+
+
+def _entries_of(model: Model) -> Dict[Model, _HashEntry]:
+    """Returns the up to date digests of a model and of every model below it, visiting its
+    hierarchy bottom up without recursion, so deep hierarchies don't reach the interpreter
+    recursion limit."""
+    entries: Dict[Model, _HashEntry] = {}
+    expanded = set()
+    pending = [model]
+    while pending:
+        current = pending[-1]
+        if current in entries:
+            pending.pop()
+            continue
+        components = _components_of(current)
+        if current not in expanded and components:
+            expanded.add(current)
+            pending.extend(component for component in components if component not in entries)
+            continue
+        pending.pop()
+        entries[current] = _updated_entry(current, tuple(entries[component].digest
+                                                         for component in components))
+    return entries
+
+
+def _components_of(model: Model) -> List[Model]:
+    if isinstance(model, Coupled):
+        return model.subcomponents
+    # The template stands for every copy of an array
+    return [model.template] if isinstance(model, ModelArray) else []
+
+
+def _updated_entry(model: Model, children: Tuple[bytes, ...]) -> _HashEntry:
+    entry = _entries.get(model)
+    if entry is not None and entry.matches(model, children):
+        return entry
+    local_digest = hashlib.sha256(json.dumps(_local_fields(model), default=str).encode())
+    digest = local_digest.copy()
+    for child in children:
+        digest.update(_CHILDREN_SEPARATOR + child)
+    entry = _HashEntry(model, children, local_digest.digest(), digest.digest())
+    _entries[model] = entry
+    return entry
+
+
+def _local_fields(model: Model) -> list:
+    ports = [[port.name for port in model.inports], [port.name for port in model.outports]]
+    if isinstance(model, Atomic):
+        return ['atomic', model.name, model.get_abstract_model_name(),
+                sorted([key, str(value)] for key, value in model.model_params.items()), ports]
+    if isinstance(model, ModelArray):
+        # The naming function stands for the copies names, which aren't listed, as they are
+        # as many as the copies. Its first and last names tell apart namings of the same name
+        named = [model.instance_name(0), model.instance_name(model.size - 1)] if model.size else []
+        return ['array', model.name, model.size,
+                [getattr(model.naming, '__module__', None),
+                 getattr(model.naming, '__qualname__', None)] + named,
+                sorted([index, sorted(atomics.items())] for index, atomics in
+                       model.overrides.items()),
+                model.instance_couplings]
+    coupled = cast(Coupled, model)
+    return ['coupled', model.name, ports] + [
+        [[link.from_port.get_identifier_for(coupled), link.to_port.get_identifier_for(coupled)]
+         for link in cast(List[Link], links)]
+        for links in (coupled.eic, coupled.ic, coupled.eoc)]
@@ -4,7 +4,7 @@ This is the models module docstring
 from __future__ import annotations
 from typing import List, Any, Union
 
-from .errors import AtomicNameIsKeywordException, PortNotFoundException
+from .errors import AtomicNameIsKeywordException, PortNotFoundException, ForeignPortException
 
 DISCOVERED_INPUT_PORTS_FIELD = "discovered_input_ports"
 DISCOVERED_OUTPUT_PORTS_FIELD = "discovered_output_ports"
@@ -49,6 +49,12 @@ class Model:
     Model is the base class for all DEVS model instances, be it an Atomic or a Coupled.
     """
 
+    # Bumped on every structural change made through the add_* methods, of any model and of
+    # each one, so indexes of the models structure (see GraphIndex and structural_hash) know
+    # when they are stale
+    _structure_version = 0
+    _local_version = 0
+
     def __init__(self, name: str):
         self.name = name
         self.inports: List[Port] = []
@@ -60,13 +66,19 @@ class Model:
     def add_outport(self, name: str):
         outport = OutPort(name, self)
         self.outports.append(outport)
+        self._structure_changed()
         return self
 
     def add_inport(self, name: str):
         inport = InPort(name, self)
         self.inports.append(inport)
+        self._structure_changed()
         return self
 
+    def _structure_changed(self) -> None:
+        Model._structure_version += 1
+        self._local_version += 1
+
     def get_port(self, name: str) -> Port:
         for port in self.inports + self.outports:
             if port.name == name:
@@ -157,12 +169,15 @@ class Coupled(Model):
 
     def add_internal_coupling(self, link: IntLink):
         self.ic.append(link)
+        self._structure_changed()
 
     def add_external_input_coupling(self, link: ExtInputLink):
         self.eic.append(link)
+        self._structure_changed()
 
     def add_external_output_coupling(self, link: ExtOutputLink):
         self.eoc.append(link)
+        self._structure_changed()
 
     # Implements Coupled functional interface
     def add_coupling(self, from_port: Union[Port, str], to_port: Union[Port, str]) -> Coupled:
@@ -208,4 +223,4 @@ class Coupled(Model):
 _KEYWORDS = [cls.__name__ for cls in (AtomicModelBuilder, Model, Port, InPort,
                                       OutPort, Link, ExtInputLink, ExtOutputLink,
                                       IntLink, Atomic, Coupled, AtomicNameIsKeywordException,
-                                      PortNotFoundException)]
+                                      PortNotFoundException, ForeignPortException)]
@@ -0,0 +1,208 @@
+"""
+Arrays of copies of a model, kept as the model and what differs in each copy.
+"""
+from __future__ import annotations
+import copy
+import weakref
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from .models import Model, Atomic, Coupled, InPort, OutPort
+
+# Names a model of a copy, from its name in the template and the copy index
+Naming = Callable[[str, int], str]
+
+
+def default_naming(name: str, index: int) -> str:
+    return f"{name}_{index}"
+
+
+class ModelArray(Model):
+    """Many copies of a template model, as a single component of a coupled model. Only the
+    template, the parameters overridden in each copy, and the couplings between copies are
+    kept, so memory doesn't grow with the copies. Each copy is a component of its own when
+    serialized: :class:`MaSerializer` writes its sections directly from the template.
+
+    Couplings with a copy are added to the parent coupled model through the ports of
+    ``array[index]``, a :class:`Replica` created when asked for. Structural tools that need
+    every model, such as :class:`GraphIndex` or the JSON serializer, work on the models
+    :meth:`materialize` builds.
+    """
+
+    def __init__(self, template: Model, size: int, naming: Naming = default_naming):
+        """
+        :param template: The copied model, which shouldn't change while it's replicated
+        :type template: Model
+        :param size: Amount of copies
+        :type size: int
+        :param naming: Names each model of a copy, from its template name and the copy
+            index, defaults to ``name_index``
+        :type naming: Callable[[str, int], str], optional
+        """
+        super().__init__(template.name)
+        if size < 0:
+            raise ValueError("Arrays can't have a negative size")
+        pending = [template]
+        while pending:
+            model = pending.pop()
+            if isinstance(model, ModelArray):
+                raise ValueError("Arrays can't be replicated")
+            if isinstance(model, Coupled):
+                pending.extend(model.subcomponents)
+        self.template = template
+        self.size = size
+        self.naming = naming
+        # Parameters of each copy atomics, by copy index and atomic name in the template
+        self.overrides: Dict[int, Dict[str, Dict[str, Any]]] = {}
+        # Couplings from a port of each copy to a port of the copy offset from it
+        self.instance_couplings: List[Tuple[str, str, int]] = []
+        self._replicas: 'weakref.WeakValueDictionary[int, Replica]' = \
+            weakref.WeakValueDictionary()
+
+    def __getstate__(self) -> Dict[str, Any]:
+        # The replicas in use are pickled along the couplings that reference them
+        state = self.__dict__.copy()
+        del state['_replicas']
+        return state
+
+    def __setstate__(self, state: Dict[str, Any]) -> None:
+        self.__dict__.update(state)
+        self._replicas = weakref.WeakValueDictionary()
+
+    def __len__(self) -> int:
+        return self.size
+
+    def __getitem__(self, index: int) -> Replica:
+        if not 0 <= index < self.size:
+            raise IndexError(f"{self.name} has {self.size} copies, there is no copy {index}")
+        replica = self._replicas.get(index)
+        if replica is None:
+            replica = Replica(self, index)
+            self._replicas[index] = replica
+        return replica
+
+    def __str__(self) -> str:
+        return ' '.join(self.component_entry(index) for index in range(self.size))
+
+    def instance_name(self, index: int, name: Optional[str] = None) -> str:
+        """Returns the name of a model of a copy, by default its top one."""
+        return self.naming(self.template.name if name is None else name, index)
+
+    def component_entry(self, index: int) -> str:
+        """Returns how a copy is listed among the ``.ma`` components of the parent model."""
+        if isinstance(self.template, Atomic):
+            return f"{self.instance_name(index)}@{self.template.get_abstract_model_name()}"
+        return self.instance_name(index)
+
+    def override(self, index: int, atomic_name: Optional[str] = None,
+                 **params: Any) -> ModelArray:
+        """Sets parameters of an atomic of a single copy.
+
+        :param index: The copy index
+        :type index: int
+        :param atomic_name: Name of the atomic in the template, defaults to the template
+            itself, when it's an atomic
+        :type atomic_name: Optional[str], optional
+        :return: The array, to chain calls
+        :rtype: ModelArray
+        """
+        if not 0 <= index < self.size:
+            raise IndexError(f"{self.name} has {self.size} copies, there is no copy {index}")
+        atomic_name = self.template.name if atomic_name is None else atomic_name
+        self.overrides.setdefault(index, {}).setdefault(atomic_name, {}).update(params)
+        self._structure_changed()
+        return self
+
+    def couple_instances(self, from_port: str, to_port: str, offset: int = 1) -> ModelArray:
+        """Couples an output port of every copy to an input port of the copy ``offset``
+        positions after it, when there's one.
+
+        :param from_port: Name of the output port of the template
+        :type from_port: str
+        :param to_port: Name of the input port of the template
+        :type to_port: str
+        :param offset: Distance between the coupled copies, negative to couple with the ones
+            before, defaults to 1
+        :type offset: int, optional
+        :return: The array, to chain calls
+        :rtype: ModelArray
+        """
+        if not isinstance(self.template.get_port(from_port), OutPort) or \
+           not isinstance(self.template.get_port(to_port), InPort):
+            raise ValueError(f"Copies are coupled from an output port to an input port, not "
+                             f"from {from_port} to {to_port}")
+        self.instance_couplings.append((from_port, to_port, offset))
+        self._structure_changed()
+        return self
+
+    def coupled_copies(self) -> List[Tuple[int, str, int, str]]:
+        """Returns the couplings between copies, as the index and output port name of the
+        source copy, and the index and input port name of the target one."""
+        return [(index, from_port, index + offset, to_port)
+                for from_port, to_port, offset in self.instance_couplings
+                for index in range(max(0, -offset), min(self.size, self.size - offset))]
+
+    def instance_links(self) -> List[Tuple[str, str]]:
+        """Returns the couplings between copies, as ``.ma`` port identifiers."""
+        return [(f"{from_port}@{self.instance_name(from_index)}",
+                 f"{to_port}@{self.instance_name(to_index)}")
+                for from_index, from_port, to_index, to_port in self.coupled_copies()]
+
+    def materialize(self, index: int) -> Model:
+        """Builds a copy as models of its own, with its names and overridden parameters. The
+        couplings of the copy with other models are not included.
+
+        :param index: The copy index
+        :type index: int
+        :rtype: Model
+        """
+        if not 0 <= index < self.size:
+            raise IndexError(f"{self.name} has {self.size} copies, there is no copy {index}")
+        instance = copy.deepcopy(self.template)
+        overrides = self.overrides.get(index, {})
+        pending = [instance]
+        while pending:
+            model = pending.pop()
+            if isinstance(model, Atomic) and model.name in overrides:
+                model.model_params = {**model.model_params, **overrides[model.name]}
+            elif isinstance(model, Coupled):
+                pending.extend(model.subcomponents)
+            model.name = self.instance_name(index, model.name)
+        return instance
+
+
+class Replica(Model):
+    """A copy of a :class:`ModelArray`, with the ports of the template, to couple it with
+    other models. It's only a view: its components and parameters are the template ones."""
+
+    def __init__(self, array: ModelArray, index: int):
+        super().__init__(array.instance_name(index))
+        self.array = array
+        self.index = index
+        self.inports = [InPort(port.name, self) for port in array.template.inports]
+        self.outports = [OutPort(port.name, self) for port in array.template.outports]
+
+    def __str__(self) -> str:
+        return self.array.component_entry(self.index)
+
+
+def replicate(template: Model, size: int, naming: Naming = default_naming,
+              overrides: Optional[Dict[int, Dict[str, Dict[str, Any]]]] = None) -> ModelArray:
+    """Builds an array of copies of a model, see :class:`ModelArray`.
+
+    :param template: The copied model
+    :type template: Model
+    :param size: Amount of copies
+    :type size: int
+    :param naming: Names each model of a copy, from its template name and the copy index,
+        defaults to ``name_index``
+    :type naming: Callable[[str, int], str], optional
+    :param overrides: Parameters of the copies atomics, by copy index and atomic name in the
+        template, defaults to None
+    :type overrides: Optional[Dict[int, Dict[str, Dict[str, Any]]]], optional
+    :rtype: ModelArray
+    """
+    array = ModelArray(template, size, naming)
+    for index, atomics in (overrides or {}).items():
+        for atomic_name, params in atomics.items():
+            array.override(index, atomic_name, **params)
+    return array
@@ -0,0 +1,158 @@
+"""
+Structural checks of model hierarchies, to find the mistakes CD++ would only report once
+launched, or not report at all.
+"""
+from __future__ import annotations
+import re
+from typing import Dict, List, Optional, Set, Iterable, Tuple, cast
+
+from .models import Model, Coupled, Port, InPort, OutPort, Link
+from .replicated import ModelArray, Replica
+from .errors import InvalidModelException
+
+TOP_MODEL_NAME = 'top'
+# Spaces, and the characters CD++ uses to delimit sections, keys, model types and comments
+_NAME_PATTERN = re.compile(r'[^\s@:\[\]%]+\Z')
+
+
+def find_problems(model: Model) -> List[str]:
+    """Checks a model hierarchy in a single pass over its models, ports and couplings:
+
+    * Every model has a name unique in the hierarchy, as they name the ``.ma`` sections,
+      and is a component of a single coupled model.
+    * Model and port names are valid in the ``.ma`` syntax, and ports names are unique
+      within each model.
+    * Couplings reference ports of their coupled model or of its components, that are still
+      listed by their owner, in the direction of their kind.
+
+    The template of a :class:`ModelArray` is checked once, not for each copy, but the names
+    of the models of every copy are checked along the others.
+
+    :param model: The top model of the hierarchy
+    :type model: Model
+    :return: A description of each problem found
+    :rtype: List[str]
+    """
+    problems: List[str] = []
+    parents: Dict[Model, Model] = {}
+    names: Dict[str, Model] = {}
+    ports: Set[Port] = set()
+    coupled_models: List[Coupled] = []
+
+    pending = [model]
+    while pending:
+        current = pending.pop()
+        _check_names(current, current is model, names, problems)
+        ports.update(current.inports)
+        ports.update(current.outports)
+        if isinstance(current, ModelArray):
+            problems.extend(f"In the copies of {current.name}: {problem}"
+                            for problem in find_problems(current.template))
+        if isinstance(current, Coupled):
+            coupled_models.append(current)
+            for submodel in current.subcomponents:
+                if submodel in parents or submodel is model:
+                    problems.append(f"{submodel.name} is a component of {current.name}, and "
+                                    "already part of the hierarchy elsewhere")
+                    continue
+                parents[submodel] = current
+                pending.append(submodel)
+
+    for coupled in coupled_models:
+        components = set(coupled.subcomponents)
+        for kind, links in _links_by_kind(coupled):
+            for link in links:
+                problem = _link_problem(coupled, components, ports, kind, link)
+                if problem is not None:
+                    problems.append(problem)
+    return problems
+
+
+def validate(model: Model) -> None:
+    """Checks a model hierarchy, see :func:`find_problems`.
+
+    :param model: The top model of the hierarchy
+    :type model: Model
+    :raises InvalidModelException: Some problem was found, all of them are listed in it
+    """
+    problems = find_problems(model)
+    if problems:
+        raise InvalidModelException(problems)
+
+
+def _check_name(name: str, model: Model, is_top: bool, names: Dict[str, Model],
+                problems: List[str]) -> None:
+    if not _NAME_PATTERN.match(name):
+        problems.append(f"The name of {name!r} isn't valid in CD++")
+    elif name == TOP_MODEL_NAME and not is_top:
+        problems.append(f"Only the top model can be named {TOP_MODEL_NAME}")
+    elif name in names:
+        problems.append(f"There are many models named {name}")
+    names[name] = model
+
+
+def _check_copy_names(array: ModelArray, names: Dict[str, Model], problems: List[str]) -> None:
+    """Checks the names each copy gives the template models, as they name ``.ma`` sections.
+    Names repeated in the template are reported once, by the check of the template."""
+    template_names: Dict[str, None] = {}
+    pending = [array.template]
+    while pending:
+        current = pending.pop()
+        template_names[current.name] = None
+        if isinstance(current, Coupled):
+            pending.extend(current.subcomponents)
+    for index in range(array.size):
+        for name in template_names:
+            _check_name(array.instance_name(index, name), array, False, names, problems)
+
+
+def _check_names(model: Model, is_top: bool, names: Dict[str, Model],
+                 problems: List[str]) -> None:
+    if isinstance(model, ModelArray):
+        _check_copy_names(model, names, problems)
+        return
+    _check_name(model.name, model, is_top, names, problems)
+
+    port_names: Set[str] = set()
+    for port in model.inports + model.outports:
+        if not _NAME_PATTERN.match(port.name):
+            problems.append(f"The name of the port {port.name!r} of {model.name} "
+                            "isn't valid in CD++")
+        if port.name in port_names:
+            problems.append(f"{model.name} has many ports named {port.name}")
+        port_names.add(port.name)
+
+
+def _links_by_kind(coupled: Coupled) -> Iterable[Tuple[str, List[Link]]]:
+    return (('eic', cast(List[Link], coupled.eic)),
+            ('ic', cast(List[Link], coupled.ic)),
+            ('eoc', cast(List[Link], coupled.eoc)))
+
+
+# For each kind of coupling, whether its ports belong to the coupled model itself, or to a
+# component, and the type of port they should be
+_LINK_ENDS = {
+    'eic': ((True, InPort), (False, InPort)),
+    'ic': ((False, OutPort), (False, InPort)),
+    'eoc': ((False, OutPort), (True, OutPort)),
+}
+
+
+def _link_problem(coupled: Coupled, components: Set[Model], ports: Set[Port],
+                  kind: str, link: Link) -> Optional[str]:
+    for port, (of_coupled, port_type) in zip((link.from_port, link.to_port), _LINK_ENDS[kind]):
+        is_replica = isinstance(port.owner, Replica)
+        component = cast(Replica, port.owner).array if is_replica else port.owner
+        if port.owner is not coupled and component not in components:
+            reason = f"references {port.owner.name}, which isn't a component"
+        elif port not in ports and not is_replica:
+            reason = "references a port its model doesn't have"
+        elif (port.owner is coupled) != of_coupled or not isinstance(port, port_type):
+            reason = "doesn't go from an input to a component input, from a component " \
+                "output to a component input, or from a component output to an output"
+        else:
+            continue
+        return f"The {kind} coupling of {coupled.name} from {link.from_port.name}@" \
+            f"{link.from_port.owner.name} to {link.to_port.name}@{link.to_port.owner.name} " \
+            f"{reason}"
+    return None
@@ -1,2 +1,2 @@
-from pringles.serializers.json import JsonSerializer  # noqa: F401
-from pringles.serializers.ma import MaSerializer  # noqa: F401
+from pringles.serializers.json import JsonSerializer, CompactJsonSerializer  # noqa: F401
+from pringles.serializers.ma import MaSerializer, MaParser  # noqa: F401
@@ -1,8 +1,9 @@
 import json
+from collections import deque
 
-from typing import cast
+from typing import cast, Deque, Dict, Iterable, Iterator, List, Optional, TextIO, Tuple
 
-from pringles.models import Atomic, Coupled, Model, Port
+from pringles.models import Atomic, Coupled, Model, Port, ModelArray, Replica
 
 
 class JsonSerializer:
@@ -33,12 +34,41 @@ class JsonSerializer:
             }
         }
 
+    @staticmethod
+    def components_of(coupled: Coupled) -> List[Model]:
+        """Returns the submodels of a coupled model, with each :class:`ModelArray` replaced by
+        its copies, as :meth:`ModelArray.materialize` builds them."""
+        components: List[Model] = []
+        for submodel in coupled.subcomponents:
+            if isinstance(submodel, ModelArray):
+                components.extend(submodel.materialize(index) for index in range(submodel.size))
+            else:
+                components.append(submodel)
+        return components
+
+    @staticmethod
+    def component_at(coupled: Coupled, position: int) -> Optional[Model]:
+        """Returns a submodel of :meth:`components_of`, materializing only that one copy of
+        an array, or None if there are not so many."""
+        for submodel in coupled.subcomponents:
+            size = submodel.size if isinstance(submodel, ModelArray) else 1
+            if position < size:
+                return (submodel.materialize(position) if isinstance(submodel, ModelArray)
+                        else submodel)
+            position -= size
+        return None
+
     @classmethod
     def coupled_to_dict(cls, coupled: Coupled) -> dict:
+        return cls._coupled_to_dict(coupled, [cls.model_to_dict(model)
+                                              for model in cls.components_of(coupled)])
+
+    @classmethod
+    def _coupled_to_dict(cls, coupled: Coupled, models: List[dict]) -> dict:
         return {
             'id': coupled.name,
             'type': 'coupled',
-            'models': [cls.model_to_dict(model) for model in coupled.subcomponents],
+            'models': models,
             'ports': {
                 'out': [cls.outport_to_dict(outport) for outport in coupled.outports],
                 'in': [cls.inport_to_dict(inport) for inport in coupled.inports]
@@ -67,9 +97,68 @@ class JsonSerializer:
                     'from_model': coupling.from_port.owner.name
                 }
                 for coupling in coupled.ic
+            ] + [
+                {
+                    'to_port': to_port,
+                    'to_model': array.instance_name(to_index),
+                    'from_port': from_port,
+                    'from_model': array.instance_name(from_index)
+                }
+                for array in coupled.subcomponents if isinstance(array, ModelArray)
+                for from_index, from_port, to_index, to_port in array.coupled_copies()
             ]
         }
 
+    @classmethod
+    def model_summary_to_dict(cls, model: Model, path: str) -> dict:
+        """Serializes a model without its submodels, but with how many it has, how many ports,
+        and how many couplings, to stand for it until it's expanded.
+
+        :param model: The summarized model
+        :type model: Model
+        :param path: Position of the model in the hierarchy, as the indices of it and its
+            ancestors among their parent submodels, joined by dots. Empty for the top model
+        :type path: str
+        :rtype: dict
+        """
+        is_coupled = isinstance(model, Coupled)
+        coupled = cast(Coupled, model)
+        return {
+            'id': model.name,
+            'type': 'coupled' if is_coupled else 'atomic',
+            'ports': {
+                'out': [cls.outport_to_dict(outport) for outport in model.outports],
+                'in': [cls.inport_to_dict(inport) for inport in model.inports]
+            },
+            'path': path,
+            'summary': {
+                'models': (sum(submodel.size if isinstance(submodel, ModelArray) else 1
+                               for submodel in coupled.subcomponents) if is_coupled else 0),
+                'ports': len(model.outports) + len(model.inports),
+                'couplings': (len(coupled.eic) + len(coupled.ic) + len(coupled.eoc)
+                              if is_coupled else 0)
+            }
+        }
+
+    @classmethod
+    def level_to_dict(cls, coupled: Coupled, path: str = '') -> dict:
+        """Serializes a single level of a coupled model: its ports and couplings, and its
+        submodels summaries. Its size depends on the level only, not on the whole hierarchy.
+
+        :param coupled: The coupled model of the level
+        :type coupled: Coupled
+        :param path: Position of the coupled model in the hierarchy, as in
+            :meth:`model_summary_to_dict`. Defaults to the top model one
+        :type path: str
+        :rtype: dict
+        """
+        prefix = path + '.' if path else ''
+        level = cls._coupled_to_dict(coupled, [
+            cls.model_summary_to_dict(model, f'{prefix}{index}')
+            for index, model in enumerate(cls.components_of(coupled))])
+        level['path'] = path
+        return level
+
     @classmethod
     def model_to_dict(cls, model: Model) -> dict:
         if isinstance(model, Atomic):
@@ -80,3 +169,131 @@ class JsonSerializer:
     @classmethod
     def serialize(cls, model: Model) -> str:
         return json.dumps(cls.model_to_dict(model))
+
+
+class CompactJsonSerializer:
+    """Serializes a model to a compact JSON schema, meant for large models, where the nested
+    one of :class:`JsonSerializer` repeats every name and port attribute. Each name is
+    written once, in a ``strings`` table, and referenced by its index::
+
+        {"format": "pringles-compact/1",
+         "models": [[name, parent, [outports], [inports], [eic], [ic], [eoc]], ...],
+         "strings": [...]}
+
+    Models are listed breadth first, so the top model is the first one and every model comes
+    after its parent, referenced by its position in ``models`` (-1 for the top model). Atomic
+    models have no couplings fields. Couplings are flattened into lists of indices: the ``eic``
+    ones as ``to_model, from_port, to_port`` triples, the ``ic`` ones as ``from_model,
+    from_port, to_model, to_port`` quadruples, and the ``eoc`` ones as ``from_model,
+    from_port, to_port`` triples.
+
+    The model is walked without recursion, and the payload is produced in chunks, so it can
+    be written to a file without holding it whole in memory. Each :class:`ModelArray` is
+    written as its copies, as :meth:`ModelArray.materialize` builds them, one at a time.
+    """
+
+    FORMAT = 'pringles-compact/1'
+    CHUNK_MODELS = 1024
+
+    @staticmethod
+    def _indices(values: Iterable[int]) -> str:
+        return '[' + ','.join(map(str, values)) + ']'
+
+    @classmethod
+    def iter_serialize(cls, model: Model) -> Iterator[str]:
+        """Serializes a model, in chunks.
+
+        :param model: The model to serialize
+        :type model: Model
+        :return: The chunks of the payload
+        :rtype: Iterator[str]
+        """
+        strings: Dict[str, int] = {}
+        intern = strings.setdefault
+        indices = cls._indices
+        model_indices = _ModelIndices(model)
+        pending: Deque[Tuple[Model, int]] = deque([(model, -1)])
+        records: List[str] = []
+
+        yield f'{{"format": "{cls.FORMAT}", "models": ['
+        while pending:
+            current, parent = pending.popleft()
+            outports = indices(intern(port.name, len(strings)) for port in current.outports)
+            inports = indices(intern(port.name, len(strings)) for port in current.inports)
+            record = f'[{intern(current.name, len(strings))},{parent},{outports},{inports}'
+            if isinstance(current, Coupled):
+                pending.extend(model_indices.add_components(current))
+                owner = model_indices.owner_of
+                eic = indices(index for link in current.eic for index in (
+                    owner(link.to_port),
+                    intern(link.from_port.name, len(strings)),
+                    intern(link.to_port.name, len(strings))))
+                ic = indices(index for from_model, from_port, to_model, to_port in
+                             model_indices.internal_couplings(current) for index in (
+                                 from_model, intern(from_port, len(strings)),
+                                 to_model, intern(to_port, len(strings))))
+                eoc = indices(index for link in current.eoc for index in (
+                    owner(link.from_port),
+                    intern(link.from_port.name, len(strings)),
+                    intern(link.to_port.name, len(strings))))
+                record += f',{eic},{ic},{eoc}'
+            records.append(record + ']')
+            if len(records) == cls.CHUNK_MODELS:
+                yield ','.join(records) + (',' if pending else '')
+                records = []
+        yield ','.join(records)
+        yield '], "strings": ' + json.dumps(list(strings)) + '}'
+
+    @classmethod
+    def serialize(cls, model: Model) -> str:
+        return ''.join(cls.iter_serialize(model))
+
+    @classmethod
+    def write(cls, model: Model, file: TextIO) -> None:
+        """Writes the serialized model to an open text file."""
+        file.writelines(cls.iter_serialize(model))
+
+
+class _ModelIndices:
+    """The positions of the models listed by :class:`CompactJsonSerializer`, including the
+    copies of arrays, found from the ports that couplings reference."""
+
+    def __init__(self, top_model: Model):
+        self._indices = {id(top_model): 0}
+        self._copies: Dict[Tuple[int, int], int] = {}
+        # Materialized copies are kept, so their ids aren't reused while they're listed
+        self._materialized: List[Model] = []
+
+    def add_components(self, coupled: Coupled) -> List[Tuple[Model, int]]:
+        """Numbers the submodels of a coupled model, returning them along its own index."""
+        parent = self._indices[id(coupled)]
+        components = []
+        for submodel in coupled.subcomponents:
+            if isinstance(submodel, ModelArray):
+                for index in range(submodel.size):
+                    copy = submodel.materialize(index)
+                    self._materialized.append(copy)
+                    self._copies[(id(submodel), index)] = len(self._indices)
+                    self._indices[id(copy)] = len(self._indices)
+                    components.append((copy, parent))
+            else:
+                self._indices[id(submodel)] = len(self._indices)
+                components.append((submodel, parent))
+        return components
+
+    def owner_of(self, port: Port) -> int:
+        if isinstance(port.owner, Replica):
+            return self._copies[(id(port.owner.array), port.owner.index)]
+        return self._indices[id(port.owner)]
+
+    def internal_couplings(self, coupled: Coupled) -> Iterator[Tuple[int, str, int, str]]:
+        """The internal couplings of a coupled model, and the ones between the copies of its
+        arrays, as source model index and port name, and target model index and port name."""
+        for link in coupled.ic:
+            yield (self.owner_of(link.from_port), link.from_port.name,
+                   self.owner_of(link.to_port), link.to_port.name)
+        for array in coupled.subcomponents:
+            if isinstance(array, ModelArray):
+                for from_index, from_port, to_index, to_port in array.coupled_copies():
+                    yield (self._copies[(id(array), from_index)], from_port,
+                           self._copies[(id(array), to_index)], to_port)
@@ -1,6 +1,22 @@
-from typing import List, cast
+from __future__ import annotations
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Tuple, Type, cast
 
-from pringles.models import Atomic, Coupled, Model, Link
+from pringles.models import Atomic, AtomicModelBuilder, Coupled, Model, ModelArray, Link, Port
+from pringles.utils.errors import MaParsingException, NonExistingAtomicClassException
+
+if TYPE_CHECKING:
+    from pringles.simulator.registry import AtomicRegistry
+
+TOP_MODEL_NAME = 'top'
+COMMENT_MARK = '%'
+
+# The number of a model in a template, the model if it's an atomic, and its section
+_TemplateSection = Tuple[int, Optional[Atomic], str]
+
+
+def _escaped(value: Any) -> str:
+    """Escapes text to be written in a template formatted with ``str.format``."""
+    return str(value).replace('{', '{{').replace('}', '}}')
 
 
 class MaSerializer:
@@ -20,22 +36,262 @@ class MaSerializer:
             f"in: {' '.join([str(i) for i in coupled.inports])}\n"
         )
         links = (cast(List[Link], coupled.eic) +
-                 cast(List[Link], coupled.ic) +
-                 cast(List[Link], coupled.eoc))
+                 cast(List[Link], coupled.ic))
         for link in links:
-            ma += f"link: {link.from_port.get_identifier_for(coupled)} "
-            ma += f"{link.to_port.get_identifier_for(coupled)}\n"
+            ma += cls._link_to_ma(coupled, link)
+        for model in coupled.subcomponents:
+            if isinstance(model, ModelArray):
+                ma += ''.join(f"link: {from_port} {to_port}\n"
+                              for from_port, to_port in model.instance_links())
+        for link in coupled.eoc:
+            ma += cls._link_to_ma(coupled, link)
         for model in coupled.subcomponents:
             ma += f"\n\n{cls.model_to_ma(model)}"
         return ma
 
+    @staticmethod
+    def _link_to_ma(coupled: Coupled, link: Link) -> str:
+        return (f"link: {link.from_port.get_identifier_for(coupled)} "
+                f"{link.to_port.get_identifier_for(coupled)}\n")
+
+    @classmethod
+    def array_to_ma(cls, array: ModelArray) -> str:
+        """Writes the sections of every copy of an array. The template sections are written
+        once, with placeholders for the model names, and formatted with the names of each copy.
+        Only the atomics with overridden parameters are written again for a copy."""
+        sections, names = cls._template_sections(array.template)
+        copies = []
+        for index in range(array.size):
+            copy_names = {f"m{number}": array.naming(name, index)
+                          for number, name in enumerate(names)}
+            overrides = array.overrides.get(index, {})
+            copies.append("\n\n".join(
+                (section if atomic is None or atomic.name not in overrides else
+                 cls._atomic_template(number, {**atomic.model_params, **overrides[atomic.name]})
+                 ).format_map(copy_names)
+                for number, atomic, section in sections))
+        return "\n\n".join(copies)
+
+    @classmethod
+    def _template_sections(cls, template: Model) -> Tuple[List[_TemplateSection], List[str]]:
+        """Writes the sections of a model, in the :meth:`model_to_ma` order, with ``{mN}``
+        placeholders instead of the name of the model numbered N.
+
+        :return: The number, the atomic if it's one, and the section of each model, and the
+            names of the models, by number
+        """
+        numbers: Dict[Model, int] = {}
+        sections: List[_TemplateSection] = []
+        pending = [template]
+        while pending:
+            model = pending.pop()
+            number = numbers.setdefault(model, len(numbers))
+            if isinstance(model, Atomic):
+                sections.append((number, model, cls._atomic_template(number, model.model_params)))
+                continue
+            coupled = cast(Coupled, model)
+            for component in coupled.subcomponents:
+                numbers.setdefault(component, len(numbers))
+            sections.append((number, None, cls._coupled_template(coupled, numbers)))
+            pending.extend(reversed(coupled.subcomponents))
+        return sections, [model.name for model in numbers]
+
+    @staticmethod
+    def _atomic_template(number: int, params: Dict[str, Any]) -> str:
+        params_lines = ''.join(f"{_escaped(param)}: {_escaped(value)}\n"
+                               for param, value in params.items())
+        return f"[{{m{number}}}]\n{params_lines}"
+
+    @staticmethod
+    def _coupled_template(coupled: Coupled, numbers: Dict[Model, int]) -> str:
+        def identifier(port: Port) -> str:
+            if port.owner is coupled:
+                return _escaped(port.name)
+            return f"{_escaped(port.name)}@{{m{numbers[port.owner]}}}"
+
+        components = ' '.join(
+            f"{{m{numbers[component]}}}@{_escaped(component.get_abstract_model_name())}"
+            if isinstance(component, Atomic) else f"{{m{numbers[component]}}}"
+            for component in coupled.subcomponents)
+        return (f"[{{m{numbers[coupled]}}}]\n"
+                f"components: {components}\n"
+                f"out: {' '.join(_escaped(port.name) for port in coupled.outports)}\n"
+                f"in: {' '.join(_escaped(port.name) for port in coupled.inports)}\n" +
+                ''.join(f"link: {identifier(link.from_port)} {identifier(link.to_port)}\n"
+                        for link in cast(List[Link], coupled.eic + coupled.ic + coupled.eoc)))
+
     @classmethod
     def model_to_ma(cls, model: Model) -> str:
         if isinstance(model, Atomic):
             return cls.atomic_to_ma(cast(Atomic, model))
+        elif isinstance(model, ModelArray):
+            return cls.array_to_ma(model)
         else:
             return cls.coupled_to_ma(cast(Coupled, model))
 
     @classmethod
     def serialize(cls, model: Model) -> str:
         return cls.model_to_ma(model)
+
+
+class MaParser:
+    """Reads ``.ma`` files, as :class:`MaSerializer` writes them, back into models. Atomic
+    types are looked up in a registry, and the ones it doesn't have are built with
+    :class:`AtomicModelBuilder`, with the ports the couplings use.
+
+    The file is read in a single pass over its lines, keeping each section entries, and the
+    models are built from them without recursion. Only DEVS coupled models are supported,
+    not Cell-DEVS ones nor ``select`` priorities, as models can't represent them.
+    """
+
+    def __init__(self, registry: Optional[AtomicRegistry] = None):
+        """
+        :param registry: Registry the atomic types are looked up in, defaults to None
+        :type registry: Optional[AtomicRegistry], optional
+        """
+        self.registry = registry
+        self._atomic_classes: Dict[str, Type[Atomic]] = {}
+
+    def load(self, path: str, top_name: str = TOP_MODEL_NAME) -> Coupled:
+        """Reads a ``.ma`` file, see :meth:`parse`."""
+        with open(path) as ma_file:
+            return self.parse(ma_file.read(), top_name)
+
+    def parse(self, ma: str, top_name: str = TOP_MODEL_NAME) -> Coupled:
+        """Builds the models a ``.ma`` text describes.
+
+        :param ma: The ``.ma`` text
+        :type ma: str
+        :param top_name: Name of the top model section, defaults to ``top``
+        :type top_name: str, optional
+        :raises MaParsingException: The text is malformed, or uses unsupported features
+        :return: The top model
+        :rtype: Coupled
+        """
+        return self._build(self._sections(ma), top_name)
+
+    def _build(self, sections: Dict[str, List[Tuple[int, str, str]]],
+               top_name: str) -> Coupled:
+        if top_name not in sections:
+            raise MaParsingException(f"There is no [{top_name}] section")
+        top_model = Coupled(top_name, [])
+        links: List[Tuple[Coupled, int, str]] = []
+        pending = [top_model]
+        built = {top_name}
+        while pending:
+            coupled = pending.pop()
+            for number, key, value in sections[coupled.name]:
+                entry = key.lower()
+                if entry == 'components':
+                    for component in value.split():
+                        model = self._component(component, sections, built, number)
+                        coupled.subcomponents.append(model)
+                        if isinstance(model, Coupled):
+                            pending.append(model)
+                elif entry in ('in', 'out'):
+                    for port_name in value.split():
+                        (coupled.add_inport if entry == 'in' else coupled.add_outport)(port_name)
+                elif entry == 'link':
+                    links.append((coupled, number, value))
+                else:
+                    raise MaParsingException(f"Line {number}: {key} entries are not supported "
+                                             f"in coupled models")
+        _LinkResolver().add_links(links)
+        return top_model
+
+    @staticmethod
+    def _sections(ma: str) -> Dict[str, List[Tuple[int, str, str]]]:
+        """Splits the text into the ``key: value`` entries of each section, and their line."""
+        sections: Dict[str, List[Tuple[int, str, str]]] = {}
+        entries: Optional[List[Tuple[int, str, str]]] = None
+        for number, line in enumerate(ma.splitlines(), 1):
+            line = line.partition(COMMENT_MARK)[0].strip()
+            if not line:
+                continue
+            if line[0] == '[':
+                name = line[1:-1].strip()
+                if line[-1] != ']' or not name:
+                    raise MaParsingException(f"Line {number}: malformed section {line}")
+                if name in sections:
+                    raise MaParsingException(f"Line {number}: section [{name}] is repeated")
+                entries = sections[name] = []
+                continue
+            key, colon, value = line.partition(':')
+            if not colon or entries is None:
+                raise MaParsingException(f"Line {number}: expected a 'key: value' entry "
+                                         f"within a section")
+            entries.append((number, key.strip(), value.strip()))
+        return sections
+
+    def _component(self, component: str, sections: Dict[str, List[Tuple[int, str, str]]],
+                   built: set, number: int) -> Model:
+        name, at, type_name = component.partition('@')
+        if name in built:
+            raise MaParsingException(f"Line {number}: {name} is a component of many models")
+        built.add(name)
+        if not at:
+            if name not in sections:
+                raise MaParsingException(f"Line {number}: coupled model {name} has no section")
+            return Coupled(name, [])
+        params = {key: value for _, key, value in sections.get(name, [])}
+        return self._atomic_class(type_name)(name, **params)
+
+    def _atomic_class(self, type_name: str) -> Type[Atomic]:
+        if type_name in self._atomic_classes:
+            return self._atomic_classes[type_name]
+        atomic_class: Optional[type] = None
+        if self.registry is not None:
+            try:
+                atomic_class = self.registry.get_by_name(type_name)
+            except NonExistingAtomicClassException:
+                pass
+        if not (isinstance(atomic_class, type) and issubclass(atomic_class, Atomic)):
+            atomic_class = AtomicModelBuilder().with_name(type_name).build()
+        self._atomic_classes[type_name] = cast(Type[Atomic], atomic_class)
+        return self._atomic_classes[type_name]
+
+
+class _LinkResolver:
+    """Resolves the ports ``link`` entries name, adding to models the ports they lack: a
+    component port is an output where links leave from it, and an input where they reach it,
+    and the other way around for the ports of the coupled model itself."""
+
+    def __init__(self) -> None:
+        self._components: Dict[Coupled, Dict[str, Model]] = {}
+        self._ports: Dict[Model, Dict[str, Port]] = {}
+
+    def add_links(self, links: List[Tuple[Coupled, int, str]]) -> None:
+        for coupled, number, value in links:
+            ends = value.split()
+            if len(ends) != 2:
+                raise MaParsingException(f"Line {number}: a link needs a source and a "
+                                         f"destination port")
+            from_port = self._port(coupled, ends[0], True, number)
+            to_port = self._port(coupled, ends[1], False, number)
+            try:
+                coupled.do_add_coupling(from_port, to_port)
+            except Exception as error:
+                raise MaParsingException(f"Line {number}: {error}")
+
+    def _port(self, coupled: Coupled, identifier: str, is_source: bool, number: int) -> Port:
+        port_name, at, model_name = identifier.partition('@')
+        model: Model = coupled
+        if at:
+            if coupled not in self._components:
+                self._components[coupled] = {component.name: component
+                                             for component in coupled.subcomponents}
+            if model_name not in self._components[coupled]:
+                raise MaParsingException(f"Line {number}: {model_name} is not a component "
+                                         f"of {coupled.name}")
+            model = self._components[coupled][model_name]
+        if model not in self._ports:
+            self._ports[model] = {port.name: port for port in model.inports + model.outports}
+        ports = self._ports[model]
+        if port_name not in ports:
+            if is_source == (model is coupled):
+                model.add_inport(port_name)
+                ports[port_name] = model.inports[-1]
+            else:
+                model.add_outport(port_name)
+                ports[port_name] = model.outports[-1]
+        return ports[port_name]
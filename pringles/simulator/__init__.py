@@ -1,4 +1,8 @@
 from . import errors # noqa
 from .simulation import SimulationResult, Simulation # noqa
 from .simulator import Simulator # noqa
-from .events import Event  # noqa: F401
+from .store import ResultStore # noqa
+from .events import Event, EventTable  # noqa: F401
+from .instrumentation import StageHook, StageTiming, SimulationTimings  # noqa: F401
+from .profiling import StageProfiler, profiled, profile_summary  # noqa: F401
+from .distributed import DistributedSimulator, SimulationWorker  # noqa: F401
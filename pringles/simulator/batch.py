@@ -0,0 +1,451 @@
+"""
+Batch runs of many simulations, described by a manifest file instead of Python glue code.
+
+A manifest is a JSON (or YAML, when PyYAML is installed) document like::
+
+    {
+        "cdpp_bin_path": "cdpp/src/bin",
+        "user_models_dir": "atomics",
+        "working_dir": "runs",
+        "store": "results.sqlite",
+        "parallelism": 4,
+        "max_attempts": 3,
+        "jobs": [
+            {
+                "name": "queues",
+                "model": "models.py:build_top",
+                "duration": "00:10:00:000",
+                "events": [["00:00:10:000", "in", 1.5]],
+                "params": {"preparation": "0:0:5:0"},
+                "sweep": {"capacity": [1, 2, 4, 8]}
+            }
+        ]
+    }
+
+Each job runs its model once per combination of the sweep values. The ``model`` entry names
+a factory function, either in a Python file (relative to the manifest) or an importable
+module, which is called as ``factory(registry, **params)`` and returns the top model, or a
+``(top_model, events)`` tuple. It can also name a ``.ma`` file (relative to the manifest),
+read with :class:`MaParser`, whose atomic parameters named as run parameters take their values.
+Outputs are appended to the :class:`ResultStore`, tagged with each run parameters. Each run
+has a deterministic id, derived from its inputs and the model file contents, so editing the
+model runs it again on resume. Every attempt is recorded in a journal
+(``journal.jsonl`` in the working dir, unless the manifest sets ``journal``), so an interrupted
+batch can be resumed skipping the completed runs.
+"""
+from __future__ import annotations
+
+import os
+import sys
+import json
+import hashlib
+import itertools
+import subprocess
+import importlib
+import importlib.util
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+from typing import Optional, List, Dict, Any, Callable, Tuple, Iterator, TextIO, cast
+
+from pringles.utils import VirtualTime
+from pringles.models import Model, Atomic, Coupled
+from pringles.serializers import MaParser
+from pringles.simulator.events import Event
+from pringles.simulator.errors import ManifestException
+from pringles.simulator.simulation import Simulation
+from pringles.simulator.simulator import Simulator
+from pringles.simulator.registry import AtomicRegistry
+from pringles.simulator.store import ResultStore
+from pringles.simulator.journal import RunJournal, STARTED, COMPLETED, FAILED
+
+DEFAULT_STORE_NAME = 'results.sqlite'
+DEFAULT_WORKING_DIR_NAME = 'runs'
+DEFAULT_JOURNAL_NAME = 'journal.jsonl'
+MA_FILE_EXTENSION = '.ma'
+EVENTS_CACHE_DIR_NAME = 'events-cache'  # Shared by the runs of a sweep with the same events
+DEFAULT_MAX_ATTEMPTS = 3
+RUN_ID_LENGTH = 20
+
+# A run, its error if it failed, and whether the failure is transient
+RunOutcome = Tuple['RunSpec', Optional[str], bool]
+
+
+class RunSpec:
+    """A single simulation of a batch: a job, and the values of its parameters."""
+
+    def __init__(self, job: JobSpec, params: Dict[str, Any]):
+        self.job = job
+        self.params = params
+
+    @property
+    def run_id(self) -> str:
+        """Identifies the run by its inputs, so it's the same each time the batch is run. It
+        also names the run output directory."""
+        inputs = json.dumps({'job': self.job.name, 'model': self.job.model,
+                             'model_source': self.job.model_digest,
+                             'duration': self.job.duration, 'events': self.job.events,
+                             'params': self.params},
+                            sort_keys=True, default=str)
+        return hashlib.sha256(inputs.encode()).hexdigest()[:RUN_ID_LENGTH]
+
+    def __repr__(self):
+        return f"RunSpec({self.job.name}, {self.params})"
+
+
+class JobSpec:
+    """A job of a manifest: a top model factory, run once per combination of sweep values."""
+
+    def __init__(self, name: str, model: str, duration: Optional[str] = None,
+                 events: Optional[List[Tuple[str, str, Any]]] = None,
+                 params: Optional[Dict[str, Any]] = None,
+                 sweep: Optional[Dict[str, List[Any]]] = None):
+        self.name = name
+        self.model = model
+        self.duration = duration
+        self.events = events or []
+        self.params = params or {}
+        self.sweep = sweep or {}
+        self._model_digest: Optional[str] = None
+
+    @property
+    def model_digest(self) -> str:
+        """Hash of the file the model is built from: the ``.ma`` or Python file, or the source
+        of the factory module. It's read once, so the runs of a batch agree on it. Files the
+        factory reads or imports are not covered."""
+        if self._model_digest is None:
+            self._model_digest = _source_digest(self.model)
+        return self._model_digest
+
+    @classmethod
+    def from_dict(cls, job: Dict[str, Any], base_dir: str) -> JobSpec:
+        if 'name' not in job or 'model' not in job:
+            raise ManifestException("Every job needs a name and a model")
+        unknown_keys = set(job) - {'name', 'model', 'duration', 'events', 'params', 'sweep'}
+        if unknown_keys:
+            raise ManifestException(f"Job {job['name']} has unknown keys {sorted(unknown_keys)}")
+        model = job['model']
+        if model.endswith(MA_FILE_EXTENSION):
+            return cls(job['name'], os.path.join(base_dir, model), job.get('duration'),
+                       job.get('events'), job.get('params'), job.get('sweep'))
+        module, _, function = model.rpartition(':')
+        if not module or not function:
+            raise ManifestException(f"Job {job['name']} model should look like "
+                                    f"'file.py:function', 'package.module:function' or "
+                                    f"'file.ma'")
+        if module.endswith('.py'):
+            model = os.path.join(base_dir, module) + ':' + function
+        return cls(job['name'], model, job.get('duration'), job.get('events'),
+                   job.get('params'), job.get('sweep'))
+
+    def runs(self) -> Iterator[RunSpec]:
+        names = list(self.sweep)
+        for values in itertools.product(*(self.sweep[name] for name in names)):
+            yield RunSpec(self, {**self.params, **dict(zip(names, values))})
+
+
+class Manifest:
+    """The description of a batch of simulations. See the module docs for its format."""
+
+    def __init__(self, cdpp_bin_path: str, jobs: List[JobSpec],
+                 user_models_dir: Optional[str] = None,
+                 working_dir: str = DEFAULT_WORKING_DIR_NAME,
+                 store: str = DEFAULT_STORE_NAME,
+                 parallelism: int = 1,
+                 journal: Optional[str] = None,
+                 max_attempts: int = DEFAULT_MAX_ATTEMPTS):
+        self.cdpp_bin_path = cdpp_bin_path
+        self.jobs = jobs
+        self.user_models_dir = user_models_dir
+        self.working_dir = working_dir
+        self.store = store
+        self.parallelism = parallelism
+        self.journal = journal if journal is not None else \
+            os.path.join(working_dir, DEFAULT_JOURNAL_NAME)
+        self.max_attempts = max_attempts
+
+    @classmethod
+    def load(cls, path: str) -> Manifest:
+        """Reads a manifest file. Relative paths inside it are relative to the file.
+
+        :param path: The JSON or YAML manifest file
+        :type path: str
+        :raises ManifestException: The manifest can't be read, or is malformed
+        :return: The manifest
+        :rtype: Manifest
+        """
+        with open(path) as manifest_file:
+            content = manifest_file.read()
+        if path.endswith(('.yaml', '.yml')):
+            try:
+                import yaml
+            except ImportError:
+                raise ManifestException("PyYAML is needed to read YAML manifests")
+            try:
+                manifest = yaml.safe_load(content)
+            except yaml.YAMLError as error:
+                raise ManifestException(f"Manifest {path} is not valid YAML: {error}")
+        else:
+            try:
+                manifest = json.loads(content)
+            except ValueError as error:
+                raise ManifestException(f"Manifest {path} is not valid JSON: {error}")
+        return cls.from_dict(manifest, os.path.dirname(os.path.abspath(path)))
+
+    @classmethod
+    def from_dict(cls, manifest: Dict[str, Any], base_dir: str) -> Manifest:
+        if not isinstance(manifest, dict) or 'cdpp_bin_path' not in manifest:
+            raise ManifestException("The manifest needs a cdpp_bin_path")
+        if not manifest.get('jobs'):
+            raise ManifestException("The manifest has no jobs")
+
+        def resolve(path: str) -> str:
+            return os.path.join(base_dir, path)
+
+        jobs = [JobSpec.from_dict(job, base_dir) for job in manifest['jobs']]
+        job_names = [job.name for job in jobs]
+        if len(set(job_names)) != len(job_names):
+            raise ManifestException("Job names must be unique")
+        user_models_dir = manifest.get('user_models_dir')
+        journal = manifest.get('journal')
+        return cls(resolve(manifest['cdpp_bin_path']),
+                   jobs,
+                   resolve(user_models_dir) if user_models_dir is not None else None,
+                   resolve(manifest.get('working_dir', DEFAULT_WORKING_DIR_NAME)),
+                   resolve(manifest.get('store', DEFAULT_STORE_NAME)),
+                   cls._int_entry(manifest, 'parallelism', 1),
+                   resolve(journal) if journal is not None else None,
+                   cls._int_entry(manifest, 'max_attempts', DEFAULT_MAX_ATTEMPTS))
+
+    @staticmethod
+    def _int_entry(manifest: Dict[str, Any], key: str, default: int) -> int:
+        try:
+            return int(manifest.get(key, default))
+        except (TypeError, ValueError):
+            raise ManifestException(f"The manifest {key} should be an integer, "
+                                    f"not {manifest[key]!r}")
+
+    def runs(self) -> List[RunSpec]:
+        return [run for job in self.jobs for run in job.runs()]
+
+
+def _source_digest(model: str) -> str:
+    if model.endswith(MA_FILE_EXTENSION):
+        path: Optional[str] = model
+    else:
+        module_name = model.rpartition(':')[0]
+        if module_name.endswith('.py'):
+            path = module_name
+        else:
+            try:
+                spec = importlib.util.find_spec(module_name)
+            except (ImportError, ValueError):
+                spec = None
+            path = spec.origin if spec is not None else None
+    try:
+        with open(cast(str, path), 'rb') as source_file:
+            return hashlib.sha256(source_file.read()).hexdigest()
+    except (OSError, TypeError):
+        return ''  # Reported when the factory is loaded
+
+
+def load_factory(model: str) -> Callable[..., Any]:
+    """Returns the top model factory a job ``model`` entry names."""
+    if model.endswith(MA_FILE_EXTENSION):
+        return ma_factory(model)
+    module_name, _, function_name = model.rpartition(':')
+    if module_name.endswith('.py'):
+        spec = importlib.util.spec_from_file_location(
+            f"pringles_batch_{abs(hash(module_name))}", module_name)
+        if spec is None or spec.loader is None:
+            raise ManifestException(f"Can't import {module_name}")
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+    else:
+        module = importlib.import_module(module_name)
+    try:
+        return getattr(module, function_name)
+    except AttributeError:
+        raise ManifestException(f"{module_name} has no function named {function_name}")
+
+
+def ma_factory(path: str) -> Callable[..., Model]:
+    """Returns a factory of the top model of a ``.ma`` file, where the run parameters set the
+    atomics parameters of the same name.
+
+    The file is parsed once per registry, and each call sets the parameters of that same
+    model again, as runs are built one at a time, so a model is only valid until the next
+    call."""
+    models: Dict[int, Tuple[Model, List[Tuple[Atomic, Dict[str, str]]]]] = {}
+
+    def parsed(registry: AtomicRegistry) -> Tuple[Model, List[Tuple[Atomic, Dict[str, str]]]]:
+        top_model = MaParser(registry).load(path)
+        atomics = []
+        pending: List[Model] = [top_model]
+        while pending:
+            model = pending.pop()
+            if isinstance(model, Coupled):
+                pending.extend(model.subcomponents)
+            else:
+                atomic = cast(Atomic, model)
+                atomics.append((atomic, dict(atomic.model_params)))
+        return top_model, atomics
+
+    def factory(registry: AtomicRegistry, **params: Any) -> Model:
+        if id(registry) not in models:
+            models[id(registry)] = parsed(registry)
+        top_model, atomics = models[id(registry)]
+        unused = set(params)
+        for atomic, defaults in atomics:
+            atomic.model_params = dict(defaults)
+            for name, value in params.items():
+                if name in defaults:
+                    atomic.model_params[name] = str(value)
+                    unused.discard(name)
+        if unused:
+            raise ManifestException(f"No atomic of {path} has parameters named {sorted(unused)}")
+        return top_model
+    return factory
+
+
+def is_transient(error: BaseException) -> bool:
+    """Tells the failures worth retrying, such as the simulator being killed by a signal
+    (usually the OOM killer), or an I/O error, from the ones a retry would repeat."""
+    if isinstance(error, subprocess.CalledProcessError):
+        return error.returncode < 0
+    return isinstance(error, (OSError, MemoryError, BrokenProcessPool))
+
+
+class BatchRunner:
+    """Runs the simulations of a manifest, appending their outputs to its result store.
+
+    Each worker process has its own :class:`Simulator`. Every attempt of a run is recorded in
+    the manifest :class:`RunJournal`, and transient failures are retried up to
+    ``max_attempts`` times. When resuming, the runs already completed are skipped, so an
+    interrupted batch can be started over and only the missing work is done.
+    """
+
+    def __init__(self, manifest: Manifest, parallelism: Optional[int] = None,
+                 resume: bool = True, max_attempts: Optional[int] = None,
+                 progress: Optional[TextIO] = sys.stderr):
+        self.manifest = manifest
+        self.parallelism = parallelism if parallelism is not None else manifest.parallelism
+        self.max_attempts = max_attempts if max_attempts is not None else manifest.max_attempts
+        self.resume = resume
+        self.progress = progress
+        self.store = ResultStore(manifest.store)
+        os.makedirs(manifest.working_dir, exist_ok=True)
+        self.journal = RunJournal(manifest.journal)
+
+    def pending_runs(self) -> List[RunSpec]:
+        runs = self.manifest.runs()
+        if not self.resume:
+            return runs
+        # A run may be in the store but not journaled, if the batch died in between
+        completed_ids = self.journal.completed() | self.store.run_keys()
+        return [run for run in runs if run.run_id not in completed_ids]
+
+    def run(self) -> Dict[str, Optional[str]]:
+        """Runs every pending simulation, retrying the transient failures.
+
+        :return: The error of the last attempt of each run, by run id, None for the
+            successful ones
+        :rtype: Dict[str, Optional[str]]
+        """
+        runs = self.pending_runs()
+        total = len(runs)
+        self._report(f"{total} runs pending")
+        errors: Dict[str, Optional[str]] = {}
+        attempts: Dict[str, int] = {run.run_id: 0 for run in runs}
+        while runs:
+            retried_runs = []
+            for run, error, transient in self._execute(runs, attempts):
+                attempt = attempts[run.run_id]
+                if error is None:
+                    self.journal.record(run.run_id, COMPLETED, attempt)
+                else:
+                    self.journal.record(run.run_id, FAILED, attempt, error, transient)
+                    if transient and attempt < self.max_attempts:
+                        self._report(f"{run.job.name} {run.params} attempt {attempt} failed "
+                                     f"({error}), retrying")
+                        retried_runs.append(run)
+                        continue
+                errors[run.run_id] = error
+                self._report_run(run, error, len(errors), total)
+            runs = retried_runs
+        return errors
+
+    def _execute(self, runs: List[RunSpec], attempts: Dict[str, int]) -> Iterator[RunOutcome]:
+        # Runs are journaled as started by the worker that executes them, when it does
+        if self.parallelism <= 1:
+            _init_worker(self.manifest)
+            for run in runs:
+                attempts[run.run_id] += 1
+                yield (run,) + _execute_run(run, attempts[run.run_id])
+            return
+
+        # A new pool each round, as a worker dying (say, killed for memory) breaks the pool
+        with ProcessPoolExecutor(self.parallelism, initializer=_init_worker,
+                                 initargs=(self.manifest,)) as executor:
+            futures = {}
+            for run in runs:
+                attempts[run.run_id] += 1
+                futures[executor.submit(_execute_run, run, attempts[run.run_id])] = run
+            for future in as_completed(futures):
+                try:
+                    yield (futures[future],) + future.result()
+                except BrokenProcessPool as error:
+                    yield futures[future], _describe(error), True
+
+    def _report(self, message: str) -> None:
+        if self.progress is not None:
+            print(message, file=self.progress, flush=True)
+
+    def _report_run(self, run: RunSpec, error: Optional[str], done: int, total: int) -> None:
+        status = 'ok' if error is None else f"FAILED: {error}"
+        self._report(f"[{done}/{total}] {run.job.name} {run.params} {status}")
+
+
+# Each worker process builds its simulator once, and reuses it for all its runs
+_worker_state: Dict[str, Any] = {}
+
+
+def _init_worker(manifest: Manifest) -> None:
+    _worker_state['simulator'] = Simulator(
+        manifest.cdpp_bin_path, manifest.user_models_dir,
+        events_cache_dir=os.path.join(manifest.working_dir, EVENTS_CACHE_DIR_NAME))
+    _worker_state['store'] = ResultStore(manifest.store)
+    _worker_state['journal'] = RunJournal(manifest.journal)
+    _worker_state['working_dir'] = manifest.working_dir
+    _worker_state['factories'] = {}
+
+
+def _build_simulation(run: RunSpec, registry: AtomicRegistry, working_dir: str) -> Simulation:
+    factories = _worker_state['factories']
+    if run.job.model not in factories:
+        factories[run.job.model] = load_factory(run.job.model)
+    built = factories[run.job.model](registry, **run.params)
+    top_model, events = built if isinstance(built, tuple) else (built, None)
+    if events is None and run.job.events:
+        events = [Event(VirtualTime.parse(time), top_model.get_port(port), value)
+                  for time, port, value in run.job.events]
+    duration = VirtualTime.parse(run.job.duration) if run.job.duration is not None else None
+    return Simulation(top_model, duration, events, working_dir=working_dir, params=run.params,
+                      run_id=run.run_id)
+
+
+def _describe(error: BaseException) -> str:
+    return f"{type(error).__name__}: {error}"
+
+
+def _execute_run(run: RunSpec, attempt: int) -> Tuple[Optional[str], bool]:
+    """Executes a run in a worker, returning its error, if any, and whether it's transient."""
+    simulator: Simulator = _worker_state['simulator']
+    _worker_state['journal'].record(run.run_id, STARTED, attempt)
+    try:
+        simulation = _build_simulation(run, simulator.get_registry(),
+                                       _worker_state['working_dir'])
+        simulator.run_simulation(simulation)
+        _worker_state['store'].append(simulation, run_key=run.run_id)
+    except Exception as error:  # A failed run must not stop the batch
+        return _describe(error), is_transient(error)
+    return None, False
@@ -0,0 +1,417 @@
+"""
+Simulations spread across many hosts. Each host runs a :class:`SimulationWorker`, wrapping its
+local :class:`Simulator`, and a :class:`DistributedSimulator` coordinator sends them the
+serialized models to run::
+
+    # On each host
+    pringles worker --cdpp-bin-path cdpp/src/bin --port 9000 --slots 4
+
+    # On the coordinator
+    simulator = DistributedSimulator([("host1", 9000), ("host2", 9000)])
+    simulator.run_simulations(simulations)
+
+Coordinator and workers talk over TCP, with length prefixed JSON messages. The coordinator
+sends the ``.ma`` model text, the events and the simulator flags of each simulation, and the
+worker runs CD++ and sends back the outputs as columns. Simulator logs stay in the workers.
+"""
+from __future__ import annotations
+
+import io
+import json
+import queue
+import shutil
+import socket
+import struct
+import logging
+import tempfile
+import threading
+import subprocess
+import socketserver
+from typing import Optional, List, Dict, Any, Sequence, Tuple, TYPE_CHECKING
+
+from pringles.utils import VirtualTime
+from pringles.serializers import MaSerializer
+from pringles.simulator.errors import DistributedRunException
+from pringles.simulator.events import write_events
+from pringles.simulator.simulation import Simulation, SimulationResult
+from pringles.simulator.simulator import Simulator
+from pringles.simulator.instrumentation import StageRecorder
+from pringles.simulator.batch import is_transient
+from pringles.simulator.store import ResultStore
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+HEADER = struct.Struct('>I')  # Length of the JSON payload that follows
+
+HELLO_MESSAGE = 'hello'
+RUN_MESSAGE = 'run'
+OK_STATUS = 'ok'
+ERROR_STATUS = 'error'
+
+DEFAULT_MAX_ATTEMPTS = 3
+
+
+def send_message(connection: socket.socket, message: Dict[str, Any]) -> None:
+    payload = json.dumps(message, separators=(',', ':')).encode()
+    connection.sendall(HEADER.pack(len(payload)) + payload)
+
+
+def _receive_exactly(connection: socket.socket, size: int) -> Optional[bytes]:
+    chunks = []
+    remaining = size
+    while remaining:
+        chunk = connection.recv(min(remaining, 1 << 20))
+        if not chunk:
+            if remaining == size:
+                return None
+            raise ConnectionError("Connection closed in the middle of a message")
+        chunks.append(chunk)
+        remaining -= len(chunk)
+    return b''.join(chunks)
+
+
+def receive_message(connection: socket.socket) -> Optional[Dict[str, Any]]:
+    """Returns the next message of the connection, or None if it was closed."""
+    header = _receive_exactly(connection, HEADER.size)
+    if header is None:
+        return None
+    payload = _receive_exactly(connection, HEADER.unpack(header)[0])
+    if payload is None:
+        raise ConnectionError("Connection closed in the middle of a message")
+    return json.loads(payload)
+
+
+def encode_output(output_df: pd.DataFrame) -> Dict[str, Any]:
+    """Encodes the outputs of a simulation as columns, with the ports as codes of a list of
+    unique port names."""
+    import numpy as np
+    ports = output_df[SimulationResult.PORT_COL].astype('category')
+    return {
+        'times': [str(time) for time in output_df[SimulationResult.TIME_COL]],
+        'ports': list(ports.cat.categories),
+        'port_codes': ports.cat.codes.tolist(),
+        'values': [[float(element) for element in value]
+                   if isinstance(value, (tuple, np.ndarray)) else float(value)
+                   for value in output_df[SimulationResult.VALUE_COL]]
+    }
+
+
+def decode_output(columns: Dict[str, Any]) -> pd.DataFrame:
+    import pandas as pd
+    ports = columns['ports']
+    return pd.DataFrame({
+        SimulationResult.TIME_COL: [VirtualTime.parse(time) for time in columns['times']],
+        SimulationResult.PORT_COL: [ports[code] for code in columns['port_codes']],
+        SimulationResult.VALUE_COL: [tuple(value) if isinstance(value, list) else value
+                                     for value in columns['values']]
+    })
+
+
+def _describe(error: BaseException) -> str:
+    return f"{type(error).__name__}: {error}"
+
+
+class _WorkerServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+    worker: SimulationWorker
+
+
+class _WorkerHandler(socketserver.BaseRequestHandler):
+    """Serves the requests of a coordinator connection, one at a time."""
+
+    def handle(self):
+        worker = self.server.worker  # type: ignore
+        while True:
+            message = receive_message(self.request)
+            if message is None:
+                return
+            message_type = message.get('type') if isinstance(message, dict) else None
+            if message_type == HELLO_MESSAGE:
+                send_message(self.request, {'type': HELLO_MESSAGE, 'slots': worker.slots})
+            elif message_type == RUN_MESSAGE:
+                send_message(self.request, worker.execute(message))
+            else:
+                # The coordinator waits for an answer, so it's told, and the connection closed
+                send_message(self.request, {'status': ERROR_STATUS,
+                                            'error': f"Unknown message type {message_type!r}",
+                                            'transient': False})
+                return
+
+
+class SimulationWorker:
+    """Runs the simulations a :class:`DistributedSimulator` sends, with a local simulator.
+
+    A worker runs as many simulations at once as it has slots, as the coordinator opens a
+    connection per slot.
+    """
+
+    def __init__(self, simulator: Simulator, host: str = '127.0.0.1', port: int = 0,
+                 slots: int = 1, working_dir: Optional[str] = None, keep_outputs: bool = False):
+        """
+        :param simulator: The local simulator the simulations are run with
+        :type simulator: Simulator
+        :param host: Address the worker listens on, defaults to localhost
+        :type host: str, optional
+        :param port: Port the worker listens on, defaults to 0 (any free port)
+        :type port: int, optional
+        :param slots: Simulations run at once, defaults to 1
+        :type slots: int, optional
+        :param working_dir: Directory the simulations are run in, defaults to a temporary one
+        :type working_dir: Optional[str], optional
+        :param keep_outputs: True if the CD++ files of each simulation should be kept after
+            sending the results, defaults to False
+        :type keep_outputs: bool, optional
+        """
+        self.simulator = simulator
+        self.slots = slots
+        self.working_dir = working_dir if working_dir else tempfile.mkdtemp()
+        self.keep_outputs = keep_outputs
+        self._server = _WorkerServer((host, port), _WorkerHandler)
+        self._server.worker = self
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def address(self) -> Tuple[str, int]:
+        return self._server.server_address  # type: ignore
+
+    def serve_forever(self) -> None:
+        self._server.serve_forever()
+
+    def start(self) -> SimulationWorker:
+        """Serves in a background thread."""
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def execute(self, task: Dict[str, Any]) -> Dict[str, Any]:
+        output_dir = tempfile.mkdtemp(dir=self.working_dir)
+        try:
+            model_path = Simulator._dump_model_source_in_file(task['model'], output_dir)
+            events_path = None
+            if task['events'] is not None:
+                events_path = Simulator._new_working_file_named(output_dir, "events")
+                with open(events_path, "w") as events_file:
+                    events_file.write(task['events'])
+            duration = VirtualTime.parse(task['duration']) if task['duration'] else None
+            result = self.simulator._run_dumped_model(
+                StageRecorder(None, self.simulator.stage_hooks), output_dir, model_path,
+                events_path, duration, task['logged_messages'], use_logs=False,
+                use_out=task['use_out'])
+        except Exception as error:
+            logging.warning("Simulation failed: %s", error)
+            return {'status': ERROR_STATUS,
+                    'error': _describe(error),
+                    'transient': is_transient(error)}
+        finally:
+            if not self.keep_outputs:
+                shutil.rmtree(output_dir, ignore_errors=True)
+        return {
+            'status': OK_STATUS,
+            'returncode': result.process_result.returncode,
+            'stdout': result.process_result.stdout.decode(errors='replace'),
+            'output': encode_output(result.output_df) if task['use_out'] else None,
+            'timings': result.timings.as_dict() if result.timings else None
+        }
+
+
+class DistributedSimulator:
+    """Runs simulations in remote :class:`SimulationWorker` instances.
+
+    Simulations are kept in a single queue, from which each worker slot takes the next one
+    as soon as it's idle, so faster workers end up running more of them. When a worker fails,
+    or its connection is lost, its simulation is queued again for the other workers, without
+    counting it as an attempt. The simulations failing transiently are retried up to
+    ``max_attempts`` times.
+    """
+
+    def __init__(self, workers: Sequence[Tuple[str, int]],
+                 max_attempts: int = DEFAULT_MAX_ATTEMPTS, timeout: Optional[float] = None,
+                 result_store: Optional[ResultStore] = None):
+        """
+        :param workers: Host and port of each worker
+        :type workers: Sequence[Tuple[str, int]]
+        :param max_attempts: Attempts of a simulation before giving up, defaults to 3
+        :type max_attempts: int, optional
+        :param timeout: Seconds to wait for a worker answer before deeming it failed,
+            defaults to None (forever)
+        :type timeout: Optional[float], optional
+        :param result_store: Store the outputs of each simulation are appended to,
+            defaults to None
+        :type result_store: Optional[ResultStore], optional
+        """
+        self.workers = list(workers)
+        self.max_attempts = max_attempts
+        self.timeout = timeout
+        self.result_store = result_store
+
+    def run_simulations(self, simulations: Sequence[Simulation]) -> List[SimulationResult]:
+        """Runs the simulations in the workers, setting their results as they finish.
+
+        :raises DistributedRunException: Some simulations failed, or no worker was left to
+            run them. The others are run anyway.
+        :return: The results, in the order of the simulations
+        :rtype: List[SimulationResult]
+        """
+        run = _DistributedRun(self, simulations)
+        threads = [threading.Thread(target=run.drive, args=(connection,), daemon=True)
+                   for connection in self._connect_slots()]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        run.fail_unfinished("No worker left to run the simulation")
+        if run.errors:
+            raise DistributedRunException(run.errors)
+        return run.results  # type: ignore
+
+    def _connect_slots(self) -> List[socket.socket]:
+        connections = []
+        for address in self.workers:
+            try:
+                connection = self._connect(address)
+                send_message(connection, {'type': HELLO_MESSAGE})
+                hello = receive_message(connection)
+                if hello is None:
+                    raise ConnectionError("Connection closed by the worker")
+                connections.append(connection)
+                connections.extend(self._connect(address) for _ in range(hello['slots'] - 1))
+            except (OSError, ValueError) as error:
+                logging.warning("Worker %s:%s unavailable: %s", *address, error)
+        return connections
+
+    def _connect(self, address: Tuple[str, int]) -> socket.socket:
+        connection = socket.create_connection(address, timeout=self.timeout)
+        connection.settimeout(self.timeout)
+        return connection
+
+
+class _DistributedRun:
+    """The state of a :meth:`DistributedSimulator.run_simulations` call, shared by the
+    threads driving each worker slot."""
+
+    def __init__(self, simulator: DistributedSimulator, simulations: Sequence[Simulation]):
+        self.simulator = simulator
+        self.simulations = simulations
+        self.results: List[Optional[SimulationResult]] = [None] * len(simulations)
+        self.errors: Dict[int, str] = {}
+        self.attempts = [0] * len(simulations)
+        self.pending: queue.Queue = queue.Queue()
+        for index in range(len(simulations)):
+            self.pending.put(index)
+        self._tasks: Dict[int, Dict[str, Any]] = {}
+        self._finished = 0
+        self._lock = threading.Lock()
+
+    def _done(self) -> bool:
+        with self._lock:
+            return self._finished == len(self.simulations)
+
+    def _finish(self, index: int, result: Optional[SimulationResult] = None,
+                error: Optional[str] = None) -> None:
+        with self._lock:
+            self.results[index] = result
+            if error is not None:
+                self.errors[index] = error
+            self._tasks.pop(index, None)
+            self._finished += 1
+
+    def _retry_or_fail(self, index: int, error: str) -> None:
+        if self.attempts[index] < self.simulator.max_attempts:
+            self.pending.put(index)
+        else:
+            self._finish(index, error=error)
+
+    def drive(self, connection: socket.socket) -> None:
+        """Sends simulations through a worker slot connection until they are all finished,
+        or the worker fails."""
+        with connection:
+            while not self._done():
+                try:
+                    index = self.pending.get(timeout=0.1)
+                except queue.Empty:
+                    continue  # Simulations are still running in other slots
+                try:
+                    task = self._task_of(index)
+                except Exception as error:  # The simulation can't be sent, not the worker
+                    self._finish(index, error=_describe(error))
+                    continue
+                response = self._exchange(connection, index, task)
+                if response is None:
+                    return
+                try:
+                    self._handle_response(index, response)
+                except Exception as error:  # A single simulation must not stop the others
+                    self._finish(index, error=_describe(error))
+
+    def _exchange(self, connection: socket.socket, index: int,
+                  task: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Runs a simulation in the worker, returning its answer, or None if the worker
+        failed, and the simulation was requeued."""
+        self.attempts[index] += 1
+        try:
+            send_message(connection, task)
+            response = receive_message(connection)
+            if response is None:
+                raise ConnectionError("Connection closed by the worker")
+        except (OSError, ValueError) as error:
+            # The worker, not the simulation, failed, so it's not counted as an attempt
+            logging.warning("Worker failed, simulation %d requeued: %s", index, error)
+            self.attempts[index] -= 1
+            self.pending.put(index)
+            return None
+        return response
+
+    def _handle_response(self, index: int, response: Dict[str, Any]) -> None:
+        if response['status'] == OK_STATUS:
+            self._finish(index, result=self._set_result(self.simulations[index], response))
+        elif response['transient']:
+            self._retry_or_fail(index, response['error'])
+        else:
+            self._finish(index, error=response['error'])
+
+    def fail_unfinished(self, error: str) -> None:
+        while not self.pending.empty():
+            self._finish(self.pending.get(), error=error)
+
+    def _task_of(self, index: int) -> Dict[str, Any]:
+        """Returns the message running a simulation, built on its first attempt only, as its
+        events may be an iterator, consumed once."""
+        with self._lock:
+            task = self._tasks.get(index)
+        if task is None:
+            task = self._task(self.simulations[index])
+            with self._lock:
+                self._tasks[index] = task
+        return task
+
+    @staticmethod
+    def _task(simulation: Simulation) -> Dict[str, Any]:
+        events = None
+        if simulation.events is not None:
+            events_file = io.StringIO()
+            write_events(simulation.events, events_file, simulation.duration)
+            events = events_file.getvalue()
+        return {
+            'type': RUN_MESSAGE,
+            'model': MaSerializer.serialize(simulation.top_model),
+            'events': events,
+            'duration': str(simulation.duration) if simulation.duration is not None else None,
+            'logged_messages': simulation.override_logged_messages or 'XY',
+            'use_out': simulation.use_simulator_out
+        }
+
+    def _set_result(self, simulation: Simulation, response: Dict[str, Any]) -> SimulationResult:
+        result = SimulationResult(process_result=subprocess.CompletedProcess(
+            args=[], returncode=response['returncode'], stdout=response['stdout'].encode()))
+        if response['output'] is not None:
+            result.output_df = decode_output(response['output'])
+        simulation.result = result
+        if self.simulator.result_store is not None:
+            self.simulator.result_store.append(simulation)
+        return result
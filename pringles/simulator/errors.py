@@ -13,3 +13,25 @@ class AttributeIsImmutableException(AttributeError):
 
 class TopModelNotNamedTopException(NameError):
     pass
+
+
+class InvalidRunParameterException(ValueError):
+    def __init__(self, name):
+        super().__init__(f"Run parameter named {name} is not a valid identifier, is reserved "
+                         "by the result store, or clashes with another parameter name.")
+
+
+class ManifestException(ValueError):
+    pass
+
+
+class DistributedRunException(Exception):
+    def __init__(self, errors):
+        super().__init__(f"{len(errors)} simulations failed: {errors}")
+        self.errors = errors
+
+
+class EventsOutOfOrderException(ValueError):
+    def __init__(self, time, previous_time):
+        super().__init__(f"Event at {time} comes after an event at {previous_time}. "
+                         "Events should be in time order.")
@@ -1,6 +1,38 @@
-from pringles.models import Port
+from __future__ import annotations
+
+import os
+import itertools
+import threading
+
+from pringles.models import Port, Model
+from pringles.models.errors import PortNotFoundException
 from pringles.utils import VirtualTime
-from typing import Union, List
+from pringles.simulator.errors import EventsOutOfOrderException
+from typing import Union, List, Sequence, Iterable, Iterator, Optional, Tuple, TextIO, Any
+
+# Rows formatted by each string formatting operation when writing an EventTable
+EVENTS_CHUNK_ROWS = 100000
+
+MILLISECONDS_PER_HOUR = 3600000
+MILLISECONDS_PER_MINUTE = 60000
+MILLISECONDS_PER_SECOND = 1000
+
+
+def ticks_of(time: VirtualTime) -> int:
+    """Returns a time as EventTable ticks, that is milliseconds. The remainder is dropped,
+    as in the events file."""
+    return (time.milliseconds +
+            MILLISECONDS_PER_SECOND * time.seconds +
+            MILLISECONDS_PER_MINUTE * time.minutes +
+            MILLISECONDS_PER_HOUR * time.hours)
+
+
+def time_of_ticks(ticks: int) -> VirtualTime:
+    return VirtualTime(ticks // MILLISECONDS_PER_HOUR,
+                       ticks // MILLISECONDS_PER_MINUTE % 60,
+                       ticks // MILLISECONDS_PER_SECOND % 60,
+                       ticks % MILLISECONDS_PER_SECOND,
+                       0)
 
 
 class Event:
@@ -23,3 +55,227 @@ class Event:
     def serialize(self) -> str:
         """Serialize the :class:`Event` into a CD++ consumable string."""
         return f"{str(self.time)} {self.target_port.name} {str(self.value)};"
+
+
+class EventTable:
+    """A large amount of external events, held as arrays instead of :class:`Event` objects.
+
+    Times are integer ticks of one millisecond, the resolution of the CD++ events file.
+    Values are either one number per event, or a row of numbers per event for vector values.
+    They are kept as integers when all of them are, so they're written like
+    :meth:`Event.serialize` writes them, and as floats otherwise.
+    Events are kept sorted by time.
+    """
+
+    def __init__(self, times: Any, ports: Any, values: Any):
+        """
+        :param times: Time of each event, in milliseconds
+        :type times: array-like of int
+        :param ports: Name of the top model input port of each event
+        :type ports: array-like of str
+        :param values: Value of each event, as a 1-D array, or a 2-D array of vector values
+        :type values: array-like of int or float
+        :raises ValueError: The arrays lengths differ, or a time is negative
+        """
+        import numpy as np
+        times = np.asarray(times, dtype=np.int64)
+        values = np.asarray(values)
+        values = values.astype(np.int64 if values.dtype.kind in 'iu' else np.float64)
+        port_names, port_codes = np.unique(np.asarray(ports, dtype=str), return_inverse=True)
+        if times.ndim != 1 or values.ndim not in (1, 2):
+            raise ValueError("Times should be 1-D, and values 1-D or 2-D arrays")
+        if not len(times) == len(port_codes) == len(values):
+            raise ValueError(f"Times, ports and values lengths differ: {len(times)}, "
+                             f"{len(port_codes)}, {len(values)}")
+        if len(times) and times.min() < 0:
+            raise ValueError("Event times can't be negative")
+        order = np.argsort(times, kind='stable')
+        self.times = times[order]
+        self.port_names: List[str] = port_names.tolist()
+        self.port_codes = port_codes[order]  # Indexes of the port names
+        self.values = values[order]
+
+    @classmethod
+    def from_events(cls, events: Sequence[Event]) -> EventTable:
+        return cls([ticks_of(event.time) for event in events],
+                   [event.target_port.name for event in events],
+                   [event.value for event in events])
+
+    @classmethod
+    def _from_sorted(cls, times: Any, port_names: List[str], port_codes: Any,
+                     values: Any) -> EventTable:
+        table = cls.__new__(cls)
+        table.times = times
+        table.port_names = port_names
+        table.port_codes = port_codes
+        table.values = values
+        return table
+
+    def __len__(self) -> int:
+        return len(self.times)
+
+    def until(self, ticks: int) -> EventTable:
+        """Returns the events up to a time, inclusive."""
+        end = int(self.times.searchsorted(ticks, side='right'))
+        return self._from_sorted(self.times[:end], self.port_names, self.port_codes[:end],
+                                 self.values[:end])
+
+    @property
+    def is_vector(self) -> bool:
+        return self.values.ndim == 2
+
+    def validate(self, top_model: Model) -> None:
+        """Checks every event targets an input port of the top model.
+
+        :raises PortNotFoundException: A port isn't an input port of the top model
+        """
+        inport_names = {port.name for port in top_model.inports}
+        for port_name in self.port_names:
+            if port_name not in inport_names:
+                raise PortNotFoundException(port_name)
+
+    def _row_format(self) -> str:
+        value_format = "%r"
+        if self.is_vector:
+            value_format = "[" + ", ".join(["%r"] * self.values.shape[1]) + "]"
+        return "%02d:%02d:%02d:%03d %s " + value_format + ";\n"
+
+    def iter_serialized(self, chunk_rows: int = EVENTS_CHUNK_ROWS) -> Iterator[str]:
+        """Serializes the events into CD++ consumable lines, a chunk of rows at a time, as
+        :meth:`Event.serialize` would."""
+        import numpy as np
+        row_format = self._row_format()
+        port_names = np.asarray(self.port_names, dtype=object)
+        for start in range(0, len(self), chunk_rows):
+            times = self.times[start:start + chunk_rows]
+            columns = [times // MILLISECONDS_PER_HOUR,
+                       times // MILLISECONDS_PER_MINUTE % 60,
+                       times // MILLISECONDS_PER_SECOND % 60,
+                       times % MILLISECONDS_PER_SECOND,
+                       port_names[self.port_codes[start:start + chunk_rows]]]
+            values = self.values[start:start + chunk_rows]
+            columns.extend(values.T if self.is_vector else [values])
+            # A single formatting operation for the whole chunk, over its interleaved columns
+            rows = zip(*(column.tolist() for column in columns))
+            yield (row_format * len(times)) % tuple(itertools.chain.from_iterable(rows))
+
+    def serialize(self) -> str:
+        return ''.join(self.iter_serialized())
+
+    def write(self, path: str) -> None:
+        with open(path, "w") as events_file:
+            for chunk in self.iter_serialized():
+                events_file.write(chunk)
+
+
+# Anything a Simulation takes as events. Iterables are consumed lazily, and may yield single
+# events or batches of them
+EventsSource = Union[List[Event], EventTable, Iterable[Union[Event, EventTable, List[Event]]]]
+
+
+def _table_batch(table: EventTable, limit: Optional[int]) -> Tuple[int, int, EventTable]:
+    first_ticks, last_ticks = int(table.times[0]), int(table.times[-1])
+    if limit is not None and last_ticks > limit:
+        table = table.until(limit)
+    return first_ticks, last_ticks, table
+
+
+def _events_batch(events: List[Event], limit: Optional[int]) -> Tuple[int, int, List[Event]]:
+    ticks = [ticks_of(event.time) for event in events]
+    for index in range(1, len(ticks)):
+        if ticks[index] < ticks[index - 1]:
+            raise EventsOutOfOrderException(events[index].time, events[index - 1].time)
+    if limit is not None and ticks[-1] > limit:
+        events = [event for event, event_ticks in zip(events, ticks) if event_ticks <= limit]
+    return ticks[0], ticks[-1], events
+
+
+def write_events(events: EventsSource, events_file: TextIO,
+                 duration: Optional[VirtualTime] = None,
+                 top_model: Optional[Model] = None) -> int:
+    """Streams events into a file, consuming iterators lazily, so only a batch of events is
+    held in memory at a time. Events an iterator yields after the duration are dropped, and
+    it's no longer consumed once it yields one of them, so infinite generators can be cut.
+
+    A list or tuple of :class:`Event` is written whole, as it always was, sorted by time
+    (stably, so events at the same time keep their order).
+
+    :param events: The events, or batches of them, in time order unless a list of events
+    :type events: EventsSource
+    :param events_file: The file the events are written into
+    :type events_file: TextIO
+    :param duration: Time after which events are dropped, defaults to None (no limit)
+    :type duration: Optional[VirtualTime], optional
+    :param top_model: Model the ports of the event tables are checked against, defaults to
+        None (no check)
+    :type top_model: Optional[Model], optional
+    :raises EventsOutOfOrderException: An event an iterator yields is earlier than the one
+        before it
+    :raises PortNotFoundException: An event table targets a port the top model lacks
+    :return: The amount of written events
+    :rtype: int
+    """
+    limit = ticks_of(duration) if duration is not None else None
+    batches: Iterable[Any] = [events] if isinstance(events, EventTable) else events
+    if isinstance(events, (list, tuple)) and all(isinstance(event, Event) for event in events):
+        batches = [sorted(events, key=lambda event: event.time)]
+        limit = None
+    previous_ticks = 0
+    written = 0
+    for batch in batches:
+        if isinstance(batch, Event):
+            batch = [batch]
+        if not len(batch):
+            continue
+        if isinstance(batch, EventTable):
+            if top_model is not None:
+                batch.validate(top_model)
+            first_ticks, last_ticks, batch = _table_batch(batch, limit)
+            lines: Iterable[str] = batch.iter_serialized()
+        else:
+            first_ticks, last_ticks, batch = _events_batch(batch, limit)
+            lines = (event.serialize() + "\n" for event in batch)
+        if first_ticks < previous_ticks:
+            raise EventsOutOfOrderException(time_of_ticks(first_ticks),
+                                            time_of_ticks(previous_ticks))
+        events_file.writelines(lines)
+        written += len(batch)
+        previous_ticks = last_ticks
+        if limit is not None and last_ticks > limit:
+            break  # Events are in time order, so the rest are after the duration too
+    return written
+
+
+class EventsFifoWriter(threading.Thread):
+    """Writes events into a named pipe while the simulator reads them, so the events file is
+    never written to disk."""
+
+    def __init__(self, path: str, events: EventsSource, duration: Optional[VirtualTime] = None,
+                 top_model: Optional[Model] = None):
+        super().__init__(daemon=True)
+        os.mkfifo(path)
+        self.path = path
+        self.events = events
+        self.duration = duration
+        self.top_model = top_model
+        self.written = 0
+        self.error: Optional[Exception] = None
+
+    def run(self) -> None:
+        try:
+            with open(self.path, "w") as fifo:  # Blocks until the simulator opens it
+                self.written = write_events(self.events, fifo, self.duration, self.top_model)
+        except BrokenPipeError:
+            pass  # The simulator stopped reading
+        except Exception as error:
+            self.error = error
+
+    def finish(self) -> None:
+        """Waits for the writer, once the simulator exited, raising its error if any."""
+        if self.is_alive():
+            # Opening the reading end unblocks a writer still waiting for the simulator to open
+            # the pipe, and closing it makes the writer fail with a broken pipe
+            os.close(os.open(self.path, os.O_RDONLY | os.O_NONBLOCK))
+        self.join()
+        if self.error is not None:
+            raise self.error
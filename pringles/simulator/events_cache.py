@@ -0,0 +1,144 @@
+from __future__ import annotations
+
+import os
+import time
+import hashlib
+import tempfile
+from typing import Optional, Iterable, Tuple, cast, TextIO
+
+from pringles.models import Model
+from pringles.utils import VirtualTime
+from pringles.simulator.events import EventsSource, EventTable, write_events, ticks_of
+
+EVENTS_FILE_EXTENSION = '.events'
+TEMPORARY_FILE_EXTENSION = '.tmp'
+# Temporary files older than this were left by a writer that crashed before moving them
+STALE_TEMPORARY_SECONDS = 3600
+
+
+class _HashingWriter:
+    """A text sink hashing what's written into it, and forwarding it to a file, if any."""
+
+    def __init__(self, events_file: Optional[TextIO] = None):
+        self.hash = hashlib.sha256()
+        self.events_file = events_file
+
+    def write(self, text: str) -> None:
+        self.hash.update(text.encode())
+        if self.events_file is not None:
+            self.events_file.write(text)
+
+    def writelines(self, lines: Iterable[str]) -> None:
+        for line in lines:
+            self.write(line)
+
+
+class EventsCache:
+    """A scratch directory where events files are stored once, named by a hash of their
+    content, so runs sharing their stimulus share the same file. The events file in each run
+    output directory is a hard link to the stored one, or the stored one itself is passed to
+    the simulator when links can't be made, as across file systems.
+
+    Event tables are hashed from their arrays, and lists of events from their serialization,
+    so in both cases a file already stored isn't written again. As the keys differ, the same
+    events given as a table and as a list are stored in two files. Iterators of events can
+    only be consumed once, so they are written while hashed, and only one copy is kept.
+
+    Events are written into a temporary file, removed if writing fails. The temporary files
+    of processes that crashed while writing are removed when a cache is opened over the
+    directory, once they are :data:`STALE_TEMPORARY_SECONDS` old.
+    """
+
+    def __init__(self, directory: str):
+        """
+        :param directory: Directory the events files are stored in, created if it doesn't exist
+        :type directory: str
+        """
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self._remove_stale_temporaries()
+
+    def _remove_stale_temporaries(self) -> None:
+        stale_before = time.time() - STALE_TEMPORARY_SECONDS
+        for file_name in os.listdir(self.directory):
+            if not file_name.endswith(TEMPORARY_FILE_EXTENSION):
+                continue
+            path = os.path.join(self.directory, file_name)
+            try:
+                if os.path.getmtime(path) < stale_before:
+                    os.remove(path)
+            except OSError:
+                pass  # Moved or removed by its writer meanwhile
+
+    def _path_of(self, key: str) -> str:
+        return os.path.join(self.directory, key + EVENTS_FILE_EXTENSION)
+
+    @staticmethod
+    def _key(events: EventsSource, duration: Optional[VirtualTime]) -> Optional[str]:
+        """Returns the key of reusable events, or None for iterators."""
+        if not isinstance(events, (EventTable, list)):
+            return None
+        if isinstance(events, EventTable):
+            events_hash = hashlib.sha256(b'table')
+            events_hash.update('\0'.join(events.port_names).encode())
+            events_hash.update(f'{events.values.shape} {events.values.dtype}'.encode())
+            for array in (events.times, events.port_codes, events.values):
+                events_hash.update(array.tobytes())
+        else:
+            writer = _HashingWriter()
+            write_events(events, cast(TextIO, writer))
+            events_hash = writer.hash
+        events_hash.update(str(ticks_of(duration) if duration is not None else None).encode())
+        return events_hash.hexdigest()
+
+    def store(self, events: EventsSource, duration: Optional[VirtualTime] = None,
+              top_model: Optional[Model] = None) -> Tuple[str, bool]:
+        """Stores the events file, unless an identical one was already stored.
+
+        See :func:`write_events` for the parameters.
+
+        :return: The path of the stored file, and whether it was written
+        :rtype: Tuple[str, bool]
+        """
+        key = self._key(events, duration)
+        if key is not None and os.path.isfile(self._path_of(key)):
+            return self._path_of(key), False
+
+        file_descriptor, temporary_path = tempfile.mkstemp(dir=self.directory,
+                                                           suffix=TEMPORARY_FILE_EXTENSION)
+        try:
+            with os.fdopen(file_descriptor, "w") as events_file:
+                writer = _HashingWriter(events_file)
+                write_events(events, cast(TextIO, writer), duration, top_model)
+            if key is None:
+                writer.hash.update(b'iterator')
+                key = writer.hash.hexdigest()
+            path = self._path_of(key)
+            written = not os.path.isfile(path)
+            if written:
+                # Read only, as every run links to it. Moved atomically, so concurrent runs
+                # storing the same events never see a partial file
+                os.chmod(temporary_path, 0o444)
+                os.replace(temporary_path, path)
+        finally:
+            if os.path.exists(temporary_path):
+                os.remove(temporary_path)
+        return path, written
+
+    @staticmethod
+    def link_into(path: str, output_dir: str, file_name: str = "events") -> str:
+        """Links a stored events file into a run output directory.
+
+        :return: The path the simulator should read the events from
+        :rtype: str
+        """
+        link_path = os.path.join(output_dir, file_name)
+        try:
+            os.link(path, link_path)
+        except OSError:
+            return path
+        return link_path
+
+    def __len__(self) -> int:
+        return sum(1 for file_name in os.listdir(self.directory)
+                   if file_name.endswith(EVENTS_FILE_EXTENSION))
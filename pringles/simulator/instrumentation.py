@@ -0,0 +1,172 @@
+from __future__ import annotations
+
+import os
+import sys
+import time
+import subprocess
+import tempfile
+from contextlib import contextmanager
+from typing import Optional, List, Dict, Any, Iterator, Sequence, Tuple, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from pringles.simulator.simulation import Simulation
+
+SERIALIZE_MODEL_STAGE = 'serialize_model'
+WRITE_MODEL_STAGE = 'write_model'
+WRITE_EVENTS_STAGE = 'write_events'
+SIMULATOR_PROCESS_STAGE = 'simulator_process'
+PARSE_OUTPUT_STAGE = 'parse_output'
+PARSE_LOGS_STAGE = 'parse_logs'
+PICKLE_STAGE = 'pickle'
+
+
+class StageTiming:
+    """Measures of a single stage of a simulation run. Byte counts are None when the stage
+    doesn't read or write files."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.wall_time = 0.
+        self.cpu_time = 0.
+        self.bytes_in: Optional[int] = None
+        self.bytes_out: Optional[int] = None
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            'stage': self.name,
+            'wall_time': self.wall_time,
+            'cpu_time': self.cpu_time,
+            'bytes_in': self.bytes_in,
+            'bytes_out': self.bytes_out
+        }
+
+    def __repr__(self):
+        return f"StageTiming({self.name}: {self.wall_time:.6f}s wall, {self.cpu_time:.6f}s cpu)"
+
+
+class ProcessUsage:
+    """Resources used by the simulator child process."""
+
+    def __init__(self, max_rss_bytes: int, user_time: float, sys_time: float):
+        self.max_rss_bytes = max_rss_bytes
+        self.user_time = user_time
+        self.sys_time = sys_time
+
+    @classmethod
+    def from_rusage(cls, rusage: Any) -> ProcessUsage:
+        # ru_maxrss is in kilobytes, except for macOS, which reports bytes
+        rss_unit = 1 if sys.platform == 'darwin' else 1024
+        return cls(rusage.ru_maxrss * rss_unit, rusage.ru_utime, rusage.ru_stime)
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            'max_rss_bytes': self.max_rss_bytes,
+            'user_time': self.user_time,
+            'sys_time': self.sys_time
+        }
+
+
+class SimulationTimings:
+    """Structured record of where the time of a simulation run went, stage by stage."""
+
+    def __init__(self):
+        self.stages: List[StageTiming] = []
+        self.process_usage: Optional[ProcessUsage] = None
+
+    def __getitem__(self, name: str) -> StageTiming:
+        for stage in self.stages:
+            if stage.name == name:
+                return stage
+        raise KeyError(name)
+
+    def __contains__(self, name: str) -> bool:
+        return any(stage.name == name for stage in self.stages)
+
+    @property
+    def wall_time(self) -> float:
+        return sum(stage.wall_time for stage in self.stages)
+
+    @property
+    def cpu_time(self) -> float:
+        return sum(stage.cpu_time for stage in self.stages)
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            'stages': [stage.as_dict() for stage in self.stages],
+            'process_usage': self.process_usage.as_dict() if self.process_usage else None
+        }
+
+
+class StageHook:
+    """Base class for the callbacks notified around each stage of a simulation run, for
+    example to forward metrics to a collector. Hooks are passed to the :class:`Simulator`."""
+
+    def on_stage_start(self, simulation: Optional[Simulation], stage: str) -> None:
+        pass
+
+    def on_stage_end(self, simulation: Optional[Simulation], timing: StageTiming) -> None:
+        pass
+
+
+class StageRecorder:
+    """Times the stages of a simulation run into a :class:`SimulationTimings`, notifying
+    the hooks as each one starts and ends."""
+
+    def __init__(self, simulation: Optional[Simulation], hooks: Sequence[StageHook] = ()):
+        self.simulation = simulation
+        self.hooks = hooks
+        self.timings = SimulationTimings()
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[StageTiming]:
+        timing = StageTiming(name)
+        for hook in self.hooks:
+            hook.on_stage_start(self.simulation, name)
+        wall_start = time.perf_counter()
+        cpu_start = time.process_time()
+        try:
+            yield timing
+        finally:
+            timing.wall_time = time.perf_counter() - wall_start
+            timing.cpu_time = time.process_time() - cpu_start
+            self.timings.stages.append(timing)
+            for hook in self.hooks:
+                hook.on_stage_end(self.simulation, timing)
+
+
+def files_size(paths: Sequence[Optional[str]]) -> int:
+    return sum(os.path.getsize(path) for path in paths
+               if path is not None and os.path.isfile(path))
+
+
+def log_files(main_log_path: str) -> List[str]:
+    """Returns the main log file path, plus the component logs CD++ writes next to it."""
+    log_dir, main_log_name = os.path.split(main_log_path)
+    return [os.path.join(log_dir, filename) for filename in os.listdir(log_dir or '.')
+            if filename.startswith(main_log_name)]
+
+
+def _exit_code(status: int) -> int:
+    if os.WIFSIGNALED(status):
+        return -os.WTERMSIG(status)
+    return os.WEXITSTATUS(status)
+
+
+def run_process(commands: List[str]) -> Tuple[subprocess.CompletedProcess,
+                                              Optional[ProcessUsage]]:
+    """Runs a process like ``subprocess.run(commands, capture_output=True, check=True)``, also
+    returning the resources it used, where the platform reports them."""
+    if not hasattr(os, 'wait4'):
+        return subprocess.run(commands, capture_output=True, check=True), None
+
+    # Outputs go to files instead of pipes, so the process can be reaped with wait4
+    with tempfile.TemporaryFile() as stdout, tempfile.TemporaryFile() as stderr:
+        process = subprocess.Popen(commands, stdout=stdout, stderr=stderr)
+        _, status, rusage = os.wait4(process.pid, 0)
+        process.returncode = _exit_code(status)
+        stdout.seek(0)
+        stderr.seek(0)
+        completed_process = subprocess.CompletedProcess(commands, process.returncode,
+                                                        stdout.read(), stderr.read())
+    completed_process.check_returncode()
+    return completed_process, ProcessUsage.from_rusage(rusage)
@@ -0,0 +1,88 @@
+from __future__ import annotations
+
+import os
+import json
+from datetime import datetime
+from typing import Optional, Dict, Any, Set
+
+STARTED = 'started'
+COMPLETED = 'completed'
+FAILED = 'failed'
+
+
+class JournalEntry:
+    """The last known state of a run of a batch."""
+
+    def __init__(self, run_id: str, status: str, attempt: int, error: Optional[str] = None,
+                 transient: bool = False):
+        self.run_id = run_id
+        self.status = status
+        self.attempt = attempt
+        self.error = error
+        self.transient = transient
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            'run_id': self.run_id,
+            'status': self.status,
+            'attempt': self.attempt,
+            'error': self.error,
+            'transient': self.transient,
+            'time': datetime.now().isoformat()
+        }
+
+    def __repr__(self):
+        return f"JournalEntry({self.run_id}: {self.status}, attempt {self.attempt})"
+
+
+class RunJournal:
+    """An append-only record of the runs of a batch, as JSON lines, from which an interrupted
+    batch is resumed. Each run is journaled as started before it's executed, and as completed
+    or failed after each attempt, so the runs that were in flight when the batch died are
+    the ones started but never finished.
+    """
+
+    def __init__(self, path: str):
+        """
+        :param path: The journal file, which is created if it doesn't exist
+        :type path: str
+        """
+        self.path = path
+        self.entries: Dict[str, JournalEntry] = {}
+        if os.path.isfile(path):
+            self._replay()
+
+    def _replay(self) -> None:
+        with open(self.path) as journal_file:
+            for line in journal_file:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue  # A line torn by the interruption
+                self.entries[record['run_id']] = JournalEntry(
+                    record['run_id'], record['status'], record['attempt'],
+                    record.get('error'), record.get('transient', False))
+
+    def record(self, run_id: str, status: str, attempt: int, error: Optional[str] = None,
+               transient: bool = False) -> JournalEntry:
+        entry = JournalEntry(run_id, status, attempt, error, transient)
+        with open(self.path, 'a') as journal_file:
+            journal_file.write(json.dumps(entry.as_dict()) + '\n')
+            journal_file.flush()
+            os.fsync(journal_file.fileno())
+        self.entries[run_id] = entry
+        return entry
+
+    def _with_status(self, status: str) -> Set[str]:
+        return {run_id for run_id, entry in self.entries.items() if entry.status == status}
+
+    def completed(self) -> Set[str]:
+        return self._with_status(COMPLETED)
+
+    def failed(self) -> Set[str]:
+        return self._with_status(FAILED)
+
+    def in_flight(self) -> Set[str]:
+        """Returns the runs started but never finished, such as the ones running when the
+        batch was interrupted."""
+        return self._with_status(STARTED)
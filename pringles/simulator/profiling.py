@@ -0,0 +1,115 @@
+from __future__ import annotations
+
+import os
+import cProfile
+import pstats
+import logging
+import threading
+from contextlib import contextmanager
+from typing import Optional, List, Dict, Iterator, Sequence, TYPE_CHECKING
+
+from pringles.simulator.instrumentation import StageHook, StageTiming
+
+if TYPE_CHECKING:
+    import pandas as pd
+    from pringles.simulator.simulation import Simulation
+
+PROFILE_FILE_PREFIX = 'profile-'
+PROFILE_FILE_EXTENSION = '.prof'
+
+FUNCTION_COL = 'function'
+CALLS_COL = 'calls'
+TOTAL_TIME_COL = 'total_time'
+CUMULATIVE_TIME_COL = 'cumulative_time'
+
+
+class StageProfiler(StageHook):
+    """A stage hook that runs each stage of a simulation under cProfile, and dumps the stats
+    of each one into the simulation output dir, as ``profile-<stage>.prof``. Usually enabled
+    through :meth:`Simulator.profiling`.
+    """
+
+    def __init__(self):
+        self.profile_paths: List[str] = []
+        self._running_profiles: Dict[int, cProfile.Profile] = {}
+
+    def on_stage_start(self, simulation: Optional[Simulation], stage: str) -> None:
+        if simulation is None:
+            return
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:
+            # Another profiler is already running in this interpreter
+            logging.debug("Stage %s was not profiled, another profiler is running", stage)
+            return
+        self._running_profiles[threading.get_ident()] = profile
+
+    def on_stage_end(self, simulation: Optional[Simulation], timing: StageTiming) -> None:
+        profile = self._running_profiles.pop(threading.get_ident(), None)
+        if profile is None or simulation is None:
+            return
+        profile.disable()
+        path = os.path.join(simulation.output_dir,
+                            PROFILE_FILE_PREFIX + timing.name + PROFILE_FILE_EXTENSION)
+        profile.dump_stats(path)
+        self.profile_paths.append(path)
+
+    def summary(self, top: int = 20, sort_by: str = CUMULATIVE_TIME_COL,
+                stage: Optional[str] = None) -> pd.DataFrame:
+        """Returns the hotspots of every stage profiled so far. See :func:`profile_summary`.
+
+        :param stage: Only summarize the profiles of this stage, defaults to None (all stages)
+        :type stage: Optional[str], optional
+        """
+        paths = self.profile_paths
+        if stage is not None:
+            paths = [path for path in paths if os.path.basename(path) ==
+                     PROFILE_FILE_PREFIX + stage + PROFILE_FILE_EXTENSION]
+        return profile_summary(paths, top, sort_by)
+
+
+@contextmanager
+def profiled(path: str) -> Iterator[cProfile.Profile]:
+    """Profiles the enclosed block with cProfile, dumping the stats to a file. Useful for the
+    steps that run outside a simulation, such as the atomics discovery of an
+    :class:`AtomicRegistry`.
+
+    :param path: The file the profile stats are dumped to
+    :type path: str
+    """
+    profile = cProfile.Profile()
+    profile.enable()
+    try:
+        yield profile
+    finally:
+        profile.disable()
+        profile.dump_stats(path)
+
+
+def profile_summary(paths: Sequence[str], top: int = 20,
+                    sort_by: str = CUMULATIVE_TIME_COL) -> pd.DataFrame:
+    """Merges many profile stats files, such as the ones of a batch of runs, and returns the
+    functions where most time went.
+
+    :param paths: The profile stats files
+    :type paths: Sequence[str]
+    :param top: Amount of functions returned, defaults to 20
+    :type top: int, optional
+    :param sort_by: Column to rank the functions by, defaults to the cumulative time
+    :type sort_by: str, optional
+    :return: The function, calls, total time and cumulative time of each hotspot
+    :rtype: pd.DataFrame
+    """
+    import pandas as pd
+    columns = [FUNCTION_COL, CALLS_COL, TOTAL_TIME_COL, CUMULATIVE_TIME_COL]
+    if not paths:
+        return pd.DataFrame(columns=columns)
+    stats = pstats.Stats(*paths)
+    rows = [(f"{filename}:{line}({name})", calls, total_time, cumulative_time)
+            for (filename, line, name), (_, calls, total_time, cumulative_time, _)
+            in stats.stats.items()]  # type: ignore
+    return pd.DataFrame(rows, columns=columns)\
+        .sort_values(sort_by, ascending=False)\
+        .head(top)\
+        .reset_index(drop=True)
@@ -3,7 +3,7 @@ from typing import Optional, List, Type
 
 from pringles.models import Atomic, AtomicModelBuilder
 from pringles.simulator.errors import DuplicatedAtomicException
-from pringles.utils import AtomicMetadataExtractor
+from pringles.simulator.profiling import profiled
 from pringles.utils.errors import MetadataParsingException, NonExistingAtomicClassException
 
 
@@ -14,11 +14,25 @@ class AtomicRegistry:
 
     SUPPORTED_FILE_EXTENSIONS = [".cpp", ".hpp", ".h"]
 
-    def __init__(self, user_models_dir: Optional[str] = None, autodiscover: bool = True):
+    def __init__(self, user_models_dir: Optional[str] = None, autodiscover: bool = True,
+                 profile_path: Optional[str] = None):
+        """
+        :param user_models_dir: Directory to discover user atomics from, defaults to None
+        :type user_models_dir: Optional[str], optional
+        :param autodiscover: True if atomics should be discovered, defaults to True
+        :type autodiscover: bool, optional
+        :param profile_path: If set, the discovery is profiled with cProfile, and its stats
+            dumped to this file, defaults to None
+        :type profile_path: Optional[str], optional
+        """
         self.user_models_dir = user_models_dir
         self.discovered_atomics: List[Type[Atomic]] = []
         if autodiscover:
-            self._discover_atomics()
+            if profile_path is not None:
+                with profiled(profile_path):
+                    self._discover_atomics()
+            else:
+                self._discover_atomics()
 
     def _add_atomic_class_as_attribute(self, name: str, atomic_class: Type[Atomic]):
         if hasattr(self, name):
@@ -42,6 +56,7 @@ class AtomicRegistry:
                 f'Atomic class named {name} is not present in the registry.')
 
     def _discover_atomics(self) -> None:
+        from pringles.utils.discovery import AtomicMetadataExtractor
 
         files_to_extract_from: List[str] = []
 
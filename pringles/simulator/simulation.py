@@ -1,21 +1,28 @@
 from __future__ import annotations
 
 import os
+import logging
+import collections.abc
 import tempfile
 import uuid
 import pickle
 from datetime import datetime
-from typing import Optional, List
-
-import pandas as pd
-import matplotlib.pyplot as plt  # pylint: disable=E0401
-from matplotlib.axes import Axes  # pylint: disable=E0401
+from typing import Optional, Dict, Tuple, Sequence, Any, TYPE_CHECKING
 
 from pringles.models import Model
-from pringles.utils import VirtualTime, vtime_decorate
-from pringles.simulator.events import Event
+from pringles.utils import VirtualTime
+from pringles.simulator.events import EventTable, EventsSource
+from pringles.simulator.instrumentation import (StageRecorder, SimulationTimings, files_size,
+                                                log_files,
+                                                PARSE_OUTPUT_STAGE, PARSE_LOGS_STAGE)
 from pringles.simulator.errors import AttributeIsImmutableException, TopModelNotNamedTopException
 
+# pandas, numpy and matplotlib are imported on first use, to keep the import of pringles light
+if TYPE_CHECKING:
+    import numpy as np
+    import pandas as pd
+    from matplotlib.axes import Axes  # pylint: disable=E0401
+
 
 # This object should contain the following properties:
 # - Whether or not the simulation was successful (Or maybe this should raise an error)
@@ -30,16 +37,108 @@ class SimulationResult:
     MESSAGE_TYPE_COL = 'message_type'
     MODEL_ORIGIN_COL = 'model_origin'
     MODEL_DEST_COL = 'model_dest'
+    CATEGORICAL_COLS = [MESSAGE_TYPE_COL, MODEL_ORIGIN_COL, PORT_COL, MODEL_DEST_COL]
+    UNNAMED_LOG_COLS = [0, 1]
 
-    def __init__(self, process_result, main_log_path=None, output_path=None):
+    def __init__(self, process_result, main_log_path=None, output_path=None,
+                 keep_unnamed_log_cols: bool = False,
+                 stage_recorder: Optional[StageRecorder] = None):
+        """
+        :param process_result: The finished CD++ process
+        :type process_result: subprocess.CompletedProcess
+        :param main_log_path: Path of the CD++ main log file, defaults to None
+        :type main_log_path: Optional[str], optional
+        :param output_path: Path of the CD++ output file, defaults to None
+        :type output_path: Optional[str], optional
+        :param keep_unnamed_log_cols: True if the two leading log columns, whose meaning
+            is unknown, should be kept in the logs DataFrames, defaults to False
+        :type keep_unnamed_log_cols: bool, optional
+        :param stage_recorder: Recorder the parsing stages are timed into, defaults to None.
+            Its timings are kept as the result :attr:`timings`
+        :type stage_recorder: Optional[StageRecorder], optional
+        """
         self.process_result = process_result
         self.main_log_path = main_log_path
         self.output_path = output_path
-
+        self.keep_unnamed_log_cols = keep_unnamed_log_cols
+        self._port_groups_cache: Dict[str, Dict[str, pd.DataFrame]] = {}
+        self._port_rows_cache: Dict[str, Dict[str, np.ndarray]] = {}
+        self._port_values_cache: Dict[Tuple[str, str, int],
+                                      Optional[Tuple[np.ndarray, np.ndarray]]] = {}
+        # The times of each log as numbers, computed from the time strings while parsing
+        self._time_numbers: Dict[str, np.ndarray] = {}
+
+        self.timings: Optional[SimulationTimings] = None
+
+        if stage_recorder is None:
+            stage_recorder = StageRecorder(None)
+        else:
+            self.timings = stage_recorder.timings
         if output_path:
-            self.output_df = SimulationResult._parse_output_file(output_path)
+            with stage_recorder.stage(PARSE_OUTPUT_STAGE) as stage:
+                self.output_df = SimulationResult._parse_output_file(output_path)
+                stage.bytes_in = files_size([output_path])
         if main_log_path:
-            self.logs_dfs = SimulationResult._parse_main_log_file(main_log_path)
+            with stage_recorder.stage(PARSE_LOGS_STAGE) as stage:
+                self._load_logs()
+                stage.bytes_in = files_size(log_files(main_log_path))
+
+    def __getstate__(self):
+        # Port views and extracted values can be rebuilt from the logs, so they are not pickled
+        state = self.__dict__.copy()
+        state['_port_groups_cache'] = {}
+        state['_port_rows_cache'] = {}
+        state['_port_values_cache'] = {}
+        return state
+
+    def __setstate__(self, state):
+        # Results pickled before the logs became a property, and their caches were added
+        if 'logs_dfs' in state:
+            state['_logs_dfs'] = state.pop('logs_dfs')
+        self.__dict__.update(state)
+        for attribute, default in (('keep_unnamed_log_cols', False), ('timings', None),
+                                   ('_port_groups_cache', {}), ('_port_rows_cache', {}),
+                                   ('_port_values_cache', {}), ('_time_numbers', {})):
+            self.__dict__.setdefault(attribute, default)
+
+    @property
+    def logs_dfs(self) -> Dict[str, pd.DataFrame]:
+        return self._logs_dfs
+
+    @logs_dfs.setter
+    def logs_dfs(self, logs_dfs: Dict[str, pd.DataFrame]):
+        self._logs_dfs = logs_dfs
+        self._invalidate_port_caches()
+
+    def _invalidate_port_caches(self) -> None:
+        self._port_groups_cache = {}
+        self._port_rows_cache = {}
+        self._port_values_cache = {}
+        self._time_numbers = {}
+
+    def _load_logs(self) -> None:
+        time_numbers: Dict[str, np.ndarray] = {}
+        self.logs_dfs = SimulationResult._parse_main_log_file(self.main_log_path,
+                                                              self.keep_unnamed_log_cols,
+                                                              time_numbers)
+        self._time_numbers = time_numbers
+
+    def reload_logs(self) -> None:
+        """Parses again the simulation logs, discarding every cached port view.
+
+        :raises ValueError: The simulation didn't log its messages
+        """
+        if self.main_log_path is None:
+            raise ValueError("The simulation has no logs to reload")
+        self._load_logs()
+
+    def logs_memory_usage(self) -> Dict[str, int]:
+        """Returns the memory used by each component log DataFrame, in bytes.
+
+        :return: The memory usage, by log name
+        :rtype: Dict[str, int]
+        """
+        return {logname: self._memory_usage(log) for logname, log in self.logs_dfs.items()}
 
     def successful(self):
         return self.process_result.returncode == 0
@@ -53,18 +152,40 @@ class SimulationResult:
 
     @classmethod
     def _parse_output_file(cls, file_path) -> pd.DataFrame:
+        import pandas as pd
         df_converters = {
-            cls.VALUE_COL: cls._parse_value,
-            cls.TIME_COL: VirtualTime.parse
+            cls.VALUE_COL: cls._parse_value
         }
-        return pd.read_csv(file_path,
-                           delimiter=r'(?<!,)\s+',
-                           engine='python',  # C engine doesnt work for regex
-                           converters=df_converters,
-                           names=[cls.TIME_COL, cls.PORT_COL, cls.VALUE_COL])
+        output = pd.read_csv(file_path,
+                             delimiter=r'(?<!,)\s+',
+                             engine='python',  # C engine doesnt work for regex
+                             converters=df_converters,
+                             dtype={cls.TIME_COL: str},
+                             names=[cls.TIME_COL, cls.PORT_COL, cls.VALUE_COL])
+        output[cls.TIME_COL] = VirtualTime.parse_many(output[cls.TIME_COL])
+        return output
+
+    @staticmethod
+    def _memory_usage(df: pd.DataFrame) -> int:
+        return int(df.memory_usage(index=True, deep=True).sum())
+
+    @staticmethod
+    def _compact_values(values: pd.Series) -> pd.Series:
+        if values.dtype == object and any(isinstance(value, tuple) for value in values):
+            return values  # Vector values are kept as tuples
+        return values.astype(float)
+
+    @classmethod
+    def _compact_log_df(cls, log: pd.DataFrame) -> pd.DataFrame:
+        for col in cls.CATEGORICAL_COLS:
+            log[col] = log[col].astype('category')
+        log[cls.VALUE_COL] = cls._compact_values(log[cls.VALUE_COL])
+        return log
 
     @classmethod
-    def _parse_main_log_file(cls, file_path):
+    def _parse_main_log_file(cls, file_path, keep_unnamed_log_cols: bool = False,
+                             time_numbers: Optional[Dict[str, np.ndarray]] = None):
+        import pandas as pd
         log_file_per_component = {}
         parsed_logs = {}
         with open(file_path, 'r') as main_log_file:
@@ -76,38 +197,192 @@ class SimulationResult:
                                                 log_dir + '/' + path.split('/')[-1])
 
         df_converters = {
-            cls.VALUE_COL: cls._parse_value,
-            cls.TIME_COL: VirtualTime.parse
+            cls.VALUE_COL: cls._parse_value
         }
+        col_names = cls.UNNAMED_LOG_COLS + [cls.MESSAGE_TYPE_COL,
+                                            cls.TIME_COL,
+                                            cls.MODEL_ORIGIN_COL,
+                                            cls.PORT_COL,
+                                            cls.VALUE_COL,
+                                            cls.MODEL_DEST_COL]
+        used_cols = None if keep_unnamed_log_cols else col_names[len(cls.UNNAMED_LOG_COLS):]
+        report_memory = logging.getLogger().isEnabledFor(logging.DEBUG)
         for logname, filename in log_file_per_component.items():
-            parsed_logs[logname] = pd.read_csv(filename,
-                                               delimiter=r' /\s+',
-                                               engine='python',  # C engine doesnt work for regex
-                                               converters=df_converters,
-                                               names=[0, 1,  # Not sure what first two cols are
-                                                      cls.MESSAGE_TYPE_COL,
-                                                      cls.TIME_COL,
-                                                      cls.MODEL_ORIGIN_COL,
-                                                      cls.PORT_COL,
-                                                      cls.VALUE_COL,
-                                                      cls.MODEL_DEST_COL])
+            log = pd.read_csv(filename,
+                              delimiter=r' /\s+',
+                              engine='python',  # C engine doesnt work for regex
+                              converters=df_converters,
+                              dtype={cls.TIME_COL: str},
+                              names=col_names,
+                              usecols=used_cols)
+            if time_numbers is not None:
+                time_numbers[logname] = VirtualTime.parse_numbers(log[cls.TIME_COL])
+            log[cls.TIME_COL] = VirtualTime.parse_many(log[cls.TIME_COL])
+            memory_before = cls._memory_usage(log) if report_memory else 0
+            parsed_logs[logname] = cls._compact_log_df(log)
+            if report_memory:
+                logging.debug("Log %s memory usage: %d bytes before compaction, %d bytes after",
+                              logname, memory_before, cls._memory_usage(parsed_logs[logname]))
         return parsed_logs
 
+    @classmethod
+    def _extract_port_values(cls, port_data: pd.DataFrame, index: int,
+                             x_values: Optional[np.ndarray] = None
+                             ) -> Tuple[np.ndarray, np.ndarray]:
+        """Returns the times and values of the rows of a port. The times are converted to
+        numbers one by one unless they are given, as converted while parsing."""
+        import numpy as np
+        values = port_data[cls.VALUE_COL]
+        if isinstance(values.iloc[0], tuple):
+            y_values = values.str[index].to_numpy(dtype=float)
+        else:
+            y_values = values.to_numpy(dtype=float)
+        if x_values is None:
+            x_values = np.fromiter((float(time) for time in port_data[cls.TIME_COL]),
+                                   dtype=float, count=len(port_data))
+        return x_values, y_values
+
+    def _log_time_numbers(self, logname: str) -> np.ndarray:
+        """Returns the times of a log as numbers. Logs assigned instead of parsed have them
+        converted once, the first time they are needed."""
+        import numpy as np
+        if logname not in self._time_numbers:
+            times = self.logs_dfs[logname][self.TIME_COL]
+            self._time_numbers[logname] = np.fromiter((float(time) for time in times),
+                                                      dtype=float, count=len(times))
+        return self._time_numbers[logname]
+
+    def _port_groups(self, logname: str) -> Dict[str, pd.DataFrame]:
+        import pandas as pd
+        if logname not in self._port_groups_cache:
+            log: pd.DataFrame = self.logs_dfs[logname]
+            categorical_cols = {col: 'category' for col in self.CATEGORICAL_COLS
+                                if col in log.columns and
+                                not isinstance(log[col].dtype, pd.CategoricalDtype)}
+            if categorical_cols:
+                log = log.astype(categorical_cols)
+                self._logs_dfs[logname] = log
+            # A single pass over the log groups the rows of every port
+            port_rows = log.groupby(self.PORT_COL, sort=False, observed=True).indices
+            self._port_rows_cache[logname] = port_rows
+            self._port_groups_cache[logname] = {portname: log.take(rows)
+                                                for portname, rows in port_rows.items()}
+        return self._port_groups_cache[logname]
+
+    def port_series(self, logname: str, portname: str) -> pd.DataFrame:
+        """Returns the rows of a component log that refer to a port. The log is grouped by port
+        the first time one of its ports is looked up, so later lookups don't scan it again.
+        Assigning :attr:`logs_dfs` or calling :meth:`reload_logs` discards the grouping.
+
+        :param logname: The name of the component log
+        :type logname: str
+        :param portname: The name of the port
+        :type portname: str
+        :return: The log rows of the port, which may be empty
+        :rtype: pd.DataFrame
+        """
+        port_groups = self._port_groups(logname)
+        if portname not in port_groups:
+            return self.logs_dfs[logname].iloc[0:0]
+        return port_groups[portname]
+
+    def get_port_values(self, logname: str, portname: str,
+                        index: int = 0) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+        """Returns the times (as numbers) and values logged for a port. Values are extracted
+        once per port and cached, so later calls don't scan the log again.
+
+        :param logname: The name of the component log
+        :type logname: str
+        :param portname: The name of the port
+        :type portname: str
+        :param index: The element to extract when the port values are tuples, defaults to 0
+        :type index: int, optional
+        :return: The X and Y arrays, or None if the port has no logged values
+        :rtype: Optional[Tuple[np.ndarray, np.ndarray]]
+        """
+        key = (logname, portname, index)
+        if key not in self._port_values_cache:
+            port_data = self.port_series(logname, portname)
+            if port_data.empty:
+                self._port_values_cache[key] = None
+            else:
+                x_values = self._log_time_numbers(logname)[
+                    self._port_rows_cache[logname][portname]]
+                self._port_values_cache[key] = self._extract_port_values(port_data, index,
+                                                                         x_values)
+        return self._port_values_cache[key]
+
+    @staticmethod
+    def _plot_values(axes: Axes, x_values: np.ndarray, y_values: np.ndarray,
+                     decimate: bool, resolution: Optional[int], **plot_kwargs) -> None:
+        from pringles.utils.decimation import decimate_minmax
+        if decimate:
+            if resolution is None:
+                resolution = int(axes.get_window_extent().width)
+            x_values, y_values = decimate_minmax(x_values, y_values, resolution)
+        axes.plot(x_values, y_values, **plot_kwargs)
+
     def plot_port(self, logname: str, portname: str,
-                  axes: Optional[Axes] = None, index=0) -> Optional[Axes]:
-        log: pd.DataFrame = self.logs_dfs[logname]
-        data_to_plot = log[log[self.PORT_COL] == portname]
-        if data_to_plot.empty:
+                  axes: Optional[Axes] = None, index=0,
+                  decimate: bool = True, resolution: Optional[int] = None,
+                  **plot_kwargs) -> Optional[Axes]:
+        """Plots the values logged for a port.
+
+        :param logname: The name of the component log
+        :type logname: str
+        :param portname: The name of the port
+        :type portname: str
+        :param axes: The axes to plot into, defaults to a new VirtualTime aware axes
+        :type axes: Optional[Axes], optional
+        :param index: The element to plot when the port values are tuples, defaults to 0
+        :type index: int, optional
+        :param decimate: True if the series should be reduced to what the plot can show,
+            keeping the min and max values of each bucket, defaults to True
+        :type decimate: bool, optional
+        :param resolution: Amount of decimation buckets, defaults to the axes width in pixels
+        :type resolution: Optional[int], optional
+        :return: The axes plotted into, or None if the port has no logged values
+        :rtype: Optional[Axes]
+        """
+        import matplotlib.pyplot as plt  # pylint: disable=E0401
+        from pringles.utils.plotting import vtime_decorate
+        port_values = self.get_port_values(logname, portname, index)
+        if port_values is None:
             return None
-        if isinstance(data_to_plot[self.VALUE_COL].iloc[0], tuple):
-            y_values = data_to_plot[self.VALUE_COL].map(lambda x: x[index])
-        else:
-            y_values = data_to_plot[self.VALUE_COL]
 
         if axes is None:
             axes = vtime_decorate(plt.axes())  # Create a new axes in current figure
-        x_values = data_to_plot[self.TIME_COL]
-        axes.plot(x_values, y_values)
+        self._plot_values(axes, *port_values, decimate, resolution, **plot_kwargs)
+        return axes
+
+    def plot_ports(self, logname: str, portnames: Sequence[str],
+                   axes: Optional[Axes] = None, indices: Sequence[int] = (0,),
+                   decimate: bool = True, resolution: Optional[int] = None,
+                   **plot_kwargs) -> Optional[Axes]:
+        """Plots the values logged for many ports, all of them extracted from a single pass
+        over the log (see :meth:`port_series`). Each line is labeled with its port name, and
+        index if more than one index is plotted. See :meth:`plot_port` for the rest of the
+        parameters.
+
+        :param portnames: The names of the ports
+        :type portnames: Sequence[str]
+        :param indices: The elements to plot when the port values are tuples, defaults to (0,)
+        :type indices: Sequence[int], optional
+        :return: The axes plotted into, or None if none of the ports has logged values
+        :rtype: Optional[Axes]
+        """
+        import matplotlib.pyplot as plt  # pylint: disable=E0401
+        from pringles.utils.plotting import vtime_decorate
+        for portname in portnames:
+            for index in indices:
+                port_values = self.get_port_values(logname, portname, index)
+                if port_values is None:
+                    continue
+                if axes is None:
+                    axes = vtime_decorate(plt.axes())
+                label = portname if len(indices) == 1 else f"{portname}[{index}]"
+                self._plot_values(axes, *port_values, decimate, resolution,
+                                  label=label, **plot_kwargs)
         return axes
 
     def get_process_output(self) -> str:
@@ -127,19 +402,25 @@ class Simulation:
     def __init__(self,
                  top_model: Model,
                  duration: Optional[VirtualTime] = None,
-                 events: Optional[List[Event]] = None,
+                 events: Optional[EventsSource] = None,
                  use_simulator_logs: bool = True,
                  use_simulator_out: bool = True,
                  working_dir: Optional[str] = None,
-                 override_logged_messages: Optional[str] = None):
+                 override_logged_messages: Optional[str] = None,
+                 params: Optional[Dict[str, Any]] = None,
+                 run_id: Optional[str] = None,
+                 events_fifo: bool = False):
         """
         A Simulation is the object you later simulate
         :param top_model: The top model of the simulation
         :type top_model: Model
         :param duration: Simulation duration, defaults to None (until models passivate)
         :type duration: Optional[VirtualTime], optional
-        :param events: List of external events, defaults to None
-        :type events: Optional[List[Event]], optional
+        :param events: External events, defaults to None. Large amounts of events are better
+            passed as an :class:`EventTable`, whose ports are checked against the top model.
+            Generated events can be passed as an iterator of events or of batches of them,
+            consumed while the events file is written, and cut at the duration.
+        :type events: Optional[EventsSource], optional
         :param use_simulator_logs: True if simulator logs should be generated, defaults to True
         :type use_simulator_logs: bool, optional
         :param use_simulator_out: True if simulator outputs should be captured, defaults to True
@@ -150,19 +431,36 @@ class Simulation:
         :type working_dir: Optional[str], optional
         :param override_logged_messages: ADVANCED USE. Override logged messages filter.
         :type override_logged_messages: Optional[str], optional
+        :param params: Parameters this simulation was built with, such as the values of a sweep.
+            They tag the run when stored in a :class:`ResultStore`, defaults to None
+        :type params: Optional[Dict[str, Any]], optional
+        :param run_id: Deterministic identifier of the run, used as the name of its output
+            directory. The outputs of previous attempts are moved to a sibling directory,
+            suffixed with ``-replaced-`` and the time they were replaced. Defaults to
+            None, in which case a unique directory name is generated.
+        :type run_id: Optional[str], optional
+        :param events_fifo: True if the events should be streamed to the simulator through a
+            named pipe, instead of being written to disk, defaults to False
+        :type events_fifo: bool, optional
         """
         self._result: Optional[SimulationResult] = None
+        self._error: Optional[str] = None
 
         self._assert_top_model_named_top(top_model)
+        if isinstance(events, EventTable):
+            events.validate(top_model)
         self._top_model = top_model
         self._events = events
         self._duration = duration
         self._use_simulator_logs = use_simulator_logs
         self._use_simulator_out = use_simulator_out
         self._override_logged_messages = override_logged_messages
+        self._params = params
+        self._run_id = run_id
+        self._events_fifo = events_fifo
 
         self._working_dir = working_dir if working_dir else tempfile.mkdtemp()
-        self._output_dir = self.make_output_dir(self.working_dir)
+        self._output_dir = self.make_output_dir(self.working_dir, run_id)
 
     @property
     def top_model(self):
@@ -212,6 +510,30 @@ class Simulation:
     def override_logged_messages(self, val):
         raise AttributeIsImmutableException()
 
+    @property
+    def params(self):
+        return self._params
+
+    @params.setter
+    def params(self, val):
+        raise AttributeIsImmutableException()
+
+    @property
+    def events_fifo(self):
+        return self._events_fifo
+
+    @events_fifo.setter
+    def events_fifo(self, val):
+        raise AttributeIsImmutableException()
+
+    @property
+    def run_id(self):
+        return self._run_id
+
+    @run_id.setter
+    def run_id(self, val):
+        raise AttributeIsImmutableException()
+
     @property
     def working_dir(self):
         return self._working_dir
@@ -238,16 +560,48 @@ class Simulation:
         self.to_pickle()
 
     @staticmethod
-    def make_output_dir(working_dir: str) -> str:
-        output_dir_name = datetime.now().strftime("%Y-%m-%d-%H%M%S") + "-" + str(uuid.uuid4().hex)
+    def make_output_dir(working_dir: str, run_id: Optional[str] = None) -> str:
+        if run_id is None:
+            output_dir_name = datetime.now().strftime("%Y-%m-%d-%H%M%S") + "-" + \
+                str(uuid.uuid4().hex)
+        else:
+            output_dir_name = run_id
         absolute_output_dir = os.path.join(working_dir, output_dir_name)
+        if run_id is not None and os.path.isdir(absolute_output_dir):
+            # Left by a previous attempt of the same run, kept for inspection
+            replaced_dir = absolute_output_dir + "-replaced-" + \
+                datetime.now().strftime("%Y-%m-%d-%H%M%S") + "-" + uuid.uuid4().hex[:8]
+            logging.warning("Output directory %s already exists, moving it to %s",
+                            absolute_output_dir, replaced_dir)
+            os.rename(absolute_output_dir, replaced_dir)
         os.mkdir(absolute_output_dir)
         return absolute_output_dir
 
+    @property
+    def error(self) -> Optional[str]:
+        """The failure of the last run of the simulation, None if it did not fail."""
+        return self._error
+
+    @error.setter
+    def error(self, val: Optional[str]):
+        self._error = val
+
     @property
     def was_executed(self) -> bool:
         return self.result is not None
 
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        if isinstance(self._events, collections.abc.Iterator):
+            # Iterators are consumed by the simulator, and most of them can't be pickled
+            state['_events'] = None
+        return state
+
+    def __setstate__(self, state):
+        # Simulations pickled before their failures were recorded
+        state.setdefault('_error', None)
+        self.__dict__.update(state)
+
     def to_pickle(self, path=None) -> None:
         if path is None:
             path = self.output_dir + '/' + self.DEFAULT_PICKLEFILE_NAME
@@ -4,15 +4,24 @@ Test simulator docstring
 from __future__ import annotations
 
 import os
-import subprocess
 import logging
-from typing import Optional, List
+from contextlib import contextmanager
+from typing import Optional, List, Iterator
 
-from pringles.simulator.events import Event
+from pringles.simulator.events import EventsSource, EventsFifoWriter, write_events
 from pringles.simulator.errors import SimulatorExecutableNotFound
 from pringles.simulator.simulation import SimulationResult, Simulation
+from pringles.simulator.events_cache import EventsCache
 from pringles.simulator.registry import AtomicRegistry
-from pringles.models import Model
+from pringles.simulator.store import ResultStore
+from pringles.simulator.instrumentation import (StageHook, StageRecorder, run_process, files_size,
+                                                log_files,
+                                                SERIALIZE_MODEL_STAGE, WRITE_MODEL_STAGE,
+                                                WRITE_EVENTS_STAGE, SIMULATOR_PROCESS_STAGE,
+                                                PICKLE_STAGE)
+from pringles.simulator.profiling import StageProfiler
+from pringles.models import Model, validate as validate_model
+from pringles.utils import VirtualTime
 from pringles.serializers import MaSerializer
 
 
@@ -20,64 +29,171 @@ class Simulator:
     CDPP_BIN = 'cd++'
 
     def __init__(self, cdpp_bin_path: str, user_models_dir: Optional[str] = None,
-                 autodiscover=True):
+                 autodiscover=True, result_store: Optional[ResultStore] = None,
+                 stage_hooks: Optional[List[StageHook]] = None,
+                 events_cache_dir: Optional[str] = None):
         self.executable_route = self.find_executable_route(cdpp_bin_path)
         self.atomic_registry = AtomicRegistry(user_models_dir, autodiscover)
+        self.result_store = result_store
+        self.stage_hooks = stage_hooks if stage_hooks is not None else []
+        # Events files shared by the runs with the same stimulus, see EventsCache
+        self.events_cache = EventsCache(events_cache_dir) if events_cache_dir else None
 
     # This is thread-safe mate.
     def run_simulation(self,
-                       simulation: Simulation) -> SimulationResult:
-        """Run the simulation in the targeted CD++ simulator instance.
+                       simulation: Simulation,
+                       validate: bool = False) -> SimulationResult:
+        """Run the simulation in the targeted CD++ simulator instance. If the simulator has a
+        result store, the simulation outputs are appended to it. Each stage of the run is timed
+        into the result :attr:`SimulationResult.timings`, and notified to the stage hooks.
+        :param validate: True if the top model structure should be checked with
+            :func:`pringles.models.validate` before launching CD++, defaults to False
+        :type validate: bool, optional
         :raises SimulatorExecutableNotFound: CD++ executable was not found in the provided directory
+        :raises InvalidModelException: The top model is invalid, when validating it
         :return: A SimulationResult, containing all data concerning the simulation results.
         :rtype: SimulationResult
         """
+        # Failures are recorded in the simulation too, for the ones following it, such as
+        # the port streams of a live display
+        simulation.error = None
+        try:
+            return self._run_simulation(simulation, validate)
+        except Exception as error:
+            simulation.error = f"{type(error).__name__}: {error}"
+            raise
+
+    def _run_simulation(self, simulation: Simulation, validate: bool) -> SimulationResult:
+        if validate:
+            validate_model(simulation.top_model)
+        recorder = StageRecorder(simulation, self.stage_hooks)
         logged_messages = 'XY'
         if simulation.override_logged_messages is not None:
             logged_messages = simulation.override_logged_messages
 
-        dumped_top_model_path = self.dump_model_in_file(simulation.top_model,
-                                                        simulation.output_dir)
+        dumped_top_model_path = self._dump_model_in_file_recording(
+            simulation.top_model, simulation.output_dir, recorder)
+
+        events_file_path = None
+        events_writer = None
+        if simulation.events is not None and simulation.events_fifo:
+            events_file_path = Simulator._new_working_file_named(simulation.output_dir, "events")
+            events_writer = EventsFifoWriter(events_file_path, simulation.events,
+                                             simulation.duration, simulation.top_model)
+            events_writer.start()
+        elif simulation.events is not None and self.events_cache is not None:
+            with recorder.stage(WRITE_EVENTS_STAGE) as stage:
+                stored_path, written = self.events_cache.store(
+                    simulation.events, simulation.duration, simulation.top_model)
+                events_file_path = self.events_cache.link_into(stored_path,
+                                                               simulation.output_dir)
+                stage.bytes_out = files_size([stored_path]) if written else 0
+        elif simulation.events is not None:
+            with recorder.stage(WRITE_EVENTS_STAGE) as stage:
+                events_file_path = self.dump_events_in_file(simulation.events,
+                                                            simulation.output_dir,
+                                                            simulation.duration,
+                                                            simulation.top_model)
+                stage.bytes_out = files_size([events_file_path])
+
+        try:
+            result = self._run_dumped_model(recorder, simulation.output_dir,
+                                            dumped_top_model_path, events_file_path,
+                                            simulation.duration, logged_messages,
+                                            simulation.use_simulator_logs,
+                                            simulation.use_simulator_out)
+        finally:
+            if events_writer is not None:
+                events_writer.finish()
+        with recorder.stage(PICKLE_STAGE) as stage:
+            simulation.result = result
+            stage.bytes_out = files_size([os.path.join(simulation.output_dir,
+                                                       Simulation.DEFAULT_PICKLEFILE_NAME)])
+        if self.result_store is not None:
+            self.result_store.append(simulation)
+        return simulation.result
+
+    def _run_dumped_model(self, recorder: StageRecorder, output_dir: str, model_path: str,
+                          events_path: Optional[str], duration: Optional[VirtualTime],
+                          logged_messages: str, use_logs: bool,
+                          use_out: bool) -> SimulationResult:
+        """Runs CD++ over a model and events already written into the output dir."""
         commands_list = [self.executable_route,
-                         "-m" + dumped_top_model_path,
+                         "-m" + model_path,
                          "-L" + logged_messages]
-        if simulation.duration is not None:
-            commands_list.append("-t" + str(simulation.duration))
-
-        if simulation.events is not None:
-            events_list = simulation.events
-            events_file_path = self.dump_events_in_file(events_list, simulation.output_dir)
-            commands_list.append("-e" + events_file_path)
+        if duration is not None:
+            commands_list.append("-t" + str(duration))
+        if events_path is not None:
+            commands_list.append("-e" + events_path)
 
         # Simulation logs
-        if simulation.use_simulator_logs:
-            logs_path = Simulator._new_working_file_named(simulation.output_dir, "logs")
+        logs_path = None
+        if use_logs:
+            logs_path = Simulator._new_working_file_named(output_dir, "logs")
             commands_list.append("-l" + logs_path)
 
         # Simulation output file
-        if simulation.use_simulator_out:
-            output_path = Simulator._new_working_file_named(simulation.output_dir, "output")
+        output_path = None
+        if use_out:
+            output_path = Simulator._new_working_file_named(output_dir, "output")
             commands_list.append("-o" + output_path)
 
-        process_result = subprocess.run(commands_list, capture_output=True, check=True)
+        with recorder.stage(SIMULATOR_PROCESS_STAGE) as stage:
+            process_result, recorder.timings.process_usage = run_process(commands_list)
+            stage.bytes_in = files_size([model_path, events_path])
+            produced_files = [output_path] + (log_files(logs_path) if logs_path else [])
+            stage.bytes_out = files_size(produced_files)
         logging.debug("Results: %s", process_result.stdout)
         logging.debug("Logs path: %s", logs_path)
         logging.debug("Output path: %s", output_path)
 
-        simulation.result = SimulationResult(process_result=process_result,
-                                             main_log_path=logs_path,
-                                             output_path=output_path)
-        return simulation.result
+        return SimulationResult(process_result=process_result,
+                                main_log_path=logs_path,
+                                output_path=output_path,
+                                stage_recorder=recorder)
+
+    @classmethod
+    def _dump_model_in_file_recording(cls, model: Model, custom_wd: str,
+                                      recorder: StageRecorder) -> str:
+        with recorder.stage(SERIALIZE_MODEL_STAGE) as stage:
+            model_source = MaSerializer.serialize(model)
+            stage.bytes_out = len(model_source)
+        with recorder.stage(WRITE_MODEL_STAGE) as stage:
+            path = cls._dump_model_source_in_file(model_source, custom_wd)
+            stage.bytes_out = files_size([path])
+        return path
+
+    @contextmanager
+    def profiling(self) -> Iterator[StageProfiler]:
+        """Profiles with cProfile each stage of the simulations run inside the context, dumping
+        the stats into each simulation output dir. The yielded profiler summarizes the
+        hotspots of all of them::
+
+            with simulator.profiling() as profiler:
+                for simulation in simulations:
+                    simulator.run_simulation(simulation)
+            profiler.summary(top=10)
+
+        :return: The profiler hook, active while inside the context
+        :rtype: Iterator[StageProfiler]
+        """
+        profiler = StageProfiler()
+        self.stage_hooks.append(profiler)
+        try:
+            yield profiler
+        finally:
+            self.stage_hooks.remove(profiler)
 
     def get_registry(self) -> AtomicRegistry:
         return self.atomic_registry
 
     @staticmethod
-    def dump_events_in_file(events: List[Event], simulation_wd: str) -> str:
+    def dump_events_in_file(events: EventsSource, simulation_wd: str,
+                            duration: Optional[VirtualTime] = None,
+                            top_model: Optional[Model] = None) -> str:
         path = Simulator._new_working_file_named(simulation_wd, "events")
         with open(path, "w") as events_file:
-            for event in events:
-                events_file.write(event.serialize() + "\n")
+            write_events(events, events_file, duration, top_model)
 
         return path
 
@@ -88,9 +204,13 @@ class Simulator:
 
     @staticmethod
     def dump_model_in_file(model: Model, custom_wd: str) -> str:
+        return Simulator._dump_model_source_in_file(MaSerializer.serialize(model), custom_wd)
+
+    @staticmethod
+    def _dump_model_source_in_file(model_source: str, custom_wd: str) -> str:
         path = Simulator._new_working_file_named(custom_wd, "top_model")
         with open(path, "w") as model_file:
-            model_file.write(MaSerializer.serialize(model))
+            model_file.write(model_source)
 
         return path
 
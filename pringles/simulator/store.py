@@ -0,0 +1,243 @@
+from __future__ import annotations
+
+import os
+import sqlite3
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Optional, List, Set, Any, Iterator, Tuple, Sequence, cast, TYPE_CHECKING
+
+from pringles.simulator.simulation import Simulation, SimulationResult
+from pringles.simulator.errors import InvalidRunParameterException
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+
+class ResultStore:
+    """A SQLite backed store in which the outputs of many simulations are appended, each run
+    tagged with the :attr:`Simulation.params` it was run with. Runs can then be compared
+    with queries over the whole store, without unpickling each simulation.
+
+    Run parameters are stored as columns of the ``runs`` table, so the ``where`` clauses of the
+    queries can refer to them by name, as in ``store.final_values("out", where="rate > 3")``.
+    """
+
+    RUN_ID_COL = 'run_id'
+    OUTPUT_DIR_COL = 'output_dir'
+    CREATED_AT_COL = 'created_at'
+    SUCCESSFUL_COL = 'successful'
+    RUN_KEY_COL = 'run_key'
+    INDEX_COL = 'idx'
+    RESERVED_COLS = [RUN_ID_COL, OUTPUT_DIR_COL, CREATED_AT_COL, SUCCESSFUL_COL, RUN_KEY_COL]
+
+    def __init__(self, path: str):
+        """
+        :param path: Path of the store database file, which is created if it doesn't exist
+        :type path: str
+        """
+        self.path = path
+        with self._connect() as connection:
+            connection.executescript(f"""
+                CREATE TABLE IF NOT EXISTS runs (
+                    {self.RUN_ID_COL} INTEGER PRIMARY KEY AUTOINCREMENT,
+                    {self.OUTPUT_DIR_COL} TEXT,
+                    {self.CREATED_AT_COL} TEXT,
+                    {self.SUCCESSFUL_COL} INTEGER,
+                    {self.RUN_KEY_COL} TEXT
+                );
+                CREATE TABLE IF NOT EXISTS outputs (
+                    {self.RUN_ID_COL} INTEGER REFERENCES runs({self.RUN_ID_COL}),
+                    {SimulationResult.TIME_COL} REAL,
+                    {SimulationResult.PORT_COL} TEXT,
+                    {self.INDEX_COL} INTEGER,
+                    {SimulationResult.VALUE_COL} REAL
+                );
+                CREATE INDEX IF NOT EXISTS outputs_by_port ON outputs (
+                    {SimulationResult.PORT_COL}, {self.INDEX_COL}, {self.RUN_ID_COL}
+                );
+            """)
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        # A connection per operation keeps the store usable from many threads and processes
+        connection = sqlite3.connect(self.path, timeout=60)
+        try:
+            with connection:  # Commits, or rolls back on error
+                yield connection
+        finally:
+            connection.close()
+
+    def _param_columns(self, connection: sqlite3.Connection) -> List[str]:
+        columns = [row[1] for row in connection.execute("PRAGMA table_info(runs)")]
+        reserved_columns = {column.lower() for column in self.RESERVED_COLS}
+        return [column for column in columns if column.lower() not in reserved_columns]
+
+    def _add_param_columns(self, connection: sqlite3.Connection, names: Sequence[str]) -> None:
+        # SQLite column names are case insensitive, so they are compared lower cased
+        existing_columns = {column.lower() for column in self._param_columns(connection)}
+        reserved_columns = {column.lower() for column in self.RESERVED_COLS}
+        run_columns: Set[str] = set()
+        for name in names:
+            column = name.lower()
+            if not name.isidentifier() or column in reserved_columns or column in run_columns:
+                raise InvalidRunParameterException(name)
+            run_columns.add(column)
+            if column not in existing_columns:
+                connection.execute(f'ALTER TABLE runs ADD COLUMN "{name}"')
+
+    @staticmethod
+    def _output_rows(run_id: int, output_df: pd.DataFrame) -> Iterator[Tuple]:
+        import numpy as np
+        times = (float(time) for time in output_df[SimulationResult.TIME_COL])
+        for time, port, value in zip(times,
+                                     output_df[SimulationResult.PORT_COL],
+                                     output_df[SimulationResult.VALUE_COL]):
+            if isinstance(value, (tuple, np.ndarray)):
+                for index, element in enumerate(value):
+                    yield (run_id, time, port, index, float(element))
+            else:
+                yield (run_id, time, port, 0, float(value))
+
+    def append(self, simulation: Simulation, run_key: Optional[str] = None) -> int:
+        """Appends an executed simulation outputs to the store, tagged with its parameters.
+
+        :param simulation: An executed simulation
+        :type simulation: Simulation
+        :param run_key: Identifies the run among the ones of a batch, so the completed ones
+            can be skipped when the batch is resumed. A run stored before with the same key
+            is replaced. Defaults to None
+        :type run_key: Optional[str], optional
+        :raises InvalidRunParameterException: A parameter name isn't a valid identifier, or
+            clashes with the store own columns or another parameter, ignoring case
+        :return: The id of the stored run
+        :rtype: int
+        """
+        result = simulation.result
+        params = simulation.params or {}
+        columns = [self.OUTPUT_DIR_COL, self.CREATED_AT_COL, self.SUCCESSFUL_COL,
+                   self.RUN_KEY_COL] + [f'"{name}"' for name in params]
+        values = [simulation.output_dir,
+                  datetime.now().isoformat(),
+                  None if result is None or result.process_result is None
+                  else int(result.successful()),
+                  run_key] + list(params.values())
+        with self._connect() as connection:
+            # Takes the write lock before looking at the columns, so concurrent writers
+            # don't both add the same one
+            connection.execute("BEGIN IMMEDIATE")
+            self._add_param_columns(connection, list(params))
+            if run_key is not None:
+                self._delete_runs_keyed(connection, run_key)
+            cursor = connection.execute(
+                f"INSERT INTO runs ({', '.join(columns)}) "
+                f"VALUES ({', '.join('?' * len(values))})", values)
+            run_id = cast(int, cursor.lastrowid)
+            if result is not None and getattr(result, 'output_df', None) is not None:
+                connection.executemany("INSERT INTO outputs VALUES (?, ?, ?, ?, ?)",
+                                       self._output_rows(run_id, result.output_df))
+        return run_id
+
+    def _delete_runs_keyed(self, connection: sqlite3.Connection, run_key: str) -> None:
+        run_ids = f"SELECT {self.RUN_ID_COL} FROM runs WHERE {self.RUN_KEY_COL} = ?"
+        connection.execute(f"DELETE FROM outputs WHERE {self.RUN_ID_COL} IN ({run_ids})",
+                           (run_key,))
+        connection.execute(f"DELETE FROM runs WHERE {self.RUN_KEY_COL} = ?", (run_key,))
+
+    @staticmethod
+    def _where_clause(where: Optional[str]) -> str:
+        return f" AND ({where})" if where else ""
+
+    def runs(self, where: Optional[str] = None,
+             where_args: Sequence[Any] = ()) -> pd.DataFrame:
+        """Returns the stored runs, with a column per parameter.
+
+        :param where: SQL condition over the run columns, defaults to None (every run)
+        :type where: Optional[str], optional
+        :param where_args: Values bound to the ``?`` placeholders of the condition
+        :type where_args: Sequence[Any], optional
+        :return: The matching runs
+        :rtype: pd.DataFrame
+        """
+        import pandas as pd
+        with self._connect() as connection:
+            return pd.read_sql_query(
+                f"SELECT * FROM runs WHERE 1 = 1{self._where_clause(where)}",
+                connection, params=list(where_args))
+
+    def port_values(self, port: str, index: int = 0, where: Optional[str] = None,
+                    where_args: Sequence[Any] = ()) -> pd.DataFrame:
+        """Returns every value a top model port emitted, in every matching run.
+
+        :param port: The name of the output port
+        :type port: str
+        :param index: The element to return when the port values are vectors, defaults to 0
+        :type index: int, optional
+        :param where: SQL condition over the run columns, defaults to None (every run)
+        :type where: Optional[str], optional
+        :param where_args: Values bound to the ``?`` placeholders of the condition
+        :type where_args: Sequence[Any], optional
+        :return: The runs columns, plus the time (as a number) and value of each output
+        :rtype: pd.DataFrame
+        """
+        import pandas as pd
+        with self._connect() as connection:
+            return pd.read_sql_query(
+                f"SELECT runs.*, outputs.{SimulationResult.TIME_COL}, "
+                f"outputs.{SimulationResult.VALUE_COL} "
+                f"FROM runs JOIN outputs USING ({self.RUN_ID_COL}) "
+                f"WHERE outputs.{SimulationResult.PORT_COL} = ? "
+                f"AND outputs.{self.INDEX_COL} = ?{self._where_clause(where)} "
+                f"ORDER BY outputs.rowid",
+                connection, params=[port, index] + list(where_args))
+
+    def final_values(self, port: str, index: int = 0, where: Optional[str] = None,
+                     where_args: Sequence[Any] = ()) -> pd.DataFrame:
+        """Returns the last value a top model port emitted in each matching run.
+        See :meth:`port_values` for the parameters.
+
+        :return: The runs columns, plus the time (as a number) and value of the last output
+        :rtype: pd.DataFrame
+        """
+        import pandas as pd
+        with self._connect() as connection:
+            # Outputs are inserted in time order, so the last one of a run has the highest rowid
+            return pd.read_sql_query(
+                f"SELECT runs.*, last.{SimulationResult.TIME_COL}, "
+                f"last.{SimulationResult.VALUE_COL} FROM runs JOIN ("
+                f"  SELECT {self.RUN_ID_COL}, {SimulationResult.TIME_COL}, "
+                f"  {SimulationResult.VALUE_COL}, MAX(rowid) FROM outputs "
+                f"  WHERE {SimulationResult.PORT_COL} = ? AND {self.INDEX_COL} = ? "
+                f"  GROUP BY {self.RUN_ID_COL}"
+                f") AS last USING ({self.RUN_ID_COL}) "
+                f"WHERE 1 = 1{self._where_clause(where)} ORDER BY {self.RUN_ID_COL}",
+                connection, params=[port, index] + list(where_args))
+
+    def load_simulation(self, run_id: int) -> Simulation:
+        """Unpickles the full simulation of a stored run, from its output directory.
+
+        :param run_id: The id of the stored run
+        :type run_id: int
+        :return: The simulation
+        :rtype: Simulation
+        """
+        with self._connect() as connection:
+            output_dir, = connection.execute(
+                f"SELECT {self.OUTPUT_DIR_COL} FROM runs WHERE {self.RUN_ID_COL} = ?",
+                (run_id,)).fetchone()
+        return Simulation.read_pickle(os.path.join(output_dir,
+                                                   Simulation.DEFAULT_PICKLEFILE_NAME))
+
+    def run_keys(self) -> Set[str]:
+        """Returns the keys of every stored run that was appended with one."""
+        with self._connect() as connection:
+            return {row[0] for row in connection.execute(
+                f"SELECT {self.RUN_KEY_COL} FROM runs WHERE {self.RUN_KEY_COL} IS NOT NULL")}
+
+    def params(self) -> List[str]:
+        """Returns the names of every parameter runs were tagged with."""
+        with self._connect() as connection:
+            return self._param_columns(connection)
+
+    def __len__(self) -> int:
+        with self._connect() as connection:
+            return connection.execute("SELECT COUNT(*) FROM runs").fetchone()[0]
@@ -1,4 +1,22 @@
+import importlib
+
 from .vtime import VirtualTime  # noqa: F401
-from .discovery import AtomicMetadataExtractor, AtomicMetadata  # noqa: F401
 from .errors import MetadataParsingException  # noqa: F401
-from .plotting import new_vtime_aware_axes, vtime_decorate  # noqa: F401
+
+# Metadata discovery, plotting and decimation pull pyparsing, matplotlib and numpy, so their
+# modules are only imported when one of their names is first accessed
+_LAZY_ATTRIBUTES = {
+    'AtomicMetadataExtractor': '.discovery',
+    'AtomicMetadata': '.discovery',
+    'new_vtime_aware_axes': '.plotting',
+    'vtime_decorate': '.plotting',
+    'decimate_minmax': '.decimation',
+}
+
+__all__ = ['VirtualTime', 'MetadataParsingException'] + list(_LAZY_ATTRIBUTES)
+
+
+def __getattr__(name):
+    if name in _LAZY_ATTRIBUTES:
+        return getattr(importlib.import_module(_LAZY_ATTRIBUTES[name], __name__), name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,30 @@
+from typing import Tuple
+import numpy as np
+
+
+def decimate_minmax(x_values: np.ndarray, y_values: np.ndarray,
+                    buckets: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Reduces a series sorted by X to at most four points per bucket. The X range is split
+    in ``buckets`` equally wide intervals, and for each one the first, last, minimum and maximum
+    samples are kept, in their original order. Keeping the interval bounds preserves the
+    shape of piecewise constant signals, and the extremes keep every spike visible.
+
+    :param x_values: The X coordinates, in ascending order
+    :type x_values: np.ndarray
+    :param y_values: The Y coordinates
+    :type y_values: np.ndarray
+    :param buckets: Amount of intervals to split the X range in, usually the plot width in pixels
+    :type buckets: int
+    :return: The decimated X and Y coordinates
+    :rtype: Tuple[np.ndarray, np.ndarray]
+    """
+    if buckets <= 0 or len(x_values) <= 4 * buckets:
+        return x_values, y_values
+    edges = np.linspace(x_values[0], x_values[-1], buckets + 1)
+    bucket_ids = np.clip(np.searchsorted(edges, x_values, side='right') - 1, 0, buckets - 1)
+    starts = np.flatnonzero(np.diff(bucket_ids, prepend=-1))
+    ends = np.append(starts[1:], len(bucket_ids)) - 1
+    # Sorting by bucket and then by value leaves each bucket min first and max last
+    by_value = np.lexsort((y_values, bucket_ids))
+    kept = np.unique(np.concatenate([starts, ends, by_value[starts], by_value[ends]]))
+    return x_values[kept], y_values[kept]
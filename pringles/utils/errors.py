@@ -9,3 +9,7 @@ class MetadataParsingException(Exception):
 
 class NonExistingAtomicClassException(Exception):
     pass
+
+
+class MaParsingException(Exception):
+    pass
@@ -3,6 +3,7 @@ from matplotlib.axes import Axes  # pylint: disable=E0401
 from matplotlib.ticker import FuncFormatter  # pylint: disable=E0401
 from typing import Any
 from .vtime import VirtualTime
+from .decimation import decimate_minmax  # noqa: F401
 
 
 def __vtime_formatter(x: Any, pos: Any):
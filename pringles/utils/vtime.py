@@ -1,7 +1,86 @@
 from __future__ import annotations
-from typing import Optional, Any, cast
+from typing import Optional, Any, Dict, List, Iterable, Tuple, TYPE_CHECKING, cast
 from pringles.utils.errors import BadVirtualTimeValuesError
 
+if TYPE_CHECKING:
+    import numpy as np
+
+DEFAULT_INTERN_CACHE_SIZE = 1 << 16
+
+PARSE_CHUNK_SIZE = 1 << 16  # Bounds the memory of the character arrays of a parse
+
+VECTORIZED_PARSE_MIN_SIZE = 64  # Below it, parsing each time is faster than numpy
+
+_TWO_DIGITS = {f"{number:02d}": number for number in range(100)}
+_THREE_DIGITS = {f"{number:03d}": number for number in range(1000)}
+
+# Positions of the digits and separators in the ``HH:MM:SS:mmm:r`` layout
+_DIGIT_POSITIONS = [0, 1, 3, 4, 6, 7, 9, 10, 11]
+_SEPARATOR_POSITIONS = [2, 5, 8]
+_REMAINDER_SEPARATOR = 12
+_REMAINDER_DIGIT = 13
+_LAYOUT_WIDTH = 14
+
+
+def _fixed_layout_fields(timestrs: List[str]) -> Optional[Tuple[np.ndarray, ...]]:
+    """Extracts the fields of the times in the ``HH:MM:SS:mmm`` or ``HH:MM:SS:mmm:r`` layout
+    from the code points of their characters, all at once.
+
+    :return: Whether each time has one of those layouts, and the hours, minutes, seconds,
+        milliseconds and remainders of the ones that do, or None if none does or there are
+        too few times for it to be worth it
+    """
+    if len(timestrs) < VECTORIZED_PARSE_MIN_SIZE:
+        return None
+    import numpy as np
+    characters = _characters(timestrs)
+    if characters is None:
+        return None
+    if characters.shape[1] < _LAYOUT_WIDTH:
+        characters = np.pad(characters, ((0, 0), (0, _LAYOUT_WIDTH - characters.shape[1])))
+    digits = characters[:, _DIGIT_POSITIONS].astype(np.int64) - ord('0')
+    remainders = characters[:, _REMAINDER_DIGIT].astype(np.int64) - ord('0')
+    has_remainder = characters[:, _REMAINDER_SEPARATOR] == ord(':')
+    without_remainder = (characters[:, _REMAINDER_SEPARATOR] == 0) & \
+        (characters[:, _REMAINDER_DIGIT] == 0)
+    matched = ((characters[:, _SEPARATOR_POSITIONS] == ord(':')).all(axis=1) &
+               ((digits >= 0) & (digits <= 9)).all(axis=1) &
+               (has_remainder & (remainders >= 0) & (remainders <= 9) | without_remainder) &
+               (characters[:, _LAYOUT_WIDTH:] == 0).all(axis=1))
+    if not matched.any():
+        return None
+    digits = digits[matched]
+    return (matched,
+            digits[:, 0] * 10 + digits[:, 1],
+            digits[:, 2] * 10 + digits[:, 3],
+            digits[:, 4] * 10 + digits[:, 5],
+            digits[:, 6] * 100 + digits[:, 7] * 10 + digits[:, 8],
+            np.where(has_remainder, remainders, 0)[matched].astype(float))
+
+
+def _characters(timestrs: List[str]) -> Optional[np.ndarray]:
+    """Returns the code points of the characters of many strings, a row for each string.
+    Shorter strings are padded with zeros."""
+    import numpy as np
+    lengths = set(map(len, timestrs))
+    joined = ''.join(timestrs)
+    if len(lengths) == 1 and joined.isascii():
+        # The usual case: a single buffer of bytes, sliced in rows of the same length
+        characters = np.frombuffer(joined.encode('ascii'), dtype=np.uint8)
+        return characters.reshape(len(timestrs), lengths.pop())
+    strings = np.array(timestrs)
+    if strings.dtype.kind != 'U':
+        return None
+    return strings.view(np.uint32).reshape(len(strings), strings.dtype.itemsize // 4)
+
+
+def _check_units(minutes: np.ndarray, seconds: np.ndarray) -> None:
+    """Checks the units of many times, as the constructor does."""
+    if (minutes > 60).any():
+        raise BadVirtualTimeValuesError(f"Minutes should be less that 60, but is {minutes.max()}")
+    if (seconds > 60).any():
+        raise BadVirtualTimeValuesError(f"Seconds should be less that 60, but is {seconds.max()}")
+
 
 class VirtualTime:
     def __init__(self, hours: int, minutes: int, seconds: int, milliseconds: int, remainder: float):
@@ -37,11 +116,128 @@ class VirtualTime:
 
     @classmethod
     def parse(cls, timestr: str) -> VirtualTime:
+        """Parses a time in the ``HH:MM:SS:mmm[:r]`` layout of CD++ files.
+
+        :param timestr: The time string, whose remainder field is optional
+        :type timestr: str
+        :return: The parsed time
+        :rtype: VirtualTime
+        """
+        # The fixed width fields of the usual layout are sliced and looked up, instead of
+        # splitted and converted, which is most of the parsing time
+        try:
+            if timestr[2] == ':' and timestr[5] == ':' and timestr[8] == ':':
+                remainder = timestr[13:]
+                if len(timestr) == 12 or timestr[12] == ':' and remainder:
+                    return cls(_TWO_DIGITS[timestr[0:2]], _TWO_DIGITS[timestr[3:5]],
+                               _TWO_DIGITS[timestr[6:8]], _THREE_DIGITS[timestr[9:12]],
+                               0. if remainder in ('', '0') else float(remainder))
+        except (IndexError, KeyError):
+            pass
+        return cls._parse_splitting(timestr)  # Other layouts, such as hours over 99
+
+    @classmethod
+    def _parse_splitting(cls, timestr: str) -> VirtualTime:
         splitted_timestr = timestr.split(':')
+        if len(splitted_timestr) == 4:
+            splitted_timestr.append('0')  # The remainder is optional
         return cls(*([int(unit) for unit in
                       splitted_timestr[:-1]] +
                      [float(splitted_timestr[-1])]))  # type: ignore
 
+    @classmethod
+    def parse_many(cls, timestrs: Iterable[str], intern: bool = False,
+                   cache_size: int = DEFAULT_INTERN_CACHE_SIZE) -> List[VirtualTime]:
+        """Parses many times, such as a column of a simulator log. The fields of the times in
+        the usual ``HH:MM:SS:mmm[:r]`` layout are extracted from all of them at once, a chunk
+        at a time, and only the times in other layouts are parsed one by one.
+
+        :param timestrs: The time strings, as a sequence or an array
+        :type timestrs: Iterable[str]
+        :param intern: True if equal strings should share a single parsed time, defaults to
+            False. Shared times are the same object, so modifying one modifies all of them.
+        :type intern: bool, optional
+        :param cache_size: Bound of the distinct times kept for sharing, defaults to 65536
+        :type cache_size: int, optional
+        :raises ValueError: The cache size is less than 1
+        :return: The parsed times, in the same order
+        :rtype: List[VirtualTime]
+        """
+        if cache_size < 1:
+            raise ValueError(f"The intern cache size should be at least 1, but is {cache_size}")
+        timestrs_list = cls._as_list(timestrs)
+        if intern:
+            return cls._parse_interned(timestrs_list, cache_size)
+        times: List[VirtualTime] = []
+        for start in range(0, len(timestrs_list), PARSE_CHUNK_SIZE):
+            times.extend(cls._parse_chunk(timestrs_list[start:start + PARSE_CHUNK_SIZE]))
+        return times
+
+    @classmethod
+    def parse_numbers(cls, timestrs: Iterable[str]) -> np.ndarray:
+        """Parses many times into the numbers they are plotted as (see :meth:`__float__`),
+        without building a VirtualTime for each of them when they have the usual layout.
+
+        :param timestrs: The time strings, as a sequence or an array
+        :type timestrs: Iterable[str]
+        :return: The times as numbers, in the same order
+        :rtype: np.ndarray
+        """
+        import numpy as np
+        timestrs_list = cls._as_list(timestrs)
+        numbers = np.empty(len(timestrs_list), dtype=float)
+        for start in range(0, len(timestrs_list), PARSE_CHUNK_SIZE):
+            chunk = timestrs_list[start:start + PARSE_CHUNK_SIZE]
+            fields = _fixed_layout_fields(chunk)
+            chunk_numbers = numbers[start:start + len(chunk)]
+            if fields is None:
+                chunk_numbers[:] = [float(cls.parse(timestr)) for timestr in chunk]
+                continue
+            matched, hours, minutes, seconds, milliseconds, remainders = fields
+            _check_units(minutes, seconds)
+            chunk_numbers[matched] = (remainders + 10 * milliseconds + 10 * 1000 * seconds +
+                                      10 * 1000 * 60 * minutes + 10 * 1000 * 60 * 60 * hours)
+            for position in np.flatnonzero(~matched).tolist():
+                chunk_numbers[position] = float(cls.parse(chunk[position]))
+        return numbers
+
+    @staticmethod
+    def _as_list(timestrs: Iterable[str]) -> List[str]:
+        if hasattr(timestrs, 'tolist'):
+            return timestrs.tolist()  # type: ignore
+        return list(timestrs)
+
+    @classmethod
+    def _parse_chunk(cls, timestrs: List[str]) -> List[VirtualTime]:
+        fields = _fixed_layout_fields(timestrs)
+        if fields is None:
+            return [cls.parse(timestr) for timestr in timestrs]
+        matched, hours, minutes, seconds, milliseconds, remainders = fields
+        # The constructor is mapped over the fields, so no Python code runs for each time
+        times = list(map(cls, hours.tolist(), minutes.tolist(), seconds.tolist(),
+                         milliseconds.tolist(), remainders.tolist()))
+        if len(times) == len(timestrs):
+            return times
+        matched_times = iter(times)
+        return [next(matched_times) if is_matched else cls.parse(timestr)
+                for timestr, is_matched in zip(timestrs, matched.tolist())]
+
+    @classmethod
+    def _parse_interned(cls, timestrs: List[str], cache_size: int) -> List[VirtualTime]:
+        cache: Dict[str, VirtualTime] = {}
+        times: List[VirtualTime] = []
+        # Times are looked up a chunk at a time, so only the distinct strings of each chunk are
+        # visited in Python, while the rest of the work is done by dict and map builtins
+        for start in range(0, len(timestrs), cache_size):
+            chunk = timestrs[start:start + cache_size]
+            distinct_timestrs = dict.fromkeys(chunk)
+            if len(cache) + len(distinct_timestrs) > cache_size:
+                cache = {}
+            missing_timestrs = [timestr for timestr in distinct_timestrs if timestr not in cache]
+            cache.update(zip(missing_timestrs, cls._parse_chunk(missing_timestrs)))
+            times.extend(map(cache.__getitem__, chunk))
+        return times
+
     @classmethod
     def from_number(cls, num: int) -> Optional[VirtualTime]:
         # NOTE: This conversion completely ignores the remainder VirtualTime field
@@ -24,4 +24,7 @@ setuptools.setup(
     ],
     install_requires=dependencies,
     include_package_data=True,
+    entry_points={
+        'console_scripts': ['pringles=pringles.cli:main'],
+    },
 )
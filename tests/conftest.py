@@ -1,11 +1,14 @@
 import os
-from typing import List, Tuple
+from typing import Callable, List, Tuple
 import pytest  # noqa
 from pringles.utils import VirtualTime
 from pringles.models import Coupled, Model, AtomicModelBuilder
 from pringles.simulator import Event, Simulator
 
 CDPP_BIN_PATH = os.path.join(os.path.dirname(__file__), '../cdpp/src/bin/')
+FAKE_CDPP_BIN_PATH = os.path.join(os.path.dirname(__file__), '../benchmarks/fake_cdpp/')
+
+Relay = AtomicModelBuilder().with_name("Relay").build()
 
 @pytest.fixture
 def empty_coupled() -> Model:
@@ -15,6 +18,11 @@ def empty_coupled() -> Model:
 def a_simulator() -> Simulator:
     return Simulator(CDPP_BIN_PATH)
 
+@pytest.fixture(scope='function')
+def a_fake_simulator() -> Simulator:
+    """A simulator running the CD++ stand-in used by the benchmarks"""
+    return Simulator(FAKE_CDPP_BIN_PATH, autodiscover=False)
+
 @pytest.fixture(scope='function')
 def queue_top_model_with_events() -> Tuple[Model, List[Event]]:
     Queue = AtomicModelBuilder().with_name("Queue").build()
@@ -39,3 +47,10 @@ def queue_top_model_with_events() -> Tuple[Model, List[Event]]:
     # Teardown code
     import pringles.models.models as models_module
     del models_module.Queue
+
+@pytest.fixture
+def a_relay() -> Callable[..., Model]:
+    """Builds atomics with an in and an out port, to lay out model hierarchies"""
+    def a_relay(name: str, **params) -> Model:
+        return Relay(name, **params).add_inport("in").add_outport("out")
+    return a_relay
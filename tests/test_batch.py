@@ -0,0 +1,250 @@
+import pytest
+import os
+import json
+import tempfile
+from pringles.cli import main
+from pringles.simulator import ResultStore
+from pringles.simulator.batch import (Manifest, BatchRunner, load_factory, _init_worker,
+                                      _execute_run, _build_simulation, _worker_state)
+from pringles.simulator.journal import RunJournal, STARTED, COMPLETED, FAILED
+from pringles.simulator.errors import ManifestException
+from pringles.serializers import MaParser
+
+FAKE_CDPP_BIN_PATH = os.path.join(os.path.dirname(__file__), '../benchmarks/fake_cdpp/')
+
+FACTORY_SOURCE = """
+from pringles.models import Coupled, AtomicModelBuilder
+
+
+def build_top(registry, preparation, capacity):
+    BatchQueue = AtomicModelBuilder().with_name("BatchQueue").build()
+    queue = BatchQueue("queue", preparation=preparation, capacity=capacity)
+    queue.add_inport("in").add_outport("out")
+    return Coupled("top", [queue])\\
+        .add_inport("incoming")\\
+        .add_outport("emitted")\\
+        .add_coupling("incoming", queue.get_port("in"))\\
+        .add_coupling(queue.get_port("out"), "emitted")
+"""
+
+
+@pytest.fixture
+def a_manifest_path() -> str:
+    manifest_dir = tempfile.mkdtemp()
+    with open(os.path.join(manifest_dir, "models.py"), "w") as factory_file:
+        factory_file.write(FACTORY_SOURCE)
+    manifest = {
+        "cdpp_bin_path": os.path.abspath(FAKE_CDPP_BIN_PATH),
+        "jobs": [{
+            "name": "queues",
+            "model": "models.py:build_top",
+            "duration": "00:01:00:000",
+            "events": [["00:00:10:000", "incoming", 1.5]],
+            "params": {"preparation": "0:0:5:0"},
+            "sweep": {"capacity": [1, 2, 4]}
+        }]
+    }
+    manifest_path = os.path.join(manifest_dir, "manifest.json")
+    with open(manifest_path, "w") as manifest_file:
+        json.dump(manifest, manifest_file)
+    return manifest_path
+
+
+def test_manifest_sweeps_every_combination(a_manifest_path):
+    manifest = Manifest.load(a_manifest_path)
+    assert [run.params["capacity"] for run in manifest.runs()] == [1, 2, 4]
+    assert all(run.params["preparation"] == "0:0:5:0" for run in manifest.runs())
+    assert manifest.store == os.path.join(os.path.dirname(a_manifest_path), "results.sqlite")
+
+
+def test_manifest_without_jobs_is_rejected():
+    with pytest.raises(ManifestException):
+        Manifest.from_dict({"cdpp_bin_path": "bin", "jobs": []}, ".")
+
+
+@pytest.mark.parametrize("file_name,content", [
+    ("manifest.yaml", "jobs: [unclosed"),
+    ("manifest.json", json.dumps({"cdpp_bin_path": "bin", "parallelism": "many",
+                                  "jobs": [{"name": "job", "model": "models.py:build"}]})),
+    ("manifest.json", json.dumps({"cdpp_bin_path": "bin", "max_attempts": None,
+                                  "jobs": [{"name": "job", "model": "models.py:build"}]})),
+])
+def test_malformed_manifests_are_reported(file_name, content, capsys):
+    manifest_path = os.path.join(tempfile.mkdtemp(), file_name)
+    with open(manifest_path, "w") as manifest_file:
+        manifest_file.write(content)
+    with pytest.raises(ManifestException):
+        Manifest.load(manifest_path)
+    assert main(["run", manifest_path]) == 2
+    assert "Invalid manifest" in capsys.readouterr().err
+
+
+@pytest.mark.parametrize("parallelism", ["1", "2"])
+def test_cli_runs_manifest_into_the_store(a_manifest_path, parallelism):
+    assert main(["run", a_manifest_path, "--parallelism", parallelism]) == 0
+    store = ResultStore(Manifest.load(a_manifest_path).store)
+    assert sorted(store.runs()["capacity"]) == [1, 2, 4]
+    assert len(store.final_values("emitted")) == 3
+
+
+def test_cli_resume_skips_completed_runs(a_manifest_path):
+    assert main(["run", a_manifest_path]) == 0
+    assert main(["run", a_manifest_path]) == 0
+    store = ResultStore(Manifest.load(a_manifest_path).store)
+    assert len(store) == 3
+    assert main(["run", a_manifest_path, "--no-resume"]) == 0
+    assert len(store) == 3  # Runs are replaced, as their ids don't change
+
+
+def test_run_ids_are_derived_from_the_inputs(a_manifest_path):
+    first_ids = [run.run_id for run in Manifest.load(a_manifest_path).runs()]
+    assert first_ids == [run.run_id for run in Manifest.load(a_manifest_path).runs()]
+    assert len(set(first_ids)) == 3
+
+
+def test_run_ids_change_with_the_model_source(a_manifest_path):
+    first_ids = [run.run_id for run in Manifest.load(a_manifest_path).runs()]
+    with open(os.path.join(os.path.dirname(a_manifest_path), "models.py"), "a") as factory_file:
+        factory_file.write("# Edited\n")
+    edited_ids = [run.run_id for run in Manifest.load(a_manifest_path).runs()]
+    assert set(first_ids).isdisjoint(edited_ids)
+
+
+def test_runs_are_journaled_as_started_by_the_worker_executing_them(a_manifest_path):
+    manifest = Manifest.load(a_manifest_path)
+    run = manifest.runs()[0]
+    os.makedirs(manifest.working_dir)
+    _init_worker(manifest)
+    assert RunJournal(manifest.journal).entries == {}
+    assert _execute_run(run, 1) == (None, False)
+    assert RunJournal(manifest.journal).in_flight() == {run.run_id}
+
+
+def test_output_dirs_of_previous_attempts_are_moved_aside(a_manifest_path):
+    manifest = Manifest.load(a_manifest_path)
+    BatchRunner(manifest, progress=None).run()
+    BatchRunner(manifest, progress=None, resume=False).run()
+    output_dirs = os.listdir(manifest.working_dir)
+    for run in manifest.runs():
+        assert run.run_id in output_dirs
+        assert any(name.startswith(run.run_id + "-replaced-") for name in output_dirs)
+
+
+def test_runs_output_dirs_are_named_by_run_id(a_manifest_path):
+    manifest = Manifest.load(a_manifest_path)
+    BatchRunner(manifest, progress=None).run()
+    output_dirs = set(ResultStore(manifest.store).runs()[ResultStore.OUTPUT_DIR_COL])
+    assert output_dirs == {os.path.join(manifest.working_dir, run.run_id)
+                           for run in manifest.runs()}
+
+
+def test_resume_executes_only_the_missing_runs(a_manifest_path):
+    manifest = Manifest.load(a_manifest_path)
+    runs = manifest.runs()
+    os.makedirs(manifest.working_dir)
+    journal = RunJournal(manifest.journal)
+    journal.record(runs[0].run_id, COMPLETED, 1)
+    journal.record(runs[1].run_id, FAILED, 1, "killed", transient=True)
+    # The third run was in flight when the batch died, so only started was journaled
+    pending = BatchRunner(manifest, progress=None).pending_runs()
+    assert [run.run_id for run in pending] == [run.run_id for run in runs[1:]]
+
+
+def test_journal_is_replayed():
+    path = os.path.join(tempfile.mkdtemp(), "journal.jsonl")
+    journal = RunJournal(path)
+    journal.record("a", STARTED, 1)
+    journal.record("a", COMPLETED, 1)
+    journal.record("b", STARTED, 1)
+    with open(path, "a") as journal_file:
+        journal_file.write('{"run_id": "c", "sta')  # Torn by an interruption
+    replayed = RunJournal(path)
+    assert replayed.completed() == {"a"}
+    assert replayed.in_flight() == {"b"}
+
+
+def test_transient_failures_are_retried_up_to_max_attempts(a_manifest_path, monkeypatch):
+    manifest = Manifest.load(a_manifest_path)
+    monkeypatch.setenv("FAKE_CDPP_SIGNAL", "9")
+    errors = BatchRunner(manifest, max_attempts=2, progress=None).run()
+    assert all(error is not None for error in errors.values())
+    journal = RunJournal(manifest.journal)
+    assert journal.failed() == set(errors)
+    assert all(entry.attempt == 2 and entry.transient for entry in journal.entries.values())
+
+
+def test_ma_models_are_run_with_the_sweep_values():
+    manifest_dir = tempfile.mkdtemp()
+    with open(os.path.join(manifest_dir, "queue.ma"), "w") as ma_file:
+        ma_file.write("[top]\n"
+                      "components: queue@MaBatchQueue\n"
+                      "out: emitted\n"
+                      "in: incoming\n"
+                      "link: incoming in@queue\n"
+                      "link: out@queue emitted\n"
+                      "\n"
+                      "[queue]\n"
+                      "preparation: 0:0:5:0\n"
+                      "capacity: 1\n")
+    manifest = Manifest.from_dict({
+        "cdpp_bin_path": os.path.abspath(FAKE_CDPP_BIN_PATH),
+        "jobs": [{
+            "name": "ma_queues",
+            "model": "queue.ma",
+            "events": [["00:00:10:000", "incoming", 1.5]],
+            "sweep": {"capacity": [2, 4]}
+        }]
+    }, manifest_dir)
+
+    capacities = [load_factory(manifest.jobs[0].model)(None, capacity=capacity)
+                  .subcomponents[0].model_params["capacity"] for capacity in (2, 4)]
+    errors = BatchRunner(manifest, progress=None).run()
+
+    assert capacities == ["2", "4"]
+    assert list(errors.values()) == [None, None]
+    assert sorted(ResultStore(manifest.store).runs()["capacity"]) == [2, 4]
+
+
+def test_ma_models_use_the_built_in_atomics_without_user_models_dir():
+    manifest_dir = tempfile.mkdtemp()
+    with open(os.path.join(manifest_dir, "queue.ma"), "w") as ma_file:
+        ma_file.write("[top]\ncomponents: queue@Queue\n\n[queue]\npreparation: 0:0:5:0\n")
+    manifest = Manifest.from_dict({
+        "cdpp_bin_path": os.path.abspath(FAKE_CDPP_BIN_PATH),
+        "jobs": [{"name": "built_in_queue", "model": "queue.ma"}]
+    }, manifest_dir)
+    os.makedirs(manifest.working_dir)
+    _init_worker(manifest)
+
+    run = manifest.runs()[0]
+    simulation = _build_simulation(run, _worker_state['simulator'].get_registry(),
+                                   manifest.working_dir)
+
+    queue = simulation.top_model.subcomponents[0]
+    assert type(queue) is _worker_state['simulator'].get_registry().get_by_name("Queue")
+    assert [port.name for port in queue.inports] == ["in", "done"]
+
+
+def test_ma_models_are_parsed_once(monkeypatch):
+    path = os.path.join(tempfile.mkdtemp(), "queue.ma")
+    with open(path, "w") as ma_file:
+        ma_file.write("[top]\ncomponents: queue@MaOnceQueue\n\n[queue]\ncapacity: 1\n")
+    loads = []
+    load = MaParser.load
+    monkeypatch.setattr(MaParser, "load", lambda *args: loads.append(args) or load(*args))
+    factory = load_factory(path)
+
+    swept = factory(None, capacity=3).subcomponents[0].model_params["capacity"]
+    default = factory(None).subcomponents[0].model_params["capacity"]
+
+    assert (swept, default) == ("3", "1")
+    assert len(loads) == 1
+
+
+def test_ma_model_parameters_must_exist():
+    manifest_dir = tempfile.mkdtemp()
+    path = os.path.join(manifest_dir, "empty.ma")
+    with open(path, "w") as ma_file:
+        ma_file.write("[top]\ncomponents:\n")
+    with pytest.raises(ManifestException):
+        load_factory(path)(None, capacity=2)
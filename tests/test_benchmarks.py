@@ -0,0 +1,45 @@
+import pytest  # noqa
+import importlib.util
+import os
+import sys
+import tempfile
+from pringles.simulator import Simulation, ResultStore, SimulationResult
+
+BENCHMARKS_PATH = os.path.join(os.path.dirname(__file__), '../benchmarks/')
+
+
+def test_fake_cdpp_simulation_is_parsed(a_fake_simulator, queue_top_model_with_events):
+    top_model, events = queue_top_model_with_events
+    store = ResultStore(os.path.join(tempfile.mkdtemp(), "results.db"))
+    a_fake_simulator.result_store = store
+    result = a_fake_simulator.run_simulation(Simulation(top_model, events=events))
+    assert result.successful()
+    assert set(result.output_df[SimulationResult.PORT_COL]) == {"emitted_signal"}
+    assert not result.port_series("top", "emitted_signal").empty
+    assert len(store.final_values("emitted_signal")) == 1
+
+
+@pytest.fixture
+def benchmarks_module(monkeypatch):
+    # Loaded under a name of its own, so no module named run is left behind. The modules it
+    # imports from the benchmarks directory are removed afterwards too.
+    monkeypatch.syspath_prepend(BENCHMARKS_PATH)
+    modules_before = set(sys.modules)
+    spec = importlib.util.spec_from_file_location("pringles_benchmarks_run",
+                                                  os.path.join(BENCHMARKS_PATH, "run.py"))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    yield module
+    for name in set(sys.modules) - modules_before:
+        if getattr(sys.modules[name], '__file__', None) and \
+           os.path.dirname(os.path.abspath(sys.modules[name].__file__)) == \
+           os.path.abspath(BENCHMARKS_PATH):
+            del sys.modules[name]
+
+
+def test_quick_benchmarks_produce_machine_readable_results(benchmarks_module):
+    results = benchmarks_module.run_benchmarks(name_filter="serialize", quick=True, repeat=1)
+    assert [bench["name"] for bench in results["benchmarks"]] ==\
+        ["serialize.ma", "serialize.json", "serialize.json_compact"]
+    assert all(bench["median"] > 0 for bench in results["benchmarks"])
+    assert "run" not in sys.modules
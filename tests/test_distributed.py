@@ -0,0 +1,155 @@
+import pytest
+import socket
+import socketserver
+import threading
+from pringles.simulator import Simulation, SimulationResult
+from pringles.simulator.distributed import (SimulationWorker, DistributedSimulator,
+                                            encode_output, decode_output,
+                                            send_message, receive_message, HELLO_MESSAGE,
+                                            ERROR_STATUS)
+from pringles.simulator.distributed import _DistributedRun
+from pringles.simulator.errors import DistributedRunException
+from pringles.simulator.events import Event
+from pringles.utils import VirtualTime
+
+
+@pytest.fixture
+def two_workers(a_fake_simulator):
+    workers = [SimulationWorker(a_fake_simulator, slots=2).start() for _ in range(2)]
+    yield workers
+    for worker in workers:
+        worker.stop()
+
+
+class _CrashingHandler(socketserver.BaseRequestHandler):
+    """Acts as a worker that dies as soon as it's sent a simulation."""
+
+    def handle(self):
+        while True:
+            message = receive_message(self.request)
+            if message is None or message['type'] != HELLO_MESSAGE:
+                return
+            send_message(self.request, {'type': HELLO_MESSAGE, 'slots': 1})
+
+
+@pytest.fixture
+def a_crashing_worker_address():
+    server = socketserver.ThreadingTCPServer(('127.0.0.1', 0), _CrashingHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server.server_address
+    server.shutdown()
+    server.server_close()
+
+
+def _unused_address():
+    with socket.socket() as unused:
+        unused.bind(('127.0.0.1', 0))
+        return unused.getsockname()
+
+
+def test_simulations_are_run_in_the_workers(two_workers, queue_top_model_with_events):
+    top_model, events = queue_top_model_with_events
+    simulations = [Simulation(top_model, events=events) for _ in range(6)]
+    results = DistributedSimulator([worker.address for worker in two_workers])\
+        .run_simulations(simulations)
+    assert len(results) == 6
+    for simulation, result in zip(simulations, results):
+        assert simulation.result is result
+        assert result.successful()
+        assert set(result.output_df[SimulationResult.PORT_COL]) == {"emitted_signal"}
+
+
+def test_failed_workers_simulations_are_run_by_the_others(two_workers,
+                                                          a_crashing_worker_address,
+                                                          queue_top_model_with_events):
+    top_model, events = queue_top_model_with_events
+    simulations = [Simulation(top_model, events=events) for _ in range(4)]
+    addresses = [_unused_address(), a_crashing_worker_address, two_workers[0].address]
+    # Lost connections are not attempts of the simulation
+    results = DistributedSimulator(addresses, max_attempts=1).run_simulations(simulations)
+    assert all(result.successful() for result in results)
+
+
+def test_unknown_messages_are_answered_with_an_error(two_workers):
+    with socket.create_connection(two_workers[0].address, timeout=5) as connection:
+        send_message(connection, {'type': 'bogus'})
+        response = receive_message(connection)
+        assert response['status'] == ERROR_STATUS
+        assert receive_message(connection) is None
+
+
+def test_simulations_fail_without_workers(queue_top_model_with_events):
+    top_model, events = queue_top_model_with_events
+    with pytest.raises(DistributedRunException) as error:
+        DistributedSimulator([_unused_address()]).run_simulations([Simulation(top_model)])
+    assert list(error.value.errors) == [0]
+
+
+def test_transient_failures_are_retried(two_workers, queue_top_model_with_events, monkeypatch):
+    top_model, events = queue_top_model_with_events
+    monkeypatch.setenv("FAKE_CDPP_SIGNAL", "9")
+    with pytest.raises(DistributedRunException) as error:
+        DistributedSimulator([two_workers[0].address], max_attempts=2)\
+            .run_simulations([Simulation(top_model), Simulation(top_model)])
+    assert sorted(error.value.errors) == [0, 1]
+
+
+def test_simulations_failing_after_they_run_do_not_stop_the_others(two_workers,
+                                                                   queue_top_model_with_events):
+    class FailingStore:
+        appended = 0
+
+        def append(self, simulation):
+            self.appended += 1
+            if self.appended == 1:
+                raise ValueError("Unknown parameters")
+
+    top_model, events = queue_top_model_with_events
+    simulations = [Simulation(top_model, events=events) for _ in range(4)]
+    with pytest.raises(DistributedRunException) as error:
+        DistributedSimulator([two_workers[0].address], result_store=FailingStore())\
+            .run_simulations(simulations)
+    assert len(error.value.errors) == 1
+    assert "Unknown parameters" in list(error.value.errors.values())[0]
+    assert sum(simulation.result is not None for simulation in simulations) == 4
+
+
+def test_simulations_with_events_out_of_order_fail_alone(two_workers,
+                                                         queue_top_model_with_events):
+    top_model, events = queue_top_model_with_events
+    out_of_order = iter([events[1], events[0]])
+    simulations = [Simulation(top_model, events=out_of_order), Simulation(top_model)]
+    with pytest.raises(DistributedRunException) as error:
+        DistributedSimulator([two_workers[0].address]).run_simulations(simulations)
+    assert list(error.value.errors) == [0]
+    assert "EventsOutOfOrderException" in error.value.errors[0]
+    assert simulations[1].result.successful()
+
+
+def test_events_are_serialized_once_for_every_attempt(two_workers, queue_top_model_with_events,
+                                                      monkeypatch):
+    top_model, _ = queue_top_model_with_events
+    port = top_model.get_port("incoming_event")
+    events = (Event(VirtualTime.of_seconds(second), port, 1.) for second in range(1, 4))
+    tasks = []
+    task = _DistributedRun._task
+    monkeypatch.setattr(_DistributedRun, "_task",
+                        staticmethod(lambda simulation: tasks.append(task(simulation)) or
+                                     tasks[-1]))
+    monkeypatch.setenv("FAKE_CDPP_SIGNAL", "9")
+    with pytest.raises(DistributedRunException):
+        DistributedSimulator([two_workers[0].address], max_attempts=3)\
+            .run_simulations([Simulation(top_model, events=events)])
+    assert len(tasks) == 1
+    assert tasks[0]['events'].count(";") == 3
+
+
+def test_outputs_are_encoded_as_columns():
+    output_df = SimulationResult._parse_output_file('tests/resources/model_output_tuple_value')
+    columns = encode_output(output_df)
+    assert len(columns['ports']) <= len(columns['port_codes'])
+    decoded = decode_output(columns)
+    assert list(decoded[SimulationResult.PORT_COL]) == list(output_df[SimulationResult.PORT_COL])
+    assert list(decoded[SimulationResult.VALUE_COL]) == list(output_df[SimulationResult.VALUE_COL])
+    assert list(decoded[SimulationResult.TIME_COL]) == list(output_df[SimulationResult.TIME_COL])
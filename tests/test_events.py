@@ -1,6 +1,14 @@
 import pytest
+import io
+import os
+import stat
+import numpy as np
+from typing import List
 from pringles.models import Port
-from pringles.simulator import Event
+from pringles.models.errors import PortNotFoundException
+from pringles.simulator import Event, EventTable, Simulation
+from pringles.simulator.events import write_events, time_of_ticks
+from pringles.simulator.errors import EventsOutOfOrderException
 from pringles.utils import VirtualTime
 
 sample_port = Port("sample_port", None)
@@ -14,3 +22,115 @@ one_hour_time = VirtualTime.of_hours(1)
 ])
 def test_event_serialized_correctly(event: Event, expected_serialization: str):
     assert event.serialize() == expected_serialization
+
+
+def test_event_table_is_serialized_like_events():
+    events = [Event(VirtualTime(1, 2, 3, 4, 0), sample_port, 1.5),
+              Event(VirtualTime.of_hours(1), sample_port, 20.25)]
+    table = EventTable.from_events(events)
+    assert table.serialize().splitlines() == [events[1].serialize(), events[0].serialize()]
+
+
+@pytest.mark.parametrize("values", [[1, 20], [1.5, 20.], [[1, 2], [3, 4]]])
+def test_event_table_values_are_serialized_like_events(values):
+    events = [Event(VirtualTime.of_seconds(index), sample_port, value)
+              for index, value in enumerate(values)]
+    table = EventTable.from_events(events)
+    assert table.serialize().splitlines() == [event.serialize() for event in events]
+
+
+def test_event_table_is_sorted_by_time():
+    table = EventTable([3000, 1000, 2000], ["a", "b", "a"], [3., 1., 2.])
+    assert table.times.tolist() == [1000, 2000, 3000]
+    assert table.values.tolist() == [1., 2., 3.]
+    assert [table.port_names[code] for code in table.port_codes] == ["b", "a", "a"]
+
+
+def test_event_table_vector_values_are_serialized():
+    table = EventTable([61001], ["sample_port"], [[1.5, 2.3]])
+    assert table.serialize() == "00:01:01:001 sample_port [1.5, 2.3];\n"
+
+
+def test_event_table_arrays_should_have_the_same_length():
+    with pytest.raises(ValueError):
+        EventTable([1, 2], ["a"], [1., 2.])
+
+
+def test_event_table_ports_are_validated_against_top_model(queue_top_model_with_events):
+    top_model, _ = queue_top_model_with_events
+    with pytest.raises(PortNotFoundException):
+        Simulation(top_model, events=EventTable([1], ["emitted_signal"], [1.]))
+
+
+def test_event_table_is_written_into_events_file(a_fake_simulator, queue_top_model_with_events):
+    top_model, _ = queue_top_model_with_events
+    table = EventTable(np.arange(0, 3000, 1000), ["incoming_event"] * 3, np.ones(3))
+    simulation = Simulation(top_model, events=table)
+    a_fake_simulator.run_simulation(simulation)
+    with open(os.path.join(simulation.output_dir, "events")) as events_file:
+        assert events_file.read() == table.serialize()
+
+
+def _poisson_arrivals(port, rate_per_second=5., seed=0):
+    """An endless stream of arrivals, as generated stimuli usually are"""
+    rng = np.random.default_rng(seed)
+    ticks = 0
+    while True:
+        ticks += int(rng.exponential(1000 / rate_per_second)) + 1
+        yield Event(time_of_ticks(ticks), port, 1.)
+
+
+def _written_events(events, duration=None) -> List[str]:
+    events_file = io.StringIO()
+    write_events(events, events_file, duration)
+    return events_file.getvalue().splitlines()
+
+
+def test_endless_events_are_cut_at_duration():
+    lines = _written_events(_poisson_arrivals(sample_port), VirtualTime.of_minutes(1))
+    assert 200 < len(lines) < 400
+    assert all(VirtualTime.parse(line.split()[0]) <= VirtualTime.of_minutes(1) for line in lines)
+
+
+def test_batches_of_events_are_streamed():
+    def batches():
+        for start in range(0, 5000, 1000):
+            yield EventTable(np.arange(start, start + 1000, 100), ["sample_port"] * 10,
+                             np.ones(10))
+        yield [Event(time_of_ticks(6000), sample_port, 2.)]
+    lines = _written_events(batches(), VirtualTime(0, 0, 4, 500, 0))
+    assert len(lines) == 46
+    assert lines[-1] == "00:00:04:500 sample_port 1.0;"
+
+
+def test_lists_of_events_are_sorted_and_written_whole():
+    events = [Event(VirtualTime.of_seconds(2), sample_port, 1),
+              Event(one_hour_time, sample_port, 2),
+              Event(VirtualTime.of_seconds(1), sample_port, 3),
+              Event(VirtualTime.of_seconds(2), sample_port, 4)]
+    lines = _written_events(events, VirtualTime.of_minutes(1))
+    assert lines == [events[index].serialize() for index in (2, 0, 3, 1)]
+
+
+@pytest.mark.parametrize("events", [
+    iter([Event(VirtualTime.of_seconds(2), sample_port, 1.),
+          Event(one_hour_time, sample_port, 1.),
+          Event(VirtualTime.of_seconds(1), sample_port, 1.)]),
+    iter([EventTable([2000, 3000], ["sample_port"] * 2, [1., 1.]),
+          EventTable([1000], ["sample_port"], [1.])]),
+])
+def test_events_out_of_order_are_rejected(events):
+    with pytest.raises(EventsOutOfOrderException):
+        _written_events(events)
+
+
+def test_events_are_streamed_through_a_fifo(a_fake_simulator, queue_top_model_with_events):
+    top_model, _ = queue_top_model_with_events
+    simulation = Simulation(top_model, duration=VirtualTime.of_minutes(1), events_fifo=True,
+                            events=_poisson_arrivals(top_model.get_port("incoming_event")))
+    result = a_fake_simulator.run_simulation(simulation)
+    assert result.successful()
+    assert b"External events: " in result.process_result.stdout
+    assert stat.S_ISFIFO(os.stat(os.path.join(simulation.output_dir, "events")).st_mode)
+    assert Simulation.read_pickle(os.path.join(simulation.output_dir,
+                                               Simulation.DEFAULT_PICKLEFILE_NAME)).events is None
@@ -0,0 +1,81 @@
+import pytest
+import os
+import tempfile
+import numpy as np
+from pringles.models import Port
+from pringles.utils import VirtualTime
+from pringles.simulator import Event, EventTable, Simulation, Simulator
+from pringles.simulator.events_cache import EventsCache, STALE_TEMPORARY_SECONDS
+from pringles.simulator.instrumentation import WRITE_EVENTS_STAGE
+from pringles.simulator.errors import EventsOutOfOrderException
+
+FAKE_CDPP_BIN_PATH = os.path.join(os.path.dirname(__file__), '../benchmarks/fake_cdpp/')
+
+
+@pytest.fixture
+def a_cache() -> EventsCache:
+    return EventsCache(tempfile.mkdtemp())
+
+
+def _table(size=10) -> EventTable:
+    return EventTable(np.arange(size) * 1000, ["incoming_event"] * size, np.ones(size))
+
+
+def test_identical_events_are_stored_once(a_cache):
+    first_path, first_written = a_cache.store(_table())
+    second_path, second_written = a_cache.store(_table())
+    assert first_path == second_path
+    assert (first_written, second_written) == (True, False)
+    assert a_cache.store(_table(11))[0] != first_path
+    assert a_cache.store(_table(), duration=VirtualTime.of_seconds(5))[0] != first_path
+    assert len(a_cache) == 3
+
+
+def test_events_lists_and_iterators_are_stored_once(a_cache, queue_top_model_with_events):
+    _, events = queue_top_model_with_events
+    assert a_cache.store(events)[1]
+    assert not a_cache.store(list(events))[1]
+    iterator_path, written = a_cache.store(iter(events))
+    assert written
+    assert a_cache.store(iter(events)) == (iterator_path, False)
+    assert len(a_cache) == 2
+
+
+def test_runs_link_the_shared_events_file(queue_top_model_with_events):
+    top_model, _ = queue_top_model_with_events
+    simulator = Simulator(FAKE_CDPP_BIN_PATH, autodiscover=False,
+                          events_cache_dir=tempfile.mkdtemp())
+    simulations = [Simulation(top_model, events=_table()) for _ in range(3)]
+    results = [simulator.run_simulation(simulation) for simulation in simulations]
+    events_paths = [os.path.join(simulation.output_dir, "events") for simulation in simulations]
+    assert len({os.stat(path).st_ino for path in events_paths}) == 1
+    assert len(simulator.events_cache) == 1
+    written_bytes = [result.timings[WRITE_EVENTS_STAGE].bytes_out for result in results]
+    assert written_bytes[0] > 0 and written_bytes[1:] == [0, 0]
+    assert b"External events: 10" in results[2].process_result.stdout
+
+
+def test_events_out_of_order_are_not_stored(a_cache):
+    port = Port("incoming_event", None)
+    with pytest.raises(EventsOutOfOrderException):
+        a_cache.store(iter([Event(VirtualTime.of_seconds(2), port, 1.),
+                            Event(VirtualTime.of_seconds(1), port, 1.)]))
+    assert os.listdir(a_cache.directory) == []
+
+
+def test_stale_temporary_files_are_removed(a_cache):
+    stale_path = os.path.join(a_cache.directory, "crashed.tmp")
+    recent_path = os.path.join(a_cache.directory, "writing.tmp")
+    for path in (stale_path, recent_path):
+        open(path, "w").close()
+    stale_time = os.path.getmtime(stale_path) - STALE_TEMPORARY_SECONDS - 1
+    os.utime(stale_path, (stale_time, stale_time))
+    EventsCache(a_cache.directory)
+    assert os.listdir(a_cache.directory) == ["writing.tmp"]
+
+
+def test_same_events_as_table_and_list_are_stored_apart(a_cache, queue_top_model_with_events):
+    top_model, events = queue_top_model_with_events
+    table = EventTable.from_events(events)
+    assert a_cache.store(table)[0] != a_cache.store(events)[0]
+    assert len(a_cache) == 2
@@ -0,0 +1,60 @@
+import pytest
+import subprocess
+import sys
+
+HEAVY_MODULES = ["pandas", "numpy", "matplotlib", "tornado", "pyparsing"]
+IMPORT_TIME_BUDGET_SECONDS = 0.5
+
+MEASURE_IMPORT_SCRIPT = """
+import sys, time
+start = time.perf_counter()
+import {modules}
+elapsed = time.perf_counter() - start
+print(elapsed)
+print(" ".join(name for name in {heavy_modules} if name in sys.modules))
+"""
+
+
+def _measure_import(modules: str):
+    script = MEASURE_IMPORT_SCRIPT.format(modules=modules, heavy_modules=HEAVY_MODULES)
+    output = subprocess.run([sys.executable, "-c", script],
+                            capture_output=True, check=True).stdout.decode()
+    elapsed, loaded_modules = (output.splitlines() + [""])[:2]
+    return float(elapsed), loaded_modules.split()
+
+
+@pytest.mark.parametrize("modules", [
+    "pringles",
+    "pringles.models, pringles.serializers",
+    "pringles.utils, pringles.simulator, pringles.backends",
+])
+def test_import_defers_heavy_dependencies(modules: str):
+    elapsed, loaded_modules = _measure_import(modules)
+    assert loaded_modules == []
+    assert elapsed < IMPORT_TIME_BUDGET_SECONDS
+
+
+@pytest.mark.parametrize("statement,module", [
+    ("from pringles.utils import decimate_minmax", "numpy"),
+    ("from pringles.utils import vtime_decorate", "matplotlib"),
+    ("from pringles.utils import AtomicMetadataExtractor", "pyparsing"),
+    ("from pringles.utils import *", "matplotlib"),
+    ("from pringles.backends import ipython_inline_display", "tornado"),
+])
+def test_heavy_dependencies_are_imported_on_first_use(statement: str, module: str):
+    # In a fresh interpreter, as other tests may have imported the module already
+    script = f"""
+import sys
+import pringles
+assert {module!r} not in sys.modules
+{statement}
+assert {module!r} in sys.modules
+"""
+    subprocess.run([sys.executable, "-c", script], check=True)
+
+
+def test_star_import_exports_deferred_names():
+    namespace = {}
+    exec("from pringles.utils import *", namespace)
+    assert {"VirtualTime", "AtomicMetadataExtractor", "vtime_decorate",
+            "decimate_minmax"} <= set(namespace)
@@ -0,0 +1,43 @@
+import pytest  # noqa
+from typing import List, Tuple
+from pringles.simulator import Simulation, StageHook, StageTiming
+from pringles.simulator.instrumentation import (SERIALIZE_MODEL_STAGE, WRITE_MODEL_STAGE,
+                                                WRITE_EVENTS_STAGE, SIMULATOR_PROCESS_STAGE,
+                                                PARSE_OUTPUT_STAGE, PARSE_LOGS_STAGE,
+                                                PICKLE_STAGE)
+
+ALL_STAGES = [SERIALIZE_MODEL_STAGE, WRITE_MODEL_STAGE, WRITE_EVENTS_STAGE,
+              SIMULATOR_PROCESS_STAGE, PARSE_OUTPUT_STAGE, PARSE_LOGS_STAGE, PICKLE_STAGE]
+
+
+class RecordingHook(StageHook):
+    def __init__(self):
+        self.calls: List[Tuple[str, str]] = []
+
+    def on_stage_start(self, simulation, stage: str):
+        self.calls.append(("start", stage))
+
+    def on_stage_end(self, simulation, timing: StageTiming):
+        self.calls.append(("end", timing.name))
+
+
+def test_every_stage_is_timed(a_fake_simulator, queue_top_model_with_events):
+    top_model, events = queue_top_model_with_events
+    result = a_fake_simulator.run_simulation(Simulation(top_model, events=events))
+    timings = result.timings
+    assert [stage.name for stage in timings.stages] == ALL_STAGES
+    assert all(stage.wall_time >= 0 for stage in timings.stages)
+    assert timings[SIMULATOR_PROCESS_STAGE].bytes_in > 0
+    assert timings[SIMULATOR_PROCESS_STAGE].bytes_out > 0
+    assert timings[PARSE_LOGS_STAGE].bytes_in > 0
+    assert timings.process_usage.max_rss_bytes > 0
+    assert timings.as_dict()["stages"][0]["stage"] == SERIALIZE_MODEL_STAGE
+
+
+def test_hooks_are_notified_around_each_stage(a_fake_simulator, queue_top_model_with_events):
+    top_model, _ = queue_top_model_with_events
+    hook = RecordingHook()
+    a_fake_simulator.stage_hooks.append(hook)
+    a_fake_simulator.run_simulation(Simulation(top_model))
+    stages = [stage for stage in ALL_STAGES if stage != WRITE_EVENTS_STAGE]
+    assert hook.calls == [(call, stage) for stage in stages for call in ("start", "end")]
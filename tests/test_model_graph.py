@@ -0,0 +1,123 @@
+import pytest
+from pringles.models import Coupled, GraphIndex, replicate
+from pringles.models.errors import ForeignPortException
+
+
+def nested_pipeline_model(a_relay):
+    first = a_relay("first")
+    second = a_relay("second")
+    third = a_relay("third")
+    inner = Coupled("inner", [second])\
+        .add_inport("in")\
+        .add_outport("out")\
+        .add_coupling("in", second.get_port("in"))\
+        .add_coupling(second.get_port("out"), "out")
+    top = Coupled("top", [first, inner, third])\
+        .add_inport("in")\
+        .add_outport("out")\
+        .add_coupling("in", first.get_port("in"))\
+        .add_coupling(first.get_port("out"), inner.get_port("in"))\
+        .add_coupling(inner.get_port("out"), third.get_port("in"))\
+        .add_coupling(third.get_port("out"), "out")
+    return top, first, second, third
+
+
+def test_flatten_skips_coupled_model_ports(a_relay):
+    top, first, second, third = nested_pipeline_model(a_relay)
+
+    flattened = {(link[0].owner.name, link[0].name, link[1].owner.name, link[1].name)
+                 for link in GraphIndex(top).flatten()}
+
+    assert flattened == {
+        ("top", "in", "first", "in"),
+        ("first", "out", "second", "in"),
+        ("second", "out", "third", "in"),
+        ("third", "out", "top", "out"),
+    }
+
+
+def test_fan_in_and_out(a_relay):
+    source = a_relay("source")
+    sinks = [a_relay(f"sink_{index}") for index in range(3)]
+    top = Coupled("top", [source] + sinks)
+    for sink in sinks:
+        top.add_coupling(source.get_port("out"), sink.get_port("in"))
+        top.add_coupling(sink.get_port("out"), source.get_port("in"))
+
+    index = GraphIndex(top)
+
+    assert index.fan_out(source.get_port("out")) == 3
+    assert index.fan_in(source.get_port("in")) == 3
+    assert index.successors(sinks[0].get_port("out")) == [source.get_port("in")]
+    assert index.fan_stats()["max_fan_out"] == 3
+    assert index.fan_stats()["mean_fan_in"] == 1.5
+
+
+def test_reachable_atomics_follow_atomics_and_levels(a_relay):
+    top, first, second, third = nested_pipeline_model(a_relay)
+    unreached = a_relay("unreached")
+    top.subcomponents.append(unreached)
+
+    reached = GraphIndex(top).reachable_atomics([top.get_port("in")])
+
+    assert reached == [first, second, third]
+
+
+def test_atomic_cycles(a_relay):
+    top, first, second, third = nested_pipeline_model(a_relay)
+    assert GraphIndex(top).atomic_cycles() == []
+
+    top.add_coupling(third.get_port("out"), first.get_port("in"))
+    cycles = GraphIndex(top).atomic_cycles()
+
+    assert len(cycles) == 1
+    assert set(cycles[0]) == {first, second, third}
+
+
+def test_atomic_cycles_through_arrays(a_relay):
+    relay = a_relay("relay")
+    relays = replicate(a_relay("copy"), 3)
+    top = Coupled("top", [relay, relays])\
+        .add_coupling(relay.get_port("out"), relays[0].get_port("in"))
+    assert GraphIndex(top).atomic_cycles() == []
+
+    top.add_coupling(relays[0].get_port("out"), relay.get_port("in"))
+
+    cycles = GraphIndex(top).atomic_cycles()
+    assert len(cycles) == 1
+    assert set(cycles[0]) == {relay, relays}
+
+
+def test_index_is_rebuilt_only_after_structural_changes(a_relay):
+    top, first, second, third = nested_pipeline_model(a_relay)
+    index = GraphIndex.of(top)
+    assert GraphIndex.of(top) is index
+
+    top.add_coupling(third.get_port("out"), first.get_port("in"))
+
+    assert index.stale
+    rebuilt = GraphIndex.of(top)
+    assert rebuilt is not index
+    assert rebuilt.links == index.links + 1
+
+
+def test_coupling_to_a_port_out_of_the_model_is_rejected(a_relay):
+    top, first, second, third = nested_pipeline_model(a_relay)
+    # second is a component of inner, not of top
+    top.add_coupling(first.get_port("out"), second.get_port("in"))
+
+    with pytest.raises(ForeignPortException):
+        GraphIndex(top)
+
+
+def test_deep_hierarchies_are_indexed_without_recursion(a_relay):
+    atomic = a_relay("leaf")
+    model = atomic
+    for depth in range(5000):
+        model = Coupled(f"level_{depth}", [model])\
+            .add_inport("in")\
+            .add_coupling("in", model.get_port("in"))
+
+    reached = GraphIndex(model).reachable_atomics([model.get_port("in")])
+
+    assert reached == [atomic]
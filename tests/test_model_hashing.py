@@ -0,0 +1,104 @@
+from pringles.models import Coupled, ModelChange, replicate
+from pringles.models import structural_hash, structural_diff
+import pringles.models.hashing as hashing
+
+
+def a_model(a_relay, delay: str = "1"):
+    first = a_relay("first", delay=delay)
+    second = a_relay("second")
+    inner = Coupled("inner", [second])\
+        .add_inport("in")\
+        .add_coupling("in", second.get_port("in"))
+    other = Coupled("other", [a_relay("third")])
+    return Coupled("top", [first, inner, other])\
+        .add_inport("in")\
+        .add_coupling("in", first.get_port("in"))\
+        .add_coupling(first.get_port("out"), inner.get_port("in"))
+
+
+def test_equal_structures_hash_the_same(a_relay):
+    assert structural_hash(a_model(a_relay)) == structural_hash(a_model(a_relay))
+
+
+def test_any_structural_change_changes_the_hash(a_relay):
+    model = a_model(a_relay)
+    hashes = {structural_hash(model)}
+
+    model.subcomponents[0].model_params["delay"] = "2"
+    hashes.add(structural_hash(model))
+    model.subcomponents[1].subcomponents[0].add_outport("extra")
+    hashes.add(structural_hash(model))
+    model.subcomponents[1].name = "renamed"
+    hashes.add(structural_hash(model))
+    model.add_outport("out")
+    hashes.add(structural_hash(model))
+    model.subcomponents.pop()
+    hashes.add(structural_hash(model))
+
+    assert len(hashes) == 6
+
+
+def test_only_changed_subtrees_are_hashed_again(monkeypatch, a_relay):
+    model = a_model(a_relay)
+    structural_hash(model)
+    hashed = []
+    local_fields = hashing._local_fields
+    monkeypatch.setattr(hashing, "_local_fields",
+                        lambda hashed_model: hashed.append(hashed_model.name) or
+                        local_fields(hashed_model))
+
+    structural_hash(model)
+    assert hashed == []
+
+    model.subcomponents[1].subcomponents[0].add_outport("extra")
+    structural_hash(model)
+    assert sorted(hashed) == ["inner", "second", "top"]
+
+
+def test_diff_walks_each_hierarchy_once(monkeypatch, a_relay):
+    old = Coupled("top", [Coupled(f"level_{index}", [a_relay(f"leaf_{index}")])
+                          for index in range(10)])
+    new = Coupled("top", [Coupled(f"level_{index}", [a_relay(f"leaf_{index}", delay="2")])
+                          for index in range(10)])
+    walked = []
+    components_of = hashing._components_of
+    monkeypatch.setattr(hashing, "_components_of",
+                        lambda model: walked.append(model) or components_of(model))
+
+    assert len(structural_diff(old, new)) == 10
+    # Once when going down, and once when hashing back up
+    assert max(walked.count(model) for model in walked) == 2
+
+
+def test_arrays_are_hashed_by_their_naming(a_relay):
+    hashes = {structural_hash(Coupled("top", [replicate(a_relay("cell"), 10 ** 6, naming)]))
+              for naming in (lambda name, index: f"{name}_{index}",
+                             lambda name, index: f"{name}{index}")}
+    assert len(hashes) == 2
+
+
+def test_diff_reports_changed_added_and_removed_subtrees(a_relay):
+    old = a_model(a_relay)
+    new = a_model(a_relay, delay="2")
+    new.subcomponents[1].subcomponents.append(a_relay("added"))
+    new.subcomponents.pop()
+
+    changes = {(change.path, change.kind) for change in structural_diff(old, new)}
+
+    assert changes == {
+        ("top.first", ModelChange.CHANGED),
+        ("top.inner.added", ModelChange.ADDED),
+        ("top.other", ModelChange.REMOVED),
+    }
+
+
+def test_diff_of_equal_structures_is_empty(a_relay):
+    assert structural_diff(a_model(a_relay), a_model(a_relay)) == []
+
+
+def test_deep_hierarchies_are_hashed_without_recursion(a_relay):
+    model = a_relay("leaf")
+    for depth in range(5000):
+        model = Coupled(f"level_{depth}", [model])
+
+    assert len(structural_hash(model)) == 64
@@ -24,10 +24,16 @@ def _start_web_display_backend():
         yield
 
 
+@pytest.fixture()
+def served_models(monkeypatch):
+    """Fetches every displayed model from the server, instead of embedding small ones"""
+    monkeypatch.setattr("pringles.backends.web_display.INLINE_DISPLAY_MAX_BYTES", 0)
+
+
 @pytest.fixture()
 def test_requester() -> TimeoutRequester:
-    from pringles.backends.web_display import WebApplication
-    return TimeoutRequester(WebApplication.target_url, 10)
+    from pringles.backends.web_display import display_server
+    return TimeoutRequester(display_server.target_url, 10)
 
 
 def test_simple_model_display(test_requester, queue_top_model_with_events):
@@ -52,11 +58,201 @@ def test_static_is_served_from_subfolder(test_requester):
     assert response.text == "holes"
 
 
-def test_json_representation_is_embedded_raw_in_ipython_representation(test_requester, queue_top_model_with_events):
-    from pringles.serializers import JsonSerializer
+def test_model_is_referenced_from_ipython_representation(test_requester, served_models,
+                                                         queue_top_model_with_events):
+    from pringles.serializers import CompactJsonSerializer
+    from pringles.backends.web_display import display_server
+    queue_model, _ = queue_top_model_with_events
+    model_url = queue_model._repr_html_().split()[-1]
+    assert model_url.startswith(display_server.target_url + "/models/")
+    assert CompactJsonSerializer.serialize(queue_model) not in model_url
+    response = test_requester.get(model_url[len(display_server.target_url):])
+    assert response.headers["Content-Encoding"] == "gzip"
+    assert response.text == CompactJsonSerializer.serialize(queue_model)
+
+
+def test_redisplayed_model_is_served_from_the_same_url(test_requester, served_models,
+                                                       queue_top_model_with_events):
+    from pringles.backends.web_display import display_server
+    queue_model, _ = queue_top_model_with_events
+    hosted = len(display_server.hosted_models)
+    model_url = queue_model._repr_html_().split()[-1]
+    assert queue_model._repr_html_().split()[-1] == model_url
+    assert len(display_server.hosted_models) <= hosted + 1
+    model_uri = model_url[len(display_server.target_url):]
+    etag = test_requester.get(model_uri).headers["ETag"]
+    import requests
+    response = requests.get(display_server.target_url + model_uri,
+                            headers={"If-None-Match": etag}, timeout=10)
+    assert response.status_code == 304
+
+
+def test_unknown_model_is_not_found(test_requester):
+    assert test_requester.get("/models/" + "0" * 64).status_code == 404
+
+
+def test_large_model_is_served_a_level_at_a_time(test_requester, queue_top_model_with_events,
+                                                 monkeypatch):
+    import json
+    from pringles.models import Coupled
+    from pringles.backends import web_display
+    queue_model, _ = queue_top_model_with_events
+    outer = Coupled("outer", [queue_model, Coupled("empty", [])]).add_inport("in")
+    outer.add_coupling("in", queue_model.get_port("incoming_event"))
+    monkeypatch.setattr(web_display, "LAZY_DISPLAY_MIN_MODELS", 2)
+    levels_url = outer._repr_html_().split()[-1]
+    levels_uri = levels_url[len(web_display.display_server.target_url):]
+
+    top_level = json.loads(test_requester.get(levels_uri).text)
+    assert [model["path"] for model in top_level["models"]] == ["0", "1"]
+    assert top_level["models"][0]["summary"] == {"models": 1, "ports": 2, "couplings": 2}
+    assert "models" not in top_level["models"][0]
+    assert top_level["eic"] == [{"to_port": "incoming_event", "to_model": "top",
+                                 "from_port": "in"}]
+
+    queue_level = json.loads(test_requester.get(levels_uri + "0").text)
+    assert queue_level["id"] == "top"
+    assert [model["id"] for model in queue_level["models"]] == ["queue"]
+    assert json.loads(test_requester.get(levels_uri + "0.0").text)["type"] == "atomic"
+    assert test_requester.get(levels_uri + "0.1").status_code == 404
+    assert test_requester.get(levels_uri + "0.0.0").status_code == 404
+
+
+def test_redisplayed_large_model_is_hosted_once(test_requester, queue_top_model_with_events,
+                                                monkeypatch):
+    import requests
+    from pringles.backends import web_display
     queue_model, _ = queue_top_model_with_events
-    result = queue_model._repr_html_()
-    assert JsonSerializer.serialize(queue_model) in result
+    monkeypatch.setattr(web_display, "LAZY_DISPLAY_MIN_MODELS", 0)
+    levels_url = queue_model._repr_html_().split()[-1]
+    hosted = len(web_display.display_server.hosted_models)
+    assert queue_model._repr_html_().split()[-1] == levels_url
+    assert len(web_display.display_server.hosted_models) == hosted
+
+    etag = requests.get(levels_url, timeout=10).headers["ETag"]
+    response = requests.get(levels_url, headers={"If-None-Match": etag}, timeout=10)
+    assert response.status_code == 304
+    queue_model.add_outport("dropped_signal")
+    response = requests.get(levels_url, headers={"If-None-Match": etag}, timeout=10)
+    assert response.status_code == 200
+    assert queue_model._repr_html_().split()[-1] != levels_url
+
+
+def test_models_with_arrays_are_displayed(test_requester, queue_top_model_with_events,
+                                          monkeypatch):
+    import json
+    from pringles.models import Coupled, replicate
+    from pringles.backends import web_display
+    queue_model, _ = queue_top_model_with_events
+    queues = replicate(queue_model, 3)
+    outer = Coupled("outer", [queues]).add_inport("in")
+    outer.add_coupling("in", queues[1].get_port("incoming_event"))
+    assert "queue_1" in outer._repr_html_()
+
+    monkeypatch.setattr(web_display, "LAZY_DISPLAY_MIN_MODELS", 5)
+    levels_url = outer._repr_html_().split()[-1]
+    levels_uri = levels_url[len(web_display.display_server.target_url):]
+    top_level = json.loads(test_requester.get(levels_uri).text)
+    assert [model["id"] for model in top_level["models"]] == ["top_0", "top_1", "top_2"]
+    assert top_level["eic"][0]["to_model"] == "top_1"
+    copy_level = json.loads(test_requester.get(levels_uri + "1").text)
+    assert [model["id"] for model in copy_level["models"]] == ["queue_1"]
+
+
+def test_model_is_served_whole(test_requester, served_models, queue_top_model_with_events):
+    queue_model, _ = queue_top_model_with_events
+    assert "/models/" in queue_model._repr_html_()
+
+
+def test_small_model_is_embedded(test_requester, queue_top_model_with_events):
+    from pringles.serializers import CompactJsonSerializer
+    from pringles.backends.web_display import display_server
+    queue_model, _ = queue_top_model_with_events
+    hosted = len(display_server.hosted_models)
+    queue_model.name = "</script>"
+    html = queue_model._repr_html_()
+    assert html.endswith(CompactJsonSerializer.serialize(queue_model).replace("</", "<\\/"))
+    assert "</script>" not in html.split(" ", 1)[1]
+    assert len(display_server.hosted_models) == hosted
+
+
+def test_port_stream_is_sent_over_websocket(test_requester, a_fake_simulator,
+                                            queue_top_model_with_events, monkeypatch):
+    import json
+    import asyncio
+    import threading
+    import tornado.websocket
+    from pringles.backends import PortStream
+    from pringles.simulator import Simulation
+    top_model, events = queue_top_model_with_events
+    polling_threads = []
+    poll = PortStream.poll
+    monkeypatch.setattr(PortStream, "poll", lambda stream: polling_threads.append(
+        threading.current_thread().name) or poll(stream))
+    simulation = Simulation(top_model, events=events)
+    a_fake_simulator.run_simulation(simulation)
+    stream_url = PortStream(simulation, "emitted_signal")._repr_html_().split()[-1]
+    assert stream_url.startswith("ws://")
+
+    async def receive_all():
+        connection = await tornado.websocket.websocket_connect(stream_url)
+        messages = []
+        while True:
+            message = await connection.read_message()
+            if message is None:
+                return messages
+            messages.append(json.loads(message))
+
+    messages = asyncio.run(receive_all())
+    assert messages[-1] == {"port": "emitted_signal", "done": True, "successful": True}
+    assert sum(len(message.get("times", [])) for message in messages) > 0
+    # Polls read files, so they don't block the server IOLoop
+    assert polling_threads and "pringles-display-server" not in polling_threads
+
+
+def test_display_server_can_be_restarted():
+    import time
+    import requests
+    from pringles.backends.web_display import DisplayServer
+    server = DisplayServer().start()
+    assert requests.get(server.target_url + "/heartbeat", timeout=10).text == "tutuc"
+    stop_started = time.perf_counter()
+    server.stop()
+    assert time.perf_counter() - stop_started < 0.5  # Not waiting for a polling interval
+    assert not server.is_running
+    with pytest.raises(requests.ConnectionError):
+        requests.get(server.target_url + "/heartbeat", timeout=10)
+    server.start()
+    try:
+        assert requests.get(server.target_url + "/heartbeat", timeout=10).text == "tutuc"
+    finally:
+        server.stop()
+
+
+def test_display_servers_run_side_by_side(served_models, queue_top_model_with_events):
+    import requests
+    from pringles.backends.web_display import DisplayServer
+    queue_model, _ = queue_top_model_with_events
+    servers = [DisplayServer().start() for _ in range(2)]
+    try:
+        assert servers[0].port != servers[1].port
+        for server in servers:
+            model_url = server.display_model(queue_model).decode().split()[-1]
+            assert model_url.startswith(server.target_url)
+            assert requests.get(model_url, timeout=10).status_code == 200
+    finally:
+        for server in servers:
+            server.stop()
+
+
+def test_display_server_fails_to_start_on_a_taken_port():
+    from pringles.backends.web_display import DisplayServer
+    server = DisplayServer().start()
+    try:
+        with pytest.raises(OSError):
+            DisplayServer(port=server.port).start()
+    finally:
+        server.stop()
 
 
 def _start_server():
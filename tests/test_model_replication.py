@@ -0,0 +1,110 @@
+import pickle
+import pytest
+from pringles.models import Coupled, AtomicModelBuilder, GraphIndex, replicate
+from pringles.models import find_problems, structural_hash
+from pringles.serializers import MaSerializer, MaParser, JsonSerializer, CompactJsonSerializer
+
+Cell = AtomicModelBuilder().with_name("Cell").build()
+
+
+def a_cell_assembly() -> Coupled:
+    cell = Cell("cell", delay="1", label="{braces}").add_inport("in").add_outport("out")
+    return Coupled("assembly", [cell])\
+        .add_inport("in")\
+        .add_outport("out")\
+        .add_coupling("in", cell.get_port("in"))\
+        .add_coupling(cell.get_port("out"), "out")
+
+
+def a_grid(size: int):
+    array = replicate(a_cell_assembly(), size, overrides={1: {"cell": {"delay": "5"}}})
+    array.couple_instances("out", "in")
+    top = Coupled("top", [array])\
+        .add_inport("in")\
+        .add_outport("out")\
+        .add_coupling("in", array[0].get_port("in"))\
+        .add_coupling(array[size - 1].get_port("out"), "out")
+    return top, array
+
+
+def materialized(array) -> Coupled:
+    """The top model of :func:`a_grid`, with the copies as models of their own"""
+    copies = [array.materialize(index) for index in range(array.size)]
+    expected = Coupled("top", copies)\
+        .add_inport("in")\
+        .add_outport("out")\
+        .add_coupling("in", copies[0].get_port("in"))
+    for previous, following in zip(copies, copies[1:]):
+        expected.add_coupling(previous.get_port("out"), following.get_port("in"))
+    expected.add_coupling(copies[-1].get_port("out"), "out")
+    return expected
+
+
+def test_array_is_serialized_as_its_copies():
+    top, array = a_grid(3)
+    expected = materialized(array)
+
+    ma = MaSerializer.serialize(top)
+
+    assert ma == MaSerializer.serialize(expected)
+    assert "[cell_1]\ndelay: 5\nlabel: {braces}\n" in ma
+    # Parsed with the same Cell class, not a new one built for the type name
+    registry = type("Registry", (), {"get_by_name": lambda self, name: Cell})()
+    assert MaParser(registry).parse(ma).subcomponents[2].name == "assembly_2"
+
+
+def test_array_is_serialized_to_json_as_its_copies():
+    top, array = a_grid(3)
+    expected = materialized(array)
+
+    assert JsonSerializer.model_to_dict(top) == JsonSerializer.model_to_dict(expected)
+    assert CompactJsonSerializer.serialize(top) == CompactJsonSerializer.serialize(expected)
+    assert JsonSerializer.level_to_dict(top) == JsonSerializer.level_to_dict(expected)
+    assert JsonSerializer.component_at(top, 2).name == "assembly_2"
+    assert JsonSerializer.component_at(top, 3) is None
+
+
+def test_copies_are_only_created_when_asked_for():
+    top, array = a_grid(1000)
+    MaSerializer.serialize(top)
+
+    assert len(array._replicas) == 2  # The ones top is coupled to
+    assert array[500] is array[500]
+    with pytest.raises(IndexError):
+        array[1000]
+
+
+def test_custom_naming():
+    array = replicate(Cell("cell"), 2, naming=lambda name, index: f"{name}x{index}")
+    assert str(array) == "cellx0@Cell cellx1@Cell"
+
+
+def test_instances_are_coupled_from_outputs_to_inputs():
+    with pytest.raises(ValueError):
+        replicate(a_cell_assembly(), 2).couple_instances("in", "out")
+
+
+def test_structural_tools_handle_arrays():
+    top, array = a_grid(3)
+
+    assert find_problems(top) == []
+    assert [(link[0].owner.name, link[1].owner.name) for link in GraphIndex(top).flatten()] ==\
+        [("top", "assembly_0"), ("assembly_2", "top")]
+
+    first_hash = structural_hash(top)
+    array.override(2, "cell", delay="7")
+    assert structural_hash(top) != first_hash
+
+
+def test_array_template_problems_are_reported():
+    template = a_cell_assembly()
+    template.subcomponents.append(Cell("cell"))
+    top = Coupled("top", [replicate(template, 100)])
+
+    assert find_problems(top) == ["In the copies of assembly: There are many models named cell"]
+
+
+def test_arrays_are_pickled():
+    top, array = a_grid(3)
+    unpickled = pickle.loads(pickle.dumps(top))
+    assert MaSerializer.serialize(unpickled) == MaSerializer.serialize(top)
@@ -2,7 +2,13 @@ import pytest
 from typing import Callable
 from pringles.models.errors import AtomicNameIsKeywordException
 from pringles.models.models import Model, AtomicModelBuilder, Coupled, Atomic, InPort, OutPort, IntLink, ExtInputLink, ExtOutputLink, PortNotFoundException
-from pringles.serializers import MaSerializer
+import io
+import os
+import json
+import shutil
+import subprocess
+from pringles.serializers import MaSerializer, MaParser, JsonSerializer, CompactJsonSerializer
+from pringles.utils.errors import MaParsingException
 
 
 def empty_top_model_generator() -> Model:
@@ -60,4 +66,185 @@ def test_dynamically_built_atomics_are_added_to_module_namespace():
 
 def test_dynamically_building_of_atomic_fail_when_name_is_module_member():
     with pytest.raises(AtomicNameIsKeywordException):
-        AtomicModelBuilder().with_name('Model').build()
\ No newline at end of file
+        AtomicModelBuilder().with_name('Model').build()
+
+
+def nested_model_generator() -> Model:
+    inner = interacciones_poblacion_model_generator()
+    Sink = AtomicModelBuilder().with_name("Sink").build()
+    sink = Sink("sink").add_inport("in")
+    return Coupled("top", [inner, sink])\
+        .add_inport("in")\
+        .add_outport("out")\
+        .add_coupling("in", inner.get_port("in_port"))\
+        .add_coupling(inner.get_port("out_port"), sink.get_port("in"))\
+        .add_coupling(inner.get_port("out_port"), "out")
+
+
+# Models whose compact payload both expanders are checked against
+COMPACT_MODEL_GENERATORS = [
+    empty_top_model_generator,
+    interacciones_poblacion_model_generator,
+    nested_model_generator,
+]
+
+NODE = shutil.which("node")
+DISPLAY_SCRIPT = os.path.join(os.path.dirname(__file__),
+                              "../pringles/backends/statics/js/main.js")
+
+
+def _expand_compact(payload: dict) -> dict:
+    """Reference spec of how a compact payload expands into the nested JSON, which the
+    ``expand_compact_structure`` function of the display script implements."""
+    strings = payload["strings"]
+    models = []
+
+    def ports(names, kind):
+        return [{"name": strings[name], "message_type": "Any", "kind": kind} for name in names]
+
+    for record in payload["models"]:
+        model = {"id": strings[record[0]], "type": "coupled" if len(record) > 4 else "atomic",
+                 "ports": {"out": ports(record[2], "out"), "in": ports(record[3], "in")}}
+        if len(record) > 4:
+            model["models"] = []
+        models.append(model)
+        if record[1] >= 0:
+            models[record[1]]["models"].append(model)
+    for model, record in zip(models, payload["models"]):
+        if len(record) > 4:
+            eic, ic, eoc = record[4:]
+            model["eic"] = [{"to_port": strings[eic[i + 2]], "to_model": models[eic[i]]["id"],
+                             "from_port": strings[eic[i + 1]]} for i in range(0, len(eic), 3)]
+            model["ic"] = [{"to_port": strings[ic[i + 3]], "to_model": models[ic[i + 2]]["id"],
+                            "from_port": strings[ic[i + 1]], "from_model": models[ic[i]]["id"]}
+                           for i in range(0, len(ic), 4)]
+            model["eoc"] = [{"to_port": strings[eoc[i + 2]], "from_port": strings[eoc[i + 1]],
+                             "from_model": models[eoc[i]]["id"]} for i in range(0, len(eoc), 3)]
+    return models[0]
+
+
+def _expand_compact_in_display_script(payload: dict) -> dict:
+    """Runs ``expand_compact_structure`` of the display script in Node.js. The page the script
+    binds its menu to is a stub, where every property and call returns the stub itself."""
+    script = ("const fs = require('fs'), vm = require('vm');"
+              "const page = new Proxy(function () { return page; }, {get: () => page});"
+              "const context = {document: page, window: page, $: page};"
+              "vm.runInNewContext(fs.readFileSync(process.argv[1], 'utf8'), context);"
+              "const payload = JSON.parse(fs.readFileSync(0, 'utf8'));"
+              "process.stdout.write(JSON.stringify(context.expand_compact_structure(payload)));")
+    completed = subprocess.run([NODE, "-e", script, DISPLAY_SCRIPT], input=json.dumps(payload),
+                               capture_output=True, text=True, check=True, timeout=30)
+    return json.loads(completed.stdout)
+
+
+@pytest.mark.parametrize("model_generator_func", COMPACT_MODEL_GENERATORS)
+def test_compact_json_holds_the_same_model(model_generator_func: Callable[[], Model]):
+    model = model_generator_func()
+    payload = json.loads(CompactJsonSerializer.serialize(model))
+    assert _expand_compact(payload) == JsonSerializer.model_to_dict(model)
+
+
+@pytest.mark.skipif(NODE is None, reason="Node.js is not installed")
+@pytest.mark.parametrize("model_generator_func", COMPACT_MODEL_GENERATORS)
+def test_display_script_expands_compact_json_as_specified(
+        model_generator_func: Callable[[], Model]):
+    payload = json.loads(CompactJsonSerializer.serialize(model_generator_func()))
+    assert _expand_compact_in_display_script(payload) == _expand_compact(payload)
+
+
+def test_compact_json_interns_names():
+    model = interacciones_poblacion_model_generator()
+    payload = json.loads(CompactJsonSerializer.serialize(model))
+    assert sorted(payload["strings"]) == sorted(set(payload["strings"]))
+    assert "in" in payload["strings"] and "out" in payload["strings"]
+    assert len(CompactJsonSerializer.serialize(model)) < len(JsonSerializer.serialize(model))
+
+
+def test_compact_json_is_written_in_chunks(monkeypatch):
+    monkeypatch.setattr(CompactJsonSerializer, "CHUNK_MODELS", 2)
+    leaves = [Coupled(f"level_{depth}", []) for depth in range(1500)]
+    for parent, child in zip(leaves, leaves[1:]):
+        parent.subcomponents.append(child)  # Deeper than the recursion limit
+    model_file = io.StringIO()
+    CompactJsonSerializer.write(leaves[0], model_file)
+    payload = json.loads(model_file.getvalue())
+    assert len(payload["models"]) == 1500
+    assert [record[1] for record in payload["models"]] == list(range(-1, 1499))
+
+
+
+def test_ma_is_parsed_back_into_the_same_model():
+    expected_ma_file = "tests/resources/generated_mas/interacciones_poblacion.ma"
+    with open(expected_ma_file) as ma_file:
+        ma = ma_file.read()
+
+    model = MaParser().load(expected_ma_file, top_name="interacciones_poblacion")
+
+    assert MaSerializer().serialize(model) == ma
+    foco = model.subcomponents[0]
+    assert foco.get_abstract_model_name() == "Foco"
+    assert foco.model_params == {"mean": "2", "std": "1"}
+    assert [port.name for port in foco.inports] == ["in"]
+    assert [port.name for port in foco.outports] == ["out"]
+
+
+def test_ma_parser_resolves_atomic_types_in_the_registry():
+    class FakeRegistry:
+        ParsedQueue = AtomicModelBuilder().with_name("ParsedQueue")\
+            .with_input_port("in").with_output_port("out").with_output_port("done").build()
+
+        def get_by_name(self, name):
+            return getattr(self, name)
+
+    ma = ("% A queue\n"
+          "[top]\n"
+          "components: queue@ParsedQueue inner\n"
+          "in: start\n"
+          "Link : start in@queue  % comments are skipped\n"
+          "link: done@queue in@inner\n"
+          "\n"
+          "[inner]\n"
+          "components:\n"
+          "in: in\n"
+          "\n"
+          "[queue]\n"
+          "preparation : 0:0:5:0\n")
+    model = MaParser(FakeRegistry()).parse(ma)
+
+    queue, inner = model.subcomponents
+    assert isinstance(queue, FakeRegistry.ParsedQueue)
+    assert queue.model_params == {"preparation": "0:0:5:0"}
+    assert len(queue.outports) == 2  # Its declared ports, not more
+    assert [(link.from_port.name, link.to_port.owner.name) for link in model.ic] ==\
+        [("done", "inner")]
+
+
+@pytest.mark.parametrize("ma", [
+    "components: a@A\n",
+    "[top]\ncomponents: missing\n",
+    "[top]\ncomponents: a@A\nlink: out@b in@a\n",
+    "[top]\ntype: cell\n",
+    "[top]\n[top]\n",
+    "[other]\n",
+])
+def test_malformed_ma_is_rejected(ma):
+    with pytest.raises(MaParsingException):
+        MaParser().parse(ma)
+
+
+def test_deep_ma_is_parsed_without_recursion():
+    depth = 3000
+    sections = [f"[level{level}]\ncomponents: level{level + 1}\nin: in\nlink: in in@level{level + 1}\n"
+                for level in range(1, depth)]
+    ma = ("[top]\ncomponents: level1\nin: in\nlink: in in@level1\n" + "".join(sections) +
+          f"[level{depth}]\ncomponents: leaf@ParsedLeaf\nin: in\nlink: in in@leaf\n")
+
+    model = MaParser().parse(ma)
+
+    levels = 0
+    while isinstance(model, Coupled):
+        assert len(model.eic) == 1
+        model = model.subcomponents[0]
+        levels += 1
+    assert levels == depth + 1
+    assert model.get_abstract_model_name() == "ParsedLeaf"
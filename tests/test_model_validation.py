@@ -0,0 +1,129 @@
+import pytest
+from pringles.models import Coupled, validate, find_problems, replicate
+from pringles.models.models import IntLink
+from pringles.models.errors import InvalidModelException
+from pringles.simulator import Simulation
+
+
+def a_valid_model(a_relay):
+    first = a_relay("first")
+    second = a_relay("second")
+    top = Coupled("top", [first, second])\
+        .add_inport("in")\
+        .add_outport("out")\
+        .add_coupling("in", first.get_port("in"))\
+        .add_coupling(first.get_port("out"), second.get_port("in"))\
+        .add_coupling(second.get_port("out"), "out")
+    return top, first, second
+
+
+def test_valid_model_has_no_problems(a_relay):
+    top, first, second = a_valid_model(a_relay)
+    assert find_problems(top) == []
+    validate(top)
+
+
+def test_coupling_to_a_model_not_in_subcomponents(a_relay):
+    top, first, second = a_valid_model(a_relay)
+    outsider = a_relay("outsider")
+    top.add_coupling(first.get_port("out"), outsider.get_port("in"))
+
+    problems = find_problems(top)
+
+    assert len(problems) == 1
+    assert "outsider, which isn't a component" in problems[0]
+
+
+def test_coupling_to_a_dangling_port(a_relay):
+    top, first, second = a_valid_model(a_relay)
+    dangling = second.get_port("in")
+    second.inports.remove(dangling)
+
+    problems = find_problems(top)
+
+    assert len(problems) == 1
+    assert "a port its model doesn't have" in problems[0]
+
+
+def test_coupling_in_the_wrong_direction(a_relay):
+    top, first, second = a_valid_model(a_relay)
+    # An output of the coupled model itself feeding a component
+    top.add_internal_coupling(IntLink(top.get_port("out"), first.get_port("in")))
+
+    assert len(find_problems(top)) == 1
+
+
+@pytest.mark.parametrize("first_name,second_name,expected", [
+    ("twin", "twin", "many models named twin"),
+    ("top", "second", "Only the top model"),
+    ("with space", "second", "isn't valid in CD++"),
+    ("first", "type@clash", "isn't valid in CD++"),
+])
+def test_model_names(first_name, second_name, expected, a_relay):
+    top = Coupled("top", [a_relay(first_name), a_relay(second_name)])
+
+    problems = find_problems(top)
+
+    assert len(problems) == 1
+    assert expected in problems[0]
+
+
+@pytest.mark.parametrize("sibling_name,naming,expected", [
+    ("cell_0", None, "many models named cell_0"),
+    ("sibling", lambda name, index: f"{name} {index}" if index else name,
+     "'cell 1' isn't valid in CD++"),
+    ("sibling", lambda name, index: "top" if index else name, "Only the top model"),
+])
+def test_copy_names(sibling_name, naming, expected, a_relay):
+    cells = replicate(a_relay("cell"), 2) if naming is None \
+        else replicate(a_relay("cell"), 2, naming)
+    top = Coupled("top", [cells, a_relay(sibling_name)])
+
+    problems = find_problems(top)
+
+    assert len(problems) == 1
+    assert expected in problems[0]
+
+
+def test_copies_of_a_valid_array_have_no_problems(a_relay):
+    top = Coupled("top", [replicate(a_relay("cell"), 3), a_relay("cell")])
+    assert find_problems(top) == []
+
+
+def test_duplicate_port_names(a_relay):
+    top, first, second = a_valid_model(a_relay)
+    first.add_outport("out")
+
+    assert find_problems(top) == ["first has many ports named out"]
+
+
+def test_model_shared_by_coupled_models_is_reported_once(a_relay):
+    shared = a_relay("shared")
+    left = Coupled("left", [shared])
+    right = Coupled("right", [shared])
+    top = Coupled("top", [left, right])
+
+    problems = find_problems(top)
+
+    assert len(problems) == 1
+    assert "already part of the hierarchy" in problems[0]
+
+
+def test_validate_raises_with_every_problem(a_relay):
+    top = Coupled("top", [a_relay("twin"), a_relay("twin"), a_relay("top")])
+
+    with pytest.raises(InvalidModelException) as exception_info:
+        validate(top)
+
+    assert len(exception_info.value.problems) == 2
+
+
+def test_simulator_validates_before_running(a_fake_simulator, queue_top_model_with_events,
+                                            a_relay):
+    top_model, events = queue_top_model_with_events
+    top_model.subcomponents.append(a_relay("queue"))
+    simulation = Simulation(top_model, events=events)
+
+    with pytest.raises(InvalidModelException):
+        a_fake_simulator.run_simulation(simulation, validate=True)
+    assert simulation.result is None
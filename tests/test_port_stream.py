@@ -0,0 +1,118 @@
+import os
+import subprocess
+import pytest
+from pringles.backends import PortStream
+from pringles.simulator import Simulation
+from pringles.utils import VirtualTime
+
+PORT = "emitted_signal"
+
+
+@pytest.fixture
+def a_finished_simulation(a_fake_simulator, queue_top_model_with_events):
+    top_model, events = queue_top_model_with_events
+    simulation = Simulation(top_model, events=events)
+    a_fake_simulator.run_simulation(simulation)
+    return simulation
+
+
+def _streamed(batches):
+    return ([time for batch in batches if "times" in batch for time in batch["times"]],
+            [value for batch in batches if "values" in batch for value in batch["values"]])
+
+
+def test_finished_simulation_is_streamed_from_its_result(a_finished_simulation):
+    stream = PortStream(a_finished_simulation, PORT, window=VirtualTime.of_seconds(1),
+                        resolution=10000)
+    batches = stream.poll()
+    assert len(batches) > 2
+    assert batches[-1] == {"port": PORT, "done": True, "successful": True}
+    assert stream.done and stream.poll() == []
+    expected_times, expected_values = a_finished_simulation.result.get_port_values("top", PORT)
+    assert _streamed(batches) == (expected_times.tolist(), expected_values.tolist())
+    for batch in batches[:-1]:
+        start, end = batch["window"]
+        assert all(start <= time < end for time in batch["times"])
+
+
+def test_batches_are_decimated(a_finished_simulation):
+    stream = PortStream(a_finished_simulation, PORT, window=VirtualTime.of_hours(10),
+                        resolution=10)
+    window_batch = stream.poll()[0]
+    assert len(window_batch["times"]) <= 4 * 10
+
+
+def test_running_simulation_is_streamed_from_its_output_file(a_finished_simulation,
+                                                             queue_top_model_with_events):
+    top_model, _ = queue_top_model_with_events
+    running = Simulation(top_model)
+    with open(a_finished_simulation.result.output_path) as output_file:
+        lines = output_file.readlines()
+    stream = PortStream(running, PORT, window=VirtualTime.of_seconds(1), resolution=10000)
+    assert stream.poll() == []
+
+    running_output_path = os.path.join(running.output_dir, "output")
+    with open(running_output_path, "w") as output_file:
+        output_file.writelines(lines[:len(lines) // 2])
+        output_file.write(lines[len(lines) // 2][:5])  # Half written line
+    batches = stream.poll()
+    assert batches and not stream.done
+    streamed_times, _ = _streamed(batches)
+    assert streamed_times == sorted(streamed_times)
+
+    with open(running_output_path, "w") as output_file:
+        output_file.writelines(lines)
+    running._result = a_finished_simulation.result  # As the simulator does when it finishes
+    batches += stream.poll()
+    assert batches[-1]["done"]
+    finished_batches = PortStream(a_finished_simulation, PORT, window=VirtualTime.of_seconds(1),
+                                  resolution=10000).poll()
+    assert _streamed(batches) == _streamed(finished_batches)
+
+
+def test_component_logs_are_not_streamed_while_running(queue_top_model_with_events):
+    top_model, _ = queue_top_model_with_events
+    with pytest.raises(ValueError):
+        PortStream(Simulation(top_model), PORT, logname="top").poll()
+
+
+def test_restarted_stream_starts_over(a_finished_simulation):
+    stream = PortStream(a_finished_simulation, PORT)
+    batches = stream.poll()
+    assert stream.restarted().poll() == batches
+
+
+def test_failed_run_ends_the_stream_with_its_error(a_fake_simulator, queue_top_model_with_events,
+                                                   monkeypatch):
+    top_model, _ = queue_top_model_with_events
+    running = Simulation(top_model)
+    stream = PortStream(running, PORT)
+    assert stream.poll() == []
+
+    def failing_run(*args):
+        raise subprocess.CalledProcessError(1, ["cd++"])
+    monkeypatch.setattr(a_fake_simulator, "_run_dumped_model", failing_run)
+    with pytest.raises(subprocess.CalledProcessError):
+        a_fake_simulator.run_simulation(running)
+    assert running.result is None
+    batches = stream.poll()
+    assert batches[-1] == {"port": PORT, "error": running.error}
+    assert "CalledProcessError" in running.error
+    assert stream.done and stream.poll() == []
+
+
+def test_running_simulation_without_output_times_out(queue_top_model_with_events):
+    top_model, _ = queue_top_model_with_events
+    stream = PortStream(Simulation(top_model), PORT, timeout=0)
+    assert "error" in stream.poll()[-1]
+    assert stream.done
+
+
+def test_uncaptured_outputs_end_the_stream_with_an_error(a_fake_simulator,
+                                                         queue_top_model_with_events):
+    top_model, events = queue_top_model_with_events
+    simulation = Simulation(top_model, events=events, use_simulator_out=False)
+    a_fake_simulator.run_simulation(simulation)
+    stream = PortStream(simulation, PORT)
+    assert "use_simulator_out" in stream.poll()[-1]["error"]
+    assert stream.done
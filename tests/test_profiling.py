@@ -0,0 +1,37 @@
+import pytest  # noqa
+import os
+import tempfile
+from pringles.simulator import Simulation, profile_summary
+from pringles.simulator.registry import AtomicRegistry
+from pringles.simulator.profiling import FUNCTION_COL, CUMULATIVE_TIME_COL
+from pringles.simulator.instrumentation import SERIALIZE_MODEL_STAGE, PARSE_LOGS_STAGE
+
+
+def test_profiling_dumps_a_profile_per_stage(a_fake_simulator, queue_top_model_with_events):
+    top_model, events = queue_top_model_with_events
+    simulation = Simulation(top_model, events=events)
+    with a_fake_simulator.profiling() as profiler:
+        a_fake_simulator.run_simulation(simulation)
+    assert a_fake_simulator.stage_hooks == []
+    assert os.path.isfile(os.path.join(simulation.output_dir,
+                                       f"profile-{SERIALIZE_MODEL_STAGE}.prof"))
+    assert len(profiler.profile_paths) == len(simulation.result.timings.stages)
+
+
+def test_summary_ranks_hotspots_across_runs(a_fake_simulator, queue_top_model_with_events):
+    top_model, _ = queue_top_model_with_events
+    with a_fake_simulator.profiling() as profiler:
+        for _ in range(2):
+            a_fake_simulator.run_simulation(Simulation(top_model))
+    summary = profiler.summary(top=5, stage=PARSE_LOGS_STAGE)
+    assert len(summary) == 5
+    assert list(summary[CUMULATIVE_TIME_COL]) == \
+        sorted(summary[CUMULATIVE_TIME_COL], reverse=True)
+    assert any("_parse_main_log_file" in function for function in summary[FUNCTION_COL])
+
+
+def test_registry_discovery_can_be_profiled():
+    profile_path = os.path.join(tempfile.mkdtemp(), "registry.prof")
+    AtomicRegistry(profile_path=profile_path)
+    summary = profile_summary([profile_path], top=50)
+    assert any("_discover_atomics" in function for function in summary[FUNCTION_COL])
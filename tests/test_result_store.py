@@ -0,0 +1,94 @@
+import pytest
+import os
+import tempfile
+import subprocess
+import multiprocessing
+from pringles.simulator import Simulation, SimulationResult, ResultStore
+from pringles.simulator.errors import InvalidRunParameterException
+
+
+@pytest.fixture
+def a_store() -> ResultStore:
+    return ResultStore(os.path.join(tempfile.mkdtemp(), "results.db"))
+
+
+def _executed_simulation(top_model, output_path: str, **params) -> Simulation:
+    simulation = Simulation(top_model, params=params)
+    simulation.result = SimulationResult(
+        process_result=subprocess.CompletedProcess(args=[], returncode=0),
+        output_path=output_path)
+    return simulation
+
+
+def _append_runs_adding_params(store_path: str, top_model, start) -> None:
+    store = ResultStore(store_path)
+    for param in range(20):
+        simulation = _executed_simulation(top_model, 'tests/resources/model_output_float_value',
+                                          **{f"param_{param}": os.getpid()})
+        start.wait()  # Both processes find the new column missing at once
+        store.append(simulation)
+
+
+def test_appended_runs_are_tagged_with_their_params(a_store, queue_top_model_with_events):
+    top_model, _ = queue_top_model_with_events
+    for rate in [1, 5]:
+        a_store.append(_executed_simulation(top_model, 'tests/resources/model_output_float_value',
+                                            rate=rate, label="queue"))
+    runs = a_store.runs()
+    assert len(a_store) == 2
+    assert list(runs["rate"]) == [1, 5]
+    assert set(a_store.params()) == {"rate", "label"}
+    assert list(runs[ResultStore.SUCCESSFUL_COL]) == [1, 1]
+
+
+def test_final_values_are_filtered_by_params(a_store, queue_top_model_with_events):
+    top_model, _ = queue_top_model_with_events
+    for rate in [1, 5, 8]:
+        a_store.append(_executed_simulation(top_model, 'tests/resources/model_output_float_value',
+                                            rate=rate))
+    final_values = a_store.final_values("emitted_signal", where="rate > ?", where_args=[3])
+    assert list(final_values["rate"]) == [5, 8]
+    assert list(final_values[SimulationResult.VALUE_COL]) == [20., 20.]
+    assert len(a_store.port_values("emitted_signal", 0, "rate = 1")) == 3
+
+
+def test_vector_outputs_are_stored_by_index(a_store, queue_top_model_with_events):
+    top_model, _ = queue_top_model_with_events
+    run_id = a_store.append(_executed_simulation(top_model,
+                                                 'tests/resources/model_output_tuple_value'))
+    values = a_store.port_values("out_port", index=1)
+    assert values[SimulationResult.VALUE_COL].iloc[0] == 2750.
+    assert a_store.load_simulation(run_id).params == {}
+
+
+def test_invalid_param_names_raise(a_store, queue_top_model_with_events):
+    top_model, _ = queue_top_model_with_events
+    with pytest.raises(InvalidRunParameterException):
+        a_store.append(_executed_simulation(top_model, 'tests/resources/model_output_float_value',
+                                            run_id=3))
+
+
+def test_param_names_are_compared_ignoring_case(a_store, queue_top_model_with_events):
+    top_model, _ = queue_top_model_with_events
+    output_path = 'tests/resources/model_output_float_value'
+    a_store.append(_executed_simulation(top_model, output_path, rate=1))
+    a_store.append(_executed_simulation(top_model, output_path, Rate=2))
+    assert list(a_store.runs()["rate"]) == [1, 2]
+    for params in [{"RUN_ID": 3}, {"rate": 1, "RATE": 2}]:
+        with pytest.raises(InvalidRunParameterException):
+            a_store.append(_executed_simulation(top_model, output_path, **params))
+
+
+def test_concurrent_appends_add_each_param_once(a_store, queue_top_model_with_events):
+    top_model, _ = queue_top_model_with_events
+    start = multiprocessing.Barrier(2, timeout=30)
+    appenders = [multiprocessing.Process(target=_append_runs_adding_params,
+                                         args=(a_store.path, top_model, start))
+                 for _ in range(2)]
+    for appender in appenders:
+        appender.start()
+    for appender in appenders:
+        appender.join()
+    assert [appender.exitcode for appender in appenders] == [0, 0]
+    assert len(a_store) == 40
+    assert len(a_store.params()) == 20
@@ -1,6 +1,7 @@
 import pytest  # noqa
 import os
 import tempfile
+import pandas as pd
 from typing import List, Tuple
 from pringles.simulator import Simulator, Simulation, SimulationResult, Event
 from pringles.simulator.errors import SimulatorExecutableNotFound
@@ -92,3 +93,110 @@ def test_parse_output_file_tuple_values():
             assert isinstance(value, tuple)
             for coord in value:
                 assert isinstance(coord, float)
+
+
+def _result_with_log(logname: str, rows: List[Tuple[str, object]]) -> SimulationResult:
+    result = SimulationResult(process_result=None)
+    result.logs_dfs = {logname: pd.DataFrame({
+        SimulationResult.TIME_COL: [
+            VirtualTime(second // 3600, second // 60 % 60, second % 60, 0, 0)
+            for second in range(len(rows))],
+        SimulationResult.PORT_COL: [port for port, _ in rows],
+        SimulationResult.VALUE_COL: [value for _, value in rows],
+    })}
+    return result
+
+
+def test_get_port_values_extracts_tuple_index():
+    result = _result_with_log("top", [("out", (1., 2.)), ("in", (3., 4.)), ("out", (5., 6.))])
+    x_values, y_values = result.get_port_values("top", "out", index=1)
+    assert list(y_values) == [2., 6.]
+    assert list(x_values) == [float(VirtualTime.of_seconds(0)),
+                              float(VirtualTime.of_seconds(2))]
+    assert result.get_port_values("top", "missing") is None
+
+
+def test_plot_port_decimates_long_series():
+    result = _result_with_log("top", [("out", float(value)) for value in range(10000)])
+    axes = result.plot_port("top", "out", resolution=10)
+    assert len(axes.lines[0].get_xdata()) <= 40
+    assert result.plot_port("top", "missing") is None
+
+
+def test_plot_ports_plots_every_port_and_index():
+    result = _result_with_log("top", [("out", (1., 2.)), ("in", (3., 4.))])
+    axes = result.plot_ports("top", ["out", "in"], indices=[0, 1])
+    assert [line.get_label() for line in axes.lines] ==\
+        ["out[0]", "out[1]", "in[0]", "in[1]"]
+
+
+def test_port_series_groups_log_once_with_categorical_ports():
+    result = _result_with_log("top", [("out", 1.), ("in", 2.), ("out", 3.)])
+    out_series = result.port_series("top", "out")
+    assert list(out_series[SimulationResult.VALUE_COL]) == [1., 3.]
+    assert result.port_series("top", "out") is out_series
+    assert result.port_series("top", "missing").empty
+    assert isinstance(result.logs_dfs["top"][SimulationResult.PORT_COL].dtype,
+                      pd.CategoricalDtype)
+
+
+def test_port_views_are_invalidated_when_logs_are_replaced():
+    result = _result_with_log("top", [("out", 1.)])
+    assert list(result.get_port_values("top", "out")[1]) == [1.]
+    result.logs_dfs = _result_with_log("top", [("out", 5.), ("out", 6.)]).logs_dfs
+    assert list(result.port_series("top", "out")[SimulationResult.VALUE_COL]) == [5., 6.]
+    assert list(result.get_port_values("top", "out")[1]) == [5., 6.]
+
+
+def test_parse_main_log_file_builds_compact_frames():
+    logs = SimulationResult._parse_main_log_file('tests/resources/model_logs/logs')
+    top_log = logs["top"]
+    assert list(top_log.columns) == [SimulationResult.MESSAGE_TYPE_COL,
+                                     SimulationResult.TIME_COL,
+                                     SimulationResult.MODEL_ORIGIN_COL,
+                                     SimulationResult.PORT_COL,
+                                     SimulationResult.VALUE_COL,
+                                     SimulationResult.MODEL_DEST_COL]
+    for col in SimulationResult.CATEGORICAL_COLS:
+        assert isinstance(top_log[col].dtype, pd.CategoricalDtype)
+    assert top_log[SimulationResult.VALUE_COL].dtype == float
+    assert list(top_log[SimulationResult.VALUE_COL]) == [1.5, 1.5, 20.]
+
+    queue_values = logs["queue"][SimulationResult.VALUE_COL]
+    assert list(queue_values) == [(1.5, 2.5), (1.5, 2.5)]
+
+
+def test_parse_main_log_file_keeps_unnamed_cols_if_requested():
+    logs = SimulationResult._parse_main_log_file('tests/resources/model_logs/logs',
+                                                 keep_unnamed_log_cols=True)
+    assert list(logs["top"].columns[:2]) == SimulationResult.UNNAMED_LOG_COLS
+
+
+def test_plot_port_of_vector_valued_log():
+    result = SimulationResult(process_result=None,
+                              main_log_path='tests/resources/model_logs/logs')
+    assert list(result.get_port_values("queue", "out", index=1)[1]) == [2.5]
+    assert result.logs_memory_usage()["queue"] > 0
+
+
+def test_parsed_log_times_are_converted_to_numbers_while_parsing(monkeypatch):
+    result = SimulationResult(process_result=None,
+                              main_log_path='tests/resources/model_logs/logs')
+    expected_times = [float(VirtualTime.of_seconds(10)), float(VirtualTime.of_seconds(20))]
+    # Only the times of logs that weren't parsed are converted one by one
+    monkeypatch.setattr(VirtualTime, "__float__", None)
+    x_values, y_values = result.get_port_values("top", "incoming_event")
+    assert list(x_values) == expected_times
+    assert list(y_values) == [1.5, 20.]
+
+
+def test_results_pickled_with_logs_as_an_attribute_are_migrated():
+    logs_dfs = _result_with_log("top", [("out", 1.), ("out", 2.)]).logs_dfs
+    result = SimulationResult.__new__(SimulationResult)
+    # As unpickled from a result stored before logs_dfs became a property
+    result.__setstate__({'process_result': None, 'main_log_path': None,
+                         'output_path': None, 'logs_dfs': logs_dfs})
+    assert result.logs_dfs is logs_dfs
+    assert list(result.get_port_values("top", "out")[1]) == [1., 2.]
+    with pytest.raises(ValueError):
+        result.reload_logs()
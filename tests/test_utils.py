@@ -1,5 +1,7 @@
 import pytest
-from pringles.utils import VirtualTime
+import numpy as np
+from pringles.utils import VirtualTime, decimate_minmax
+from pringles.utils.errors import BadVirtualTimeValuesError
 """
 @pytest.mark.parametrize("event,expected_serialization", [
     (Event(one_hour_time, sample_port, 1.5), "01:00:00:000 sample_port 1.5;"),
@@ -64,3 +66,74 @@ def test_virtual_time_from_float_should_work_for_values_over_zero(float_vtime_va
 def test_complex_time_from_to_number_roudntrip():
     time = VirtualTime(1, 24, 56, 567, 0)
     assert VirtualTime.from_number(float(time)) == time
+
+
+def test_decimate_minmax_keeps_short_series_untouched():
+    x_values = np.arange(10, dtype=float)
+    y_values = np.arange(10, dtype=float)
+    decimated_x, decimated_y = decimate_minmax(x_values, y_values, 10)
+    assert np.array_equal(decimated_x, x_values)
+    assert np.array_equal(decimated_y, y_values)
+
+
+def test_decimate_minmax_bounds_points_and_keeps_extremes():
+    x_values = np.arange(100000, dtype=float)
+    y_values = np.sin(x_values / 1000)
+    y_values[54321] = 10.
+    y_values[12345] = -10.
+    decimated_x, decimated_y = decimate_minmax(x_values, y_values, 100)
+    assert len(decimated_x) <= 400
+    assert np.all(np.diff(decimated_x) > 0)
+    assert decimated_y.max() == 10.
+    assert decimated_y.min() == -10.
+    assert decimated_x[0] == x_values[0] and decimated_x[-1] == x_values[-1]
+
+
+def test_time_string_without_remainder_is_parsed():
+    assert VirtualTime.parse("00:01:30:500") == VirtualTime(0, 1, 30, 500, 0)
+
+
+@pytest.mark.parametrize("timestr,expected", [
+    ("01:02:03:004:0", VirtualTime(1, 2, 3, 4, 0)),
+    ("01:02:03:004", VirtualTime(1, 2, 3, 4, 0)),
+    ("01:02:03:004:0.25", VirtualTime(1, 2, 3, 4, 0.25)),
+    ("123:02:03:004:0", VirtualTime(123, 2, 3, 4, 0)),
+])
+def test_time_string_layouts_are_parsed(timestr, expected):
+    parsed = VirtualTime.parse(timestr)
+    assert parsed == expected
+    assert parsed.remainder == expected.remainder
+
+
+def test_many_time_strings_are_parsed_like_each_one():
+    timestrs = [f"00:{minute:02d}:{second:02d}:{second * 7:03d}:{second % 3}"
+                for minute in range(10) for second in range(60)] * 2
+    timestrs += ["123:00:00:000:0", "00:00:01:000", "00:00:01:000:0.5"]
+    assert VirtualTime.parse_many(timestrs) == [VirtualTime.parse(timestr)
+                                                for timestr in timestrs]
+    assert VirtualTime.parse_many(np.array(timestrs)) == \
+        VirtualTime.parse_many(timestrs, intern=True, cache_size=7)
+    assert list(VirtualTime.parse_numbers(timestrs)) == [float(VirtualTime.parse(timestr))
+                                                         for timestr in timestrs]
+
+
+@pytest.mark.parametrize("cache_size", [0, -1])
+def test_intern_cache_size_should_be_positive(cache_size):
+    with pytest.raises(ValueError):
+        VirtualTime.parse_many(["00:00:01:000:0"], intern=True, cache_size=cache_size)
+
+
+def test_many_equal_time_strings_share_their_time_only_if_interned():
+    timestrs = ["00:00:01:000:0"] * 100 + ["00:00:02:000:0"]
+    times = VirtualTime.parse_many(timestrs)
+    assert times[0] == times[1] and times[0] is not times[1]
+    interned_times = VirtualTime.parse_many(timestrs, intern=True)
+    assert interned_times[0] is interned_times[1]
+    assert interned_times[1] is not interned_times[100]
+
+
+def test_many_time_strings_with_bad_values_are_rejected():
+    with pytest.raises(BadVirtualTimeValuesError):
+        VirtualTime.parse_many(["00:00:01:000:0"] * 100 + ["00:99:00:000:0"])
+    with pytest.raises(BadVirtualTimeValuesError):
+        VirtualTime.parse_numbers(["00:00:01:000:0"] * 100 + ["00:99:00:000:0"])